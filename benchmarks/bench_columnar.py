@@ -0,0 +1,61 @@
+# coding: utf-8
+"""
+A ruleset over many contexts: ``execute_many`` for dicts and numpy masks for columns.
+
+    pip install numpy
+    python benchmarks/bench_columnar.py
+"""
+from __future__ import print_function, unicode_literals
+
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from django.conf import settings  # noqa
+
+if not settings.configured:
+    settings.configure()
+
+import numpy  # noqa
+
+from querybuilder_rules.columnar import first_matches, get_masks  # noqa
+from querybuilder_rules.rules.generic import GenericRule  # noqa
+
+
+def ruleset(size):
+    return [{
+        "rule": {
+            "condition": "AND",
+            "rules": [
+                {"id": "quantity.value", "type": "integer", "operator": "between",
+                 "value": [str(i * 10 + 1), str(i * 10 + 10)]},
+                {"id": "ship.value", "type": "double", "operator": "less",
+                 "value": str(i % 7 + 0.5)},
+            ],
+        },
+    } for i in range(size)]
+
+
+def main(size=20, rows=100000):
+    rnd = random.Random(0)
+    quantity = numpy.array([rnd.randint(1, size * 10) for _ in range(rows)])
+    ship = numpy.array([rnd.random() * 7 for _ in range(rows)])
+    contexts = [{"quantity": {"value": int(q)}, "ship": {"value": float(s)}}
+                for q, s in zip(quantity, ship)]
+    rule = GenericRule(ruleset=ruleset(size))
+
+    print("%s rules, %s contexts" % (size, rows))
+    elapsed = min(timeit.repeat(lambda: list(rule.execute_many(contexts)), number=1, repeat=3))
+    print("  %-15s %8.3f us/context" % ("execute_many", elapsed / rows * 1e6))
+
+    columns = {"quantity.value": quantity, "ship.value": ship}
+    elapsed = min(timeit.repeat(lambda: first_matches(get_masks(rule.ruleset_conditions, columns)),
+                                number=1, repeat=3))
+    print("  %-15s %8.3f us/context" % ("numpy columns", elapsed / rows * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+# coding: utf-8
+"""
+Evaluation cost of deep condition trees.
+
+Compares the short-circuit evaluator of ``RuleCondition`` with folding every
+child through ``CONDITIONS`` (the previous behaviour) and with the generated
+function backend ``GeneratedRuleCondition``.
+
+    python benchmarks/bench_conditions.py
+"""
+from __future__ import print_function, unicode_literals
+
+import datetime
+import os
+import sys
+import timeit
+from functools import reduce
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from django.conf import settings  # noqa
+
+if not settings.configured:
+    settings.configure()
+
+from querybuilder_rules.codegen import GeneratedRuleCondition  # noqa
+from querybuilder_rules.conditions import RuleCondition  # noqa
+from querybuilder_rules.maps import CONDITIONS  # noqa
+from querybuilder_rules.values import Context  # noqa
+
+
+def build_tree(depth, width):
+    rules = [{
+        "id": "quantity.value",
+        "type": "integer",
+        "operator": "greater",
+        "value": "100",
+    }]
+    for i in range(width):
+        rules.append({
+            "id": "o_%s.date" % i,
+            "type": "date",
+            "operator": "between",
+            "value": ["2016-01-01", "2016-12-31"],
+        })
+    if depth > 1:
+        rules.append(build_tree(depth - 1, width))
+    return {"condition": "AND", "rules": rules}
+
+
+def build_eager(condition):
+    """Evaluator without short-circuit, the way ``compile()`` used to fold."""
+    builder = RuleCondition({})
+    cond_func = CONDITIONS[condition['condition']]
+    funcs = [build_eager(rule) if 'condition' in rule
+             else builder._build_test_func(rule)['test_func']
+             for rule in condition['rules']]
+
+    def _eager(context):
+        return reduce(cond_func, [f(context) for f in funcs])
+
+    return _eager
+
+
+def main(number=2000):
+    tree = build_tree(depth=4, width=5)
+    date = datetime.date(2016, 6, 1)
+    contexts = [
+        ("rejected by the first rule", Context({"quantity": {"value": 1}})),
+        ("all rules evaluated", Context(dict({"quantity": {"value": 200}}, **{
+            "o_%s" % i: {"date": date} for i in range(5)
+        }))),
+    ]
+
+    short_circuit = RuleCondition({"rule": tree})
+    short_circuit.compile()
+    generated = GeneratedRuleCondition({"rule": tree})
+    generated.compile()
+    eager = build_eager(tree)
+
+    for title, context in contexts:
+        print(title)
+        assert short_circuit(context) == eager(context) == generated(context)
+        for name, func in [("eager", eager), ("short-circuit", short_circuit),
+                           ("codegen", generated)]:
+            elapsed = min(timeit.repeat(lambda: func(context), number=number, repeat=3))
+            print("  %-15s %8.2f us/call" % (name, elapsed / number * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+# coding: utf-8
+"""
+Selecting the matched rules of long rulesets, tested in order or with an index.
+
+    python benchmarks/bench_dispatch.py
+"""
+from __future__ import print_function, unicode_literals
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from django.conf import settings  # noqa
+
+if not settings.configured:
+    settings.configure()
+
+from querybuilder_rules.rules.generic import GenericRule  # noqa
+
+
+class LinearRule(GenericRule):
+    use_index = False
+
+
+def range_ruleset(size):
+    return [{
+        "rule": {
+            "condition": "AND",
+            "rules": [{
+                "id": "quantity.value",
+                "type": "integer",
+                "operator": "between",
+                "value": [str(i * 10 + 1), str(i * 10 + 10)],
+            }],
+        },
+    } for i in range(size)]
+
+
+def select_ruleset(size):
+    return [{
+        "rule": {
+            "condition": "AND",
+            "rules": [{
+                "id": "value",
+                "type": "string",
+                "operator": "in",
+                "value": ["item %s" % i, "item %s" % (i + size)],
+            }],
+        },
+    } for i in range(size)]
+
+
+def bench(title, ruleset, contexts, number=200):
+    print(title)
+    for name, rule_class in [("in order", LinearRule), ("index", GenericRule)]:
+        rule = rule_class(ruleset=ruleset)
+
+        def run():
+            for context in contexts:
+                rule.execute(context)
+                rule.execute(context, take_first=False)
+
+        elapsed = min(timeit.repeat(run, number=number, repeat=3))
+        print("  %-15s %8.2f us/context" % (name, elapsed / number / len(contexts) * 1e6))
+
+    rule = GenericRule(ruleset=ruleset)
+
+    def run_many():
+        for _ in rule.execute_many(contexts):
+            pass
+        for _ in rule.execute_many(contexts, take_first=False):
+            pass
+
+    elapsed = min(timeit.repeat(run_many, number=number, repeat=3))
+    print("  %-15s %8.2f us/context" % ("execute_many", elapsed / number / len(contexts) * 1e6))
+
+
+def main(size=200):
+    contexts = [{"quantity": {"value": v}} for v in range(1, size * 10, 37)]
+    bench("%s ranges of quantity.value" % size, range_ruleset(size), contexts)
+
+    contexts = [{"value": "item %s" % i} for i in range(0, size * 2, 7)]
+    bench("%s choices of value" % size, select_ruleset(size), contexts)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+# coding: utf-8
+"""
+Price calculation of long ranges.
+
+    python benchmarks/bench_price.py
+
+``vectorized`` needs numpy.
+"""
+from __future__ import print_function, unicode_literals
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from django.conf import settings  # noqa
+
+if not settings.configured:
+    settings.configure()
+
+from querybuilder_rules import OPTION_TYPE_CHOICES  # noqa
+from querybuilder_rules.rules.price import PriceRule  # noqa
+
+try:
+    import numpy  # noqa
+    VECTORIZED = [("vectorized", {"vectorized": True})]
+except ImportError:
+    VECTORIZED = []
+
+
+def quantity_ruleset():
+    ruleset = []
+    for start, price in [(11, "200"), (51, "bp - 100"), (101, "bp / 5")]:
+        ruleset.append({
+            "rule": {
+                "condition": "AND",
+                "rules": [{
+                    "id": "value",
+                    "type": "integer",
+                    "operator": "greater_or_equal",
+                    "value": str(start),
+                }],
+            },
+            "price": price,
+        })
+    return list(reversed(ruleset))
+
+
+def measure(func, *args, **kwargs):
+    start = time.time()
+    result = func(*args, **kwargs)
+    return result, time.time() - start
+
+
+def bench_quantity(value=5000):
+    print("quantity %s" % value)
+    ruleset = quantity_ruleset()
+    results = set()
+    for name, kwargs in [("per unit", {}), ("segments", {"segments": True})] + VECTORIZED:
+        rule = PriceRule(ruleset=ruleset, **kwargs)
+        (price, _), elapsed = measure(rule.calculate_price, value,
+                                      OPTION_TYPE_CHOICES.QUANTITY, base_price=250)
+        results.add(price)
+        print("  %-15s %10.2f ms" % (name, elapsed * 1000))
+    assert len(results) == 1
+
+
+def bench_curve(value=500):
+    print("price table 1..%s" % value)
+    ruleset = quantity_ruleset()
+    rule = PriceRule(ruleset=ruleset, segments=True)
+    table, elapsed = measure(lambda: [rule.calculate_price(n, OPTION_TYPE_CHOICES.QUANTITY,
+                                                           base_price=250)[0]
+                                      for n in range(value + 1)])
+    print("  %-15s %10.2f ms" % ("per quantity", elapsed * 1000))
+    curve, elapsed = measure(PriceRule(ruleset=ruleset).get_price_curve, value, base_price=250)
+    print("  %-15s %10.2f ms" % ("price curve", elapsed * 1000))
+    assert list(curve) == table
+
+
+def hour_ruleset():
+    return [
+        {
+            "rule": {
+                "condition": "AND",
+                "rules": [{
+                    "id": "time",
+                    "type": "time",
+                    "operator": "between",
+                    "value": ["09:01", "18:00"],
+                }, {
+                    "id": "datetime.weekday",
+                    "type": "integer",
+                    "operator": "in",
+                    "value": ["0", "1", "2", "3", "4"],
+                }],
+            },
+            "price": "400",
+        },
+        {
+            "rule": {
+                "condition": "AND",
+                "rules": [{
+                    "id": "hours",
+                    "type": "integer",
+                    "operator": "greater",
+                    "value": "72",
+                }],
+            },
+            "price": "bp * 0.8",
+        },
+    ]
+
+
+def bench_hours(value=("2016-01-01 09:00", "2016-04-01 09:00")):
+    print("hours %s - %s" % value)
+    results = set()
+    for name, kwargs in [("per hour", {}), ("periods", {"periods": True})] + VECTORIZED:
+        rule = PriceRule(ruleset=hour_ruleset(), **kwargs)
+        (price, _), elapsed = measure(rule.calculate_price, list(value),
+                                      OPTION_TYPE_CHOICES.DATETIME_RANGE_HOUR, base_price=600)
+        results.add(price)
+        print("  %-15s %10.2f ms" % (name, elapsed * 1000))
+    assert len(results) == 1
+
+
+def week_ruleset():
+    """
+    Tariff grid: time bands of every day of the week
+    """
+    ruleset = []
+    for weekday in range(7):
+        for n, (start, end) in enumerate([("00:00", "06:59"), ("07:00", "11:59"),
+                                          ("12:00", "17:59"), ("18:00", "23:59")]):
+            ruleset.append({
+                "rule": {
+                    "condition": "AND",
+                    "rules": [{
+                        "id": "time",
+                        "type": "time",
+                        "operator": "between",
+                        "value": [start, end],
+                    }, {
+                        "id": "datetime.isoweekday",
+                        "type": "integer",
+                        "operator": "greater",
+                        "value": str(weekday),
+                    }],
+                },
+                "price": str(100 + 10 * weekday + n),
+            })
+    return list(reversed(ruleset))
+
+
+def bench_week(value=("2016-01-01 09:00", "2016-04-01 09:00")):
+    print("hours of the week %s - %s" % value)
+    results = set()
+    for name, kwargs in [("per hour", {}), ("memoized", {"memoize": True})]:
+        rule = PriceRule(ruleset=week_ruleset(), **kwargs)
+        (price, _), elapsed = measure(rule.calculate_price, list(value),
+                                      OPTION_TYPE_CHOICES.DATETIME_RANGE_HOUR, base_price=600)
+        results.add(price)
+        print("  %-15s %10.2f ms" % (name, elapsed * 1000))
+    assert len(results) == 1
+
+
+if __name__ == '__main__':
+    bench_quantity()
+    bench_curve()
+    bench_hours()
+    bench_week()
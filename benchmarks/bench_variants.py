@@ -0,0 +1,92 @@
+# coding: utf-8
+"""
+Group prices of every combination of options: the cartesian product vs ``variants``.
+
+    python benchmarks/bench_variants.py
+"""
+from __future__ import print_function, unicode_literals
+
+import os
+import sys
+import time
+from itertools import product
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from django.conf import settings  # noqa
+
+if not settings.configured:
+    settings.configure()
+
+from querybuilder_rules import OPTION_TYPE_CHOICES  # noqa
+from querybuilder_rules.rules.base import BaseRule  # noqa
+from querybuilder_rules.rules.price import PriceRule  # noqa
+from querybuilder_rules.variants import VariantEnumerator  # noqa
+
+COLORS = ["red", "blue", "green", "black", "white"]
+SIZES = ["xs", "s", "m", "l", "xl", "xxl"]
+
+
+def choices():
+    result = {
+        "1": {"type": OPTION_TYPE_CHOICES.SELECT, "values": COLORS},
+        "2": {"type": OPTION_TYPE_CHOICES.SELECT, "values": SIZES},
+    }
+    for option_id in range(3, 9):
+        result[str(option_id)] = {"type": OPTION_TYPE_CHOICES.BOOL, "values": [True, False]}
+    return result
+
+
+def ruleset():
+    result = []
+    for color in COLORS[:3]:
+        for size in SIZES[:2]:
+            result.append({
+                "rule": {"condition": "AND", "rules": [
+                    {"id": "1.value", "type": "string", "operator": "equal", "value": color},
+                    {"id": "2.value", "type": "string", "operator": "equal", "value": size},
+                ]},
+                "price": "100",
+            })
+    for option_id in range(3, 9):
+        result.append({
+            "rule": {"condition": "AND", "rules": [
+                {"id": "%s.value" % option_id, "type": "boolean", "operator": "equal",
+                 "value": "true"},
+            ]},
+            "price": str(option_id * 10),
+            "to_option": str(option_id),
+        })
+    return result
+
+
+def measure(func):
+    start = time.time()
+    result = func()
+    return result, time.time() - start
+
+
+def brute_force(price_rule, choices):
+    order = sorted(choices)
+    result = {}
+    for combination in product(*[choices[o]["values"] for o in order]):
+        values = {o: {"value": v, "type": choices[o]["type"]} for o, v in zip(order, combination)}
+        price_map, _ = price_rule.calculate_group_price(BaseRule.build_group_context(values))
+        result[combination] = price_map
+    return result
+
+
+def bench():
+    price_rule = PriceRule(ruleset=ruleset())
+    print("%s variants" % (len(COLORS) * len(SIZES) * 2 ** 6))
+    expected, elapsed = measure(lambda: brute_force(price_rule, choices()))
+    print("  %-15s %10.2f ms" % ("product", elapsed * 1000))
+    enumerator = VariantEnumerator(price_rule)
+    variants, elapsed = measure(lambda: list(enumerator.iter_variants(choices())))
+    print("  %-15s %10.2f ms  (%s prices)" % ("variants", elapsed * 1000, enumerator.calculations))
+    order = sorted(choices())
+    assert {tuple(a[o] for o in order): p for a, p in variants} == expected
+
+
+if __name__ == '__main__':
+    bench()
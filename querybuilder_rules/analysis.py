@@ -0,0 +1,302 @@
+# coding: utf-8
+"""
+Static analysis of compiled conditions
+"""
+from __future__ import unicode_literals
+
+import math
+
+import six
+
+from .conditions import RuleCondition
+
+# Operators comparing the value with the rule arguments
+THRESHOLD_OPERATORS = {
+    'equal', 'not_equal', 'in', 'not_in',
+    'greater', 'less', 'greater_or_equal', 'less_or_equal',
+    'between', 'not_between',
+}
+
+# ``not value`` / ``bool(value)``, changes between 0 and 1 only
+TRUTH_OPERATORS = {'is_empty', 'is_not_empty', 'is_null', 'is_not_null'}
+
+
+class NotAnalysable(Exception):
+    pass
+
+
+def iter_rules(condition):
+    """
+    Leaf rules of the condition tree, depth first
+    """
+    for rule in condition['rules']:
+        if 'condition' in rule:
+            for r in iter_rules(rule):
+                yield r
+        else:
+            yield rule
+
+
+def iter_parsed_rules(conditions):
+    """
+    :param conditions: list of ``RuleCondition``
+    :return: generator of (field, operator_name, value_type, args)
+    :raises NotAnalysable: when a rule can't be parsed
+    """
+    parser = RuleCondition({})
+    for condition in conditions:
+        for rule in iter_rules(condition.get_condition()):
+            try:
+                parsed = parser.parse_rule(rule)
+            except (TypeError, ValueError, OverflowError):
+                raise NotAnalysable(rule)
+            yield parsed
+
+
+def _is_number(value):
+    # bool compares as int
+    return isinstance(value, (six.integer_types, float)) and not math.isinf(value) \
+        and not math.isnan(value)
+
+
+# Integer ``t`` changes the result at ``t + offset``,
+# ``between`` changes at the start and after the end
+THRESHOLD_OFFSETS = {
+    'greater': [(1,)],
+    'less_or_equal': [(1,)],
+    'less': [(0,)],
+    'greater_or_equal': [(0,)],
+    'between': [(0,), (1,)],
+    'not_between': [(0,), (1,)],
+}
+
+
+def _threshold_points(threshold, offsets=(0, 1)):
+    """
+    Integers where a comparison with ``threshold`` may change its result
+    """
+    ceil = int(math.ceil(threshold))
+    if ceil != threshold:
+        return {ceil}
+    return {ceil + offset for offset in offsets}
+
+
+def get_breakpoints(conditions, field='value'):
+    """
+    Integer points where a result of the conditions may change,
+    when only the integer ``field`` changes and other fields are constant.
+
+    :param conditions: list of ``RuleCondition``
+    :param field: field path
+    :return: set of int
+    :raises NotAnalysable: when a rule of the field isn't a numeric comparison
+    """
+    points = set()
+    nested_prefix = field + '.'
+    for rule_field, operator_name, value_type, args in iter_parsed_rules(conditions):
+        if rule_field.startswith(nested_prefix):
+            raise NotAnalysable(rule_field)
+        if rule_field != field:
+            continue
+
+        if RuleCondition.has_type_guard(operator_name, value_type):
+            # int is never a date, the rule is always False
+            continue
+
+        if operator_name in TRUTH_OPERATORS or (value_type, operator_name) == ('boolean', 'equal'):
+            points.update((0, 1))
+            continue
+
+        if operator_name not in THRESHOLD_OPERATORS:
+            raise NotAnalysable(operator_name)
+
+        offsets = THRESHOLD_OFFSETS.get(operator_name, [])
+        for i, arg in enumerate(args):
+            values = arg if isinstance(arg, (list, tuple, frozenset)) else [arg]
+            for value in values:
+                if not _is_number(value):
+                    raise NotAnalysable(value)
+                if i < len(offsets):
+                    points.update(_threshold_points(value, offsets[i]))
+                else:
+                    points.update(_threshold_points(value))
+    return points
+
+
+def get_segments(conditions, total, field='value'):
+    """
+    Split ``1..total`` into segments where the conditions give the same result
+
+    :return: list of (start, end) inclusive
+    :raises NotAnalysable:
+    """
+    points = get_breakpoints(conditions, field)
+    starts = sorted({1} | {p for p in points if 1 < p <= total})
+    ends = [s - 1 for s in starts[1:]] + [total]
+    return list(zip(starts, ends))
+
+
+def get_fields(condition):
+    """
+    :param condition: condition tree
+    :return: set of the fields read by the condition
+    """
+    return {rule.get('field', rule['id']) for rule in iter_rules(condition)}
+
+
+def get_thresholds(condition, field):
+    """
+    Values where a result of the condition tree reading only the numeric ``field`` may change,
+    between two thresholds the result is the same.
+
+    :param condition: condition tree
+    :return: set of numbers
+    :raises NotAnalysable:
+    """
+    parser = RuleCondition({})
+    thresholds = set()
+    for rule in iter_rules(condition):
+        try:
+            rule_field, operator_name, value_type, args = parser.parse_rule(rule)
+        except (TypeError, ValueError, OverflowError):
+            raise NotAnalysable(rule)
+        if rule_field != field:
+            raise NotAnalysable(rule_field)
+
+        if RuleCondition.has_type_guard(operator_name, value_type):
+            continue
+
+        if operator_name in TRUTH_OPERATORS or (value_type, operator_name) == ('boolean', 'equal'):
+            thresholds.add(0)
+            continue
+
+        if operator_name not in THRESHOLD_OPERATORS:
+            raise NotAnalysable(operator_name)
+
+        for arg in args:
+            for value in (arg if isinstance(arg, (list, tuple, frozenset)) else [arg]):
+                if not _is_number(value):
+                    raise NotAnalysable(value)
+                thresholds.add(value)
+    return thresholds
+
+
+# Types of ``equal``/``in`` rules with hashable arguments matching by ``==``
+EQUALITY_TYPES = {'string', 'integer'}
+
+
+def _node_values(node, field, parser):
+    if 'condition' in node:
+        children = [_node_values(rule, field, parser) for rule in node['rules']]
+        if not children:
+            # empty group never matches
+            return frozenset(), True
+        exact = all(e for _, e in children)
+        values = [v for v, _ in children if v is not None]
+        if node['condition'] == 'AND':
+            if not values:
+                return None, False
+            return frozenset.intersection(*values), exact
+        if len(values) != len(children):
+            return None, False
+        return frozenset().union(*values), exact
+
+    try:
+        rule_field, operator_name, value_type, args = parser.parse_rule(node)
+    except (TypeError, ValueError, OverflowError):
+        return None, False
+    if rule_field != field or value_type not in EQUALITY_TYPES or len(args) != 1:
+        return None, False
+    if operator_name == 'equal':
+        return frozenset(args), True
+    if operator_name == 'in' and isinstance(args[0], frozenset):
+        return frozenset(args[0]), True
+    return None, False
+
+
+def get_values(condition, field):
+    """
+    Values of ``field`` the condition tree can match with, checked by ``equal``/``in`` rules
+
+    :param condition: condition tree
+    :return: (values, exact). ``values`` is a frozenset or ``None`` when any value can match,
+        ``exact`` when the tree matches all of the values and reads nothing else.
+    """
+    return _node_values(condition, field, RuleCondition({}))
+
+
+# Fields of a ``DATETIME_RANGE_HOUR`` hour context
+HOUR_CONTEXT_FIELDS = {
+    'value', 'datetime', 'time', 'date', 'days', 'hours',
+    'start_datetime', 'end_datetime', 'total_days', 'total_hours',
+}
+
+# Same for every hour of the range
+HOUR_CONSTANT_FIELDS = {'start_datetime', 'total_days', 'total_hours'}
+
+# Repeat every N hours
+HOUR_PERIODIC_FIELDS = {
+    'time': 24,
+    'time.hour': 24,
+    'value.hour': 24,
+    'datetime.hour': 24,
+    'value.weekday': 24 * 7,
+    'datetime.weekday': 24 * 7,
+    'date.weekday': 24 * 7,
+    'value.isoweekday': 24 * 7,
+    'datetime.isoweekday': 24 * 7,
+    'date.isoweekday': 24 * 7,
+}
+
+# Count hours of the range by N hours: ``hours`` is the hour, ``days`` is ``ceil(hour / 24)``
+HOUR_COUNTER_FIELDS = {'hours': 1, 'days': 24}
+
+
+def _gcd(a, b):
+    while b:
+        a, b = b, a % b
+    return a
+
+
+def get_period(conditions, extra_fields=()):
+    """
+    Results of the conditions for hours of a ``DATETIME_RANGE_HOUR`` range repeat
+    every ``period`` hours starting from the hour ``start``.
+
+    :param conditions: list of ``RuleCondition``
+    :param extra_fields: fields added to the hour context
+    :return: (period, start)
+    :raises NotAnalysable:
+    """
+    if HOUR_CONTEXT_FIELDS & set(map(six.text_type, extra_fields)):
+        raise NotAnalysable(extra_fields)
+
+    period, start = 1, 1
+    for field, operator_name, value_type, args in iter_parsed_rules(conditions):
+        if field in HOUR_PERIODIC_FIELDS:
+            length = HOUR_PERIODIC_FIELDS[field]
+            period = period * length // _gcd(period, length)
+            continue
+
+        if field in HOUR_COUNTER_FIELDS:
+            if RuleCondition.has_type_guard(operator_name, value_type):
+                continue
+            if operator_name in TRUTH_OPERATORS \
+                    or (value_type, operator_name) == ('boolean', 'equal'):
+                values = [0]
+            elif operator_name in THRESHOLD_OPERATORS:
+                values = []
+                for arg in args:
+                    values.extend(arg if isinstance(arg, (list, tuple, frozenset)) else [arg])
+            else:
+                raise NotAnalysable(operator_name)
+            for value in values:
+                if not _is_number(value):
+                    raise NotAnalysable(value)
+                # the counter is greater than every threshold
+                start = max(start, HOUR_COUNTER_FIELDS[field] * int(math.floor(value)) + 1)
+            continue
+
+        if field.split('.')[0] in HOUR_CONTEXT_FIELDS - HOUR_CONSTANT_FIELDS:
+            raise NotAnalysable(field)
+    return period, start
@@ -0,0 +1,341 @@
+# coding: utf-8
+"""
+Minimum and maximum prices over declared option domains without pricing every value.
+
+Quantities are split by the breakpoints of the conditions (``analysis.get_breakpoints``)
+into ranges where the conditions give the same results. Within such a range the price
+of a quantity is linear after the first units, so only its ends are calculated.
+
+Group prices are bounded with the tree of ``variants``: quantities of the options are
+assigned by ranges and the price expressions are evaluated over intervals
+(``PriceInterval``). Evaluation over intervals is exact when an expression uses every
+range once, its result is monotonic in every symbol, otherwise it's a safe bound.
+Domains which can't be analysed are enumerated.
+"""
+from __future__ import unicode_literals
+
+from collections import namedtuple
+
+import six
+
+from .analysis import NotAnalysable, get_breakpoints
+from .expressions import ArithmeticExpression, get_expression, to_decimal
+from .maps import OPTION_TYPE_CHOICES
+from .rules.price import parse_symbol
+from .values import OptionValue
+from .variants import VariantEnumerator, get_option_context
+
+PriceBounds = namedtuple('PriceBounds', ['min', 'max', 'exact'])
+
+
+class QuantityDomain(object):
+    """
+    Quantities ``start..end`` inclusive
+    """
+    value_type = OPTION_TYPE_CHOICES.QUANTITY
+
+    def __init__(self, start, end):
+        if start > end:
+            raise ValueError("Empty domain %s..%s" % (start, end))
+        self.start = max(int(start), 0)
+        self.end = int(end)
+
+
+class ChoiceDomain(object):
+    """
+    Values of a ``SELECT``, ``BOOL`` or any other option
+    """
+
+    def __init__(self, value_type, values=None):
+        """
+        :param values: ``[True, False]`` for ``BOOL`` by default
+        """
+        if values is None and value_type == OPTION_TYPE_CHOICES.BOOL:
+            values = [True, False]
+        if not values:
+            raise ValueError("Empty domain")
+        self.value_type = value_type
+        self.values = list(values)
+
+
+def split_range(points, start, end):
+    """
+    :return: list of (start, end) inclusive, a new range starts at every point
+    """
+    starts = sorted({start} | {p for p in points if start < p <= end})
+    ends = [s - 1 for s in starts[1:]] + [end]
+    return list(zip(starts, ends))
+
+
+class PriceInterval(object):
+    """
+    Closed interval of ``Decimal`` prices with the arithmetic of the price expressions
+    """
+    __slots__ = ('lo', 'hi')
+
+    def __init__(self, lo, hi):
+        self.lo = lo
+        self.hi = hi
+
+    @classmethod
+    def point(cls, value):
+        return cls(value, value)
+
+    def __repr__(self):
+        return 'PriceInterval(%r, %r)' % (self.lo, self.hi)
+
+    def __eq__(self, other):
+        return isinstance(other, PriceInterval) and (self.lo, self.hi) == (other.lo, other.hi)
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    @property
+    def is_point(self):
+        return self.lo == self.hi
+
+    @staticmethod
+    def _coerce(other):
+        if isinstance(other, PriceInterval):
+            return other
+        return PriceInterval(other, other)
+
+    @staticmethod
+    def _hull(values):
+        return PriceInterval(min(values), max(values))
+
+    def __add__(self, other):
+        other = self._coerce(other)
+        return PriceInterval(self.lo + other.lo, self.hi + other.hi)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        other = self._coerce(other)
+        return PriceInterval(self.lo - other.hi, self.hi - other.lo)
+
+    def __rsub__(self, other):
+        return self._coerce(other) - self
+
+    def __mul__(self, other):
+        other = self._coerce(other)
+        return self._hull([self.lo * other.lo, self.lo * other.hi,
+                           self.hi * other.lo, self.hi * other.hi])
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other):
+        other = self._coerce(other)
+        if other.lo <= 0 <= other.hi:
+            raise NotAnalysable("Division by %r" % (other,))
+        return self._hull([self.lo / other.lo, self.lo / other.hi,
+                           self.hi / other.lo, self.hi / other.hi])
+
+    def __rtruediv__(self, other):
+        return self._coerce(other) / self
+
+    __div__ = __truediv__
+    __rdiv__ = __rtruediv__
+
+    def __neg__(self):
+        return PriceInterval(-self.hi, -self.lo)
+
+    def __pos__(self):
+        return self
+
+
+def evaluate_interval(expression, values):
+    """
+    :param expression: compiled price expression
+    :param values: values of ``expression.symbols``, numbers or ``PriceInterval``
+    :return: (``PriceInterval``, exact)
+    :raises NotAnalysable: when the expression can't be evaluated over the intervals
+    """
+    ranges = [i for i, v in enumerate(values) if isinstance(v, PriceInterval) and not v.is_point]
+    points = [v.lo if isinstance(v, PriceInterval) else v for v in values]
+    if not ranges:
+        return PriceInterval.point(expression.evaluate(points)), True
+    if not isinstance(expression, ArithmeticExpression):
+        raise NotAnalysable(expression.expression)
+
+    args = expression.get_args(points)
+    for i in ranges:
+        args[i] = PriceInterval(to_decimal(values[i].lo), to_decimal(values[i].hi))
+    result = expression.func(*args)
+    if not isinstance(result, PriceInterval):
+        result = PriceInterval.point(result)
+
+    return result, all(expression.occurrences[expression.symbols[i]] == 1 for i in ranges)
+
+
+class BoundsEnumerator(VariantEnumerator):
+    """
+    Nodes of the variant tree are priced by intervals,
+    quantities of the options are assigned by ranges
+    """
+
+    def __init__(self, price_rule, base_price=0):
+        super(BoundsEnumerator, self).__init__(price_rule)
+        self.base_price = base_price
+        self.exact = True
+
+    def get_levels(self, order, domains, enumerate_quantities=False):
+        """
+        :return: list of [(value, option context)], the value of a quantity is
+            ``PriceInterval`` of its range
+        """
+        levels = []
+        for option_id in order:
+            domain = domains[option_id]
+            if not isinstance(domain, QuantityDomain):
+                levels.append([(value, get_option_context(option_id, value, domain.value_type))
+                               for value in domain.values])
+                continue
+
+            if enumerate_quantities:
+                points = range(domain.start, domain.end + 1)
+            else:
+                points = get_breakpoints(self.rule.ruleset_conditions, '%s.value' % option_id)
+            level = []
+            # empty quantity has no value
+            for start, end in split_range(set(points) | {1}, domain.start, domain.end):
+                context = get_option_context(option_id, start, domain.value_type)
+                level.append((PriceInterval(start, end), context))
+            levels.append(level)
+        return levels
+
+    def _get_symbol(self, symbol, accessor, calculation, assignment, nbp):
+        if symbol == 'bp':
+            return self.base_price
+        if symbol == 'nbp':
+            return nbp
+        parsed = parse_symbol(symbol)
+        value = assignment.get(parsed.get('id'))
+        if isinstance(value, PriceInterval) and not value.is_point and parsed['field'] == 'value':
+            return value
+        return accessor(calculation['extra_price_context'])
+
+    def _calculate(self, context, matches, assignment):
+        """
+        :return: ``PriceInterval`` of the sum of the price map
+        """
+        rule = self.rule
+        self.calculations += 1
+        calculation = rule.begin_calculation(self.base_price,
+                                             rule.get_group_price_context(context))
+        nbp = PriceInterval.point(self.base_price)
+        for position in self.iter_matched(matches):
+            condition = rule.ruleset_conditions[position]
+            expression = get_expression(condition.get('price'), rule.expression_engines)
+            values = [self._get_symbol(symbol, accessor, calculation, assignment, nbp)
+                      for symbol, accessor in zip(expression.symbols, expression.accessors)]
+            price, exact = evaluate_interval(expression, values)
+            ranged = [s for s, v in zip(expression.symbols, values)
+                      if isinstance(v, PriceInterval) and not v.is_point]
+            if 'nbp' in ranged and len(ranged) > 1:
+                # nbp depends on the same ranges
+                exact = False
+            self.exact = self.exact and exact
+            if condition.has_backwards():
+                nbp = price
+                continue
+            return price
+        return nbp
+
+
+def get_group_price_bounds(price_rule, domains, values=None):
+    """
+    Bounds of the sum of ``calculate_group_price`` over the combinations of the domains
+
+    :param domains: dict option id -> ``QuantityDomain`` or ``ChoiceDomain``
+    :param values: dict option id -> {'value': ..., 'type': ...} of the other options
+    :return: ``PriceBounds``
+    """
+    domains = {six.text_type(o): d for o, d in domains.items()}
+    try:
+        return _get_group_price_bounds(price_rule, domains, values)
+    except NotAnalysable:
+        return _get_group_price_bounds(price_rule, domains, values, enumerate_quantities=True)
+
+
+def _get_group_price_bounds(price_rule, domains, values, enumerate_quantities=False):
+    enumerator = BoundsEnumerator(price_rule)
+    order = enumerator.get_order(domains)
+    levels = enumerator.get_levels(order, domains, enumerate_quantities)
+    lo = hi = None
+    for _, _, price in enumerator.iter_nodes(order, levels, values):
+        lo = price.lo if lo is None else min(lo, price.lo)
+        hi = price.hi if hi is None else max(hi, price.hi)
+    return PriceBounds(lo, hi, enumerator.exact)
+
+
+def _quantity_prices(price_rule, start, end, base_price):
+    """
+    Prices of the quantities ``start..end`` where the conditions give the same results:
+    units ``start..end`` match the same rules and ``total_value`` doesn't change them.
+
+    :return: prices of ``start`` and of the next quantities until a unit doesn't change
+        the state of the calculation, and the price of ``end``.
+        Prices between the last two are linear.
+    """
+    option_value = OptionValue(end, OPTION_TYPE_CHOICES.QUANTITY)
+    segments = []
+    for first, last in split_range(get_breakpoints(price_rule.ruleset_conditions), 1, end):
+        if first < start <= last:
+            segments.extend([(first, start - 1), (start, last)])
+        else:
+            segments.append((first, last))
+
+    calculation = price_rule.begin_calculation(base_price)
+    prices = []
+
+    def total():
+        return sum(price_rule.get_price_map(calculation).values())
+
+    for first, last in segments:
+        context = option_value.get_quantity_context(first)
+        results = list(price_rule.get_rule(context))
+        for i in range(first, last + 1):
+            key = price_rule.get_calculation_key(calculation)
+            effect = price_rule.add_part(iter(results), context, calculation)
+            if i >= start:
+                prices.append(total())
+            if i == last or key != price_rule.get_calculation_key(calculation):
+                continue
+            price_rule.repeat_part(calculation, effect, last - i)
+            if last >= start:
+                prices.append(total())
+            break
+    return prices
+
+
+def get_price_bounds(price_rule, domain, base_price=0):
+    """
+    Bounds of ``calculate_price`` over the values of the domain
+
+    :param domain: ``QuantityDomain`` or ``ChoiceDomain``
+    :return: ``PriceBounds``, always exact
+    """
+    if isinstance(domain, ChoiceDomain):
+        prices = [price_rule.calculate_price(value, domain.value_type, base_price)[0]
+                  for value in domain.values]
+        return PriceBounds(min(prices), max(prices), True)
+
+    prices = []
+    start = domain.start
+    if start == 0:
+        prices.append(price_rule.calculate_price(0, domain.value_type, base_price)[0])
+        start = 1
+    if start <= domain.end:
+        conditions = price_rule.ruleset_conditions
+        try:
+            points = get_breakpoints(conditions) | get_breakpoints(conditions, 'total_value')
+        except NotAnalysable:
+            curve = price_rule.get_price_curve(domain.end, base_price)
+            prices.extend(curve[start:domain.end + 1])
+        else:
+            for first, last in split_range(points, start, domain.end):
+                prices.extend(_quantity_prices(price_rule, first, last, base_price))
+    return PriceBounds(min(prices), max(prices), True)
@@ -0,0 +1,147 @@
+# coding: utf-8
+from __future__ import unicode_literals
+
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+DEFAULT_COMPILE_CACHE_SIZE = 1024
+DEFAULT_RESULT_CACHE_TIMEOUT = 300
+
+
+class LRUCache(object):
+    """
+    Bounded thread-safe mapping, the least recently used keys are evicted first.
+    """
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data[key] = value
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            self._evict()
+
+    def get_or_create(self, key, factory):
+        """
+        Return cached value or create it with ``factory()``.
+        ``factory`` is called outside of the lock, when two threads race
+        the first stored value wins.
+        """
+        missing = object()
+        value = self.get(key, missing)
+        if value is not missing:
+            return value
+
+        value = factory()
+        if self.maxsize <= 0:
+            return value
+        with self._lock:
+            value = self._data.setdefault(key, value)
+            self._evict()
+        return value
+
+    def _evict(self):
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def resize(self, maxsize):
+        with self._lock:
+            self.maxsize = maxsize
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+        }
+
+
+_compile_cache = None
+_compile_cache_lock = threading.Lock()
+
+
+def get_compile_cache():
+    """
+    Process-wide cache of compiled conditions.
+    Size is ``settings.QUERYBUILDER_RULES_COMPILE_CACHE_SIZE``, ``0`` disables it.
+    """
+    global _compile_cache
+    if _compile_cache is None:
+        with _compile_cache_lock:
+            if _compile_cache is None:
+                maxsize = getattr(settings, 'QUERYBUILDER_RULES_COMPILE_CACHE_SIZE',
+                                  DEFAULT_COMPILE_CACHE_SIZE)
+                _compile_cache = LRUCache(maxsize)
+    return _compile_cache
+
+
+class ResultCache(object):
+    """
+    Results of calculations stored in a django cache, keys are hashes of json-like parts.
+    Values are stored as they are, make them safe for the cache serializer.
+    """
+
+    def __init__(self, alias=None, timeout=None, prefix='querybuilder_rules'):
+        """
+        :param alias: django cache alias,
+            ``settings.QUERYBUILDER_RULES_RESULT_CACHE`` or ``default``
+        :param timeout: TTL in seconds,
+            ``settings.QUERYBUILDER_RULES_RESULT_CACHE_TIMEOUT`` or 300
+        """
+        self.alias = alias or getattr(settings, 'QUERYBUILDER_RULES_RESULT_CACHE', 'default')
+        if timeout is None:
+            timeout = getattr(settings, 'QUERYBUILDER_RULES_RESULT_CACHE_TIMEOUT',
+                              DEFAULT_RESULT_CACHE_TIMEOUT)
+        self.timeout = timeout
+        self.prefix = prefix
+
+    @property
+    def cache(self):
+        from django.core.cache import caches
+        return caches[self.alias]
+
+    def make_key(self, *parts):
+        from .utils import get_hash
+        return '%s:%s' % (self.prefix, get_hash(parts))
+
+    def get(self, key, default=None):
+        return self.cache.get(key, default)
+
+    def set(self, key, value):
+        self.cache.set(key, value, self.timeout)
@@ -0,0 +1,169 @@
+# coding: utf-8
+from __future__ import unicode_literals
+
+import datetime
+from string import Formatter
+
+import six
+
+from .conditions import RuleCondition
+from .maps import BACKWARDS_FIELDS, OPERATORS, OPERATORS_FOR_TYPES, time_between
+from .values import get_accessor
+
+# Inline source for the stock operators, keyed by the operator function,
+# so operators replaced or added by the project are still called as functions.
+INLINE_OPERATORS = {
+    OPERATORS['equal']: '({v} == {0})',
+    OPERATORS['not_equal']: '(not {v} == {0})',
+    OPERATORS['in']: '({v} in {0})',
+    OPERATORS['not_in']: '(not {v} in {0})',
+    OPERATORS['greater']: '({v} > {0})',
+    OPERATORS['less']: '({v} < {0})',
+    OPERATORS['greater_or_equal']: '({v} >= {0})',
+    OPERATORS['less_or_equal']: '({v} <= {0})',
+    OPERATORS['between']: '({0} <= {v} <= {1})',
+    OPERATORS['not_between']: '(not {0} <= {v} <= {1})',
+    OPERATORS['is_empty']: '(not {v})',
+    OPERATORS['is_not_empty']: '(not not {v})',
+    OPERATORS_FOR_TYPES['time']['between']: '_time_between({v}, {0}, {1})',
+    OPERATORS_FOR_TYPES['time']['not_between']: '(not _time_between({v}, {0}, {1}))',
+    OPERATORS_FOR_TYPES['boolean']['equal']: '(bool({v}) == {0})',
+}
+
+# Arguments are hoisted already converted, e.g. ``bool(test)`` for boolean equal
+INLINE_ARGS_PREPARE = {
+    OPERATORS_FOR_TYPES['boolean']['equal']: lambda args: tuple(map(bool, args)),
+}
+
+
+def template_arity(template):
+    return len({name for _, name, _, _ in Formatter().parse(template)
+                if name is not None and name != 'v'})
+
+
+# Statement which continues evaluation of the group siblings
+GROUP_CONTINUE = {
+    'AND': 'if _r:',
+    'OR': 'if not _r:',
+}
+
+# Every nested group is one level deeper, deeper trees are compiled into closures
+MAX_NESTING = 80
+
+
+class SourceBuilder(object):
+    """
+    Turns a condition tree into the source of a single function.
+
+    Group siblings are sequential ``if`` blocks testing the result of the previous sibling,
+    so evaluation short-circuits the same way as ``RuleCondition``. A sibling is evaluated
+    only after all previous ones, every field is resolved once per evaluation path
+    into a local variable.
+    """
+
+    def __init__(self, condition):
+        self.condition = condition
+        self.namespace = {
+            '_time_between': time_between,
+            '_dt_types': (datetime.time, datetime.datetime, datetime.date),
+        }
+        self.has_backwards = False
+        self.lines = ['def _compiled(context):']
+        self._fields = {}
+        self._rule_builder = RuleCondition({})
+
+    def const(self, value, prefix='_c'):
+        name = '%s%s' % (prefix, len(self.namespace))
+        self.namespace[name] = value
+        return name
+
+    def emit(self, level, line):
+        if level > MAX_NESTING:
+            raise ValueError("Condition is too deep for code generation")
+        self.lines.append('    ' * level + line)
+
+    def field(self, field, bound, level):
+        """
+        :return: name of the local variable with the resolved field
+        """
+        if field not in self._fields:
+            index = len(self._fields)
+            self._fields[field] = (self.const(get_accessor(field), prefix='_f'), '_v%s' % index)
+        accessor_name, local_name = self._fields[field]
+        if field not in bound:
+            self.emit(level, '%s = %s(context)' % (local_name, accessor_name))
+        return local_name
+
+    def build_rule(self, rule, bound, level):
+        field, operator_name, value_type, args = self._rule_builder.parse_rule(rule)
+        if field in BACKWARDS_FIELDS:
+            self.has_backwards = True
+
+        _operator = self._rule_builder.get_operator(operator_name, value_type)
+        template = INLINE_OPERATORS.get(_operator)
+        value = self.field(field, bound, level)
+        if template is None or len(args) != template_arity(template):
+            args_src = ''.join(', ' + self.const(a) for a in args)
+            expr = '%s(%s%s)' % (self.const(_operator, prefix='_op'), value, args_src)
+        else:
+            prepare = INLINE_ARGS_PREPARE.get(_operator)
+            if prepare:
+                args = prepare(args)
+            expr = template.format(*[self.const(a) for a in args], v=value)
+
+        if self._rule_builder.has_type_guard(operator_name, value_type):
+            expr = '(isinstance(%s, _dt_types) and %s)' % (value, expr)
+        self.emit(level, '_r = %s' % expr)
+        return bound | {field}
+
+    def build_node(self, node, bound, level):
+        if 'condition' in node:
+            return self.build_group(node, bound, level)
+        return self.build_rule(node, bound, level)
+
+    def build_group(self, condition, bound, level):
+        """
+        :param bound: fields already resolved on this evaluation path
+        :return: fields resolved whenever the group is evaluated
+        """
+        rules = condition['rules']
+        if not rules:
+            self.emit(level, '_r = None')
+            return bound
+
+        first_bound = current_bound = self.build_node(rules[0], bound, level)
+        for rule in rules[1:]:
+            # skipped siblings keep the result which skips the rest of them
+            self.emit(level, GROUP_CONTINUE[condition['condition']])
+            current_bound = self.build_node(rule, current_bound, level + 1)
+        return first_bound
+
+    def build(self):
+        self.build_group(self.condition, frozenset(), 1)
+        self.emit(1, 'return _r')
+        return '\n'.join(self.lines) + '\n'
+
+
+class GeneratedRuleCondition(RuleCondition):
+    """
+    Compiles the whole condition tree into one generated python function
+    instead of nested closures. Results are the same as for ``RuleCondition``.
+    """
+
+    @property
+    def source(self):
+        return getattr(self._compiled, 'source', None)
+
+    def _compile(self):
+        builder = SourceBuilder(self.get_condition())
+        try:
+            source = builder.build()
+        except ValueError:
+            return super(GeneratedRuleCondition, self)._compile()
+        namespace = builder.namespace
+        six.exec_(compile(source, '<condition>', 'exec'), namespace)
+
+        _compiled = namespace['_compiled']
+        _compiled.source = source
+        _compiled.has_backwards = builder.has_backwards
+        return _compiled
@@ -0,0 +1,442 @@
+# coding: utf-8
+"""
+Evaluation of conditions over columns with numpy.
+
+Contexts are given as columns: an array of values for every field path of the rules
+(``quantity.value``, ``ship.value``), a condition gives a boolean mask of the matched rows.
+Rules over numeric columns are numpy comparisons, other rules call the operator for every
+value. ``AND``/``OR`` groups are ``&``/``|`` of the masks.
+
+Missing values are ``UNDEFINED`` as in ``Context``: every value of a field without a column
+and masked values of a ``numpy.ma`` column. They get the result of the operator for ``UNDEFINED``.
+
+numpy is an optional dependency, it's only imported by this module.
+"""
+from __future__ import unicode_literals
+
+import datetime
+
+import numpy
+import six
+
+from .analysis import NotAnalysable
+from .maps import OPERATORS, OPERATORS_FOR_TYPES, OPTION_TYPE_CHOICES, UNDEFINED
+from .values import Context, FieldAccessor, get_accessor, get_floor_hours
+
+# bool, int, uint and float arrays
+NUMERIC_KINDS = 'biuf'
+
+# ints are compared exactly with float64
+MAX_EXACT_INT = 2 ** 53
+
+
+def _between(v, a, b):
+    return (a <= v) & (v <= b)
+
+
+# numpy versions of the stock operators for numeric columns, keyed by the operator function
+VECTOR_OPERATORS = {
+    OPERATORS['equal']: lambda v, test: v == test,
+    OPERATORS['not_equal']: lambda v, test: v != test,
+    OPERATORS['in']: lambda v, test: numpy.isin(v, list(test)),
+    OPERATORS['not_in']: lambda v, test: ~numpy.isin(v, list(test)),
+    OPERATORS['greater']: lambda v, test: v > test,
+    OPERATORS['less']: lambda v, test: v < test,
+    OPERATORS['greater_or_equal']: lambda v, test: v >= test,
+    OPERATORS['less_or_equal']: lambda v, test: v <= test,
+    OPERATORS['between']: _between,
+    OPERATORS['not_between']: lambda v, a, b: ~_between(v, a, b),
+    OPERATORS['is_empty']: lambda v: v == 0,
+    OPERATORS['is_not_empty']: lambda v: v != 0,
+    OPERATORS_FOR_TYPES['boolean']['equal']: lambda v, test: (v != 0) == bool(test),
+}
+
+
+def _is_vector_arg(arg):
+    if isinstance(arg, (frozenset, list, tuple)):
+        return all(_is_vector_arg(a) for a in arg)
+    if isinstance(arg, float):
+        return True
+    return isinstance(arg, six.integer_types) and abs(arg) <= MAX_EXACT_INT
+
+
+def constant(value, size):
+    """
+    Column of the same value, a read-only view of one item
+    """
+    item = numpy.empty(1, dtype=object)
+    item[0] = value
+    if isinstance(value, (bool, float) + six.integer_types) and _is_vector_arg(value):
+        item = numpy.array([value])
+    return numpy.broadcast_to(item, (size,))
+
+
+def is_constant(values):
+    return len(values) > 1 and values.strides == (0,)
+
+
+class Columns(object):
+    """
+    Columns of the contexts, values and undefined flags are prepared once per field
+    """
+
+    def __init__(self, columns, size=None):
+        """
+        :param columns: dict field path -> array-like, ``numpy.ma`` masked values are undefined.
+            Lists are converted with ``numpy.asarray``, use ``dtype=object`` for mixed types.
+        :param size: number of rows, required when there are no columns
+        """
+        self.columns = columns
+        self.size = size
+        for values in columns.values():
+            if self.size is None:
+                self.size = len(values)
+            elif len(values) != self.size:
+                raise ValueError("Columns have different lengths")
+        if self.size is None:
+            raise ValueError("Number of rows is unknown")
+        self._prepared = {}
+
+    def get(self, field):
+        """
+        :return: (values, undefined), ``values`` is ``None`` when the field has no column,
+            ``undefined`` is a boolean array or ``None`` when every value is defined
+        """
+        if field not in self._prepared:
+            values = self.columns.get(field)
+            undefined = None
+            if numpy.ma.isMaskedArray(values):
+                undefined = numpy.ma.getmaskarray(values)
+                values = numpy.ma.getdata(values)
+                if not undefined.any():
+                    undefined = None
+            elif values is not None:
+                values = numpy.asarray(values)
+            self._prepared[field] = (values, undefined)
+        return self._prepared[field]
+
+
+class ColumnarEvaluator(object):
+    """
+    Masks of ``RuleCondition`` for columns, same results as calling the condition
+    for every row
+    """
+
+    def __init__(self, columns, size=None):
+        if not isinstance(columns, Columns):
+            columns = Columns(columns, size)
+        self.columns = columns
+        self.size = columns.size
+
+    def rule_mask(self, condition, rule):
+        """
+        :param condition: ``RuleCondition`` parsing the rule
+        :param rule: dict rule in querybuilder format
+        :raises NotAnalysable: when the rule raises for a value, rows may not reach
+            the rule when the conditions are called one by one
+        """
+        try:
+            return self._rule_mask(condition, rule)
+        except NotAnalysable:
+            raise
+        except Exception:
+            raise NotAnalysable(rule)
+
+    def _rule_mask(self, condition, rule):
+        field, operator_name, value_type, args = condition.parse_rule(rule)
+        _operator = condition._build_operator(rule)
+        undefined_result = bool(_operator(UNDEFINED, *args))
+
+        values, undefined = self.columns.get(field)
+        if values is None:
+            return numpy.full(self.size, undefined_result, dtype=bool)
+
+        if undefined is None and is_constant(values):
+            return numpy.full(self.size, bool(_operator(values[0], *args)), dtype=bool)
+
+        vector = VECTOR_OPERATORS.get(condition.get_operator(operator_name, value_type))
+        if vector is not None and values.dtype.kind in NUMERIC_KINDS \
+                and not condition.has_type_guard(operator_name, value_type) \
+                and all(_is_vector_arg(a) for a in args):
+            mask = numpy.asarray(vector(values, *args), dtype=bool)
+            if undefined is not None:
+                mask = numpy.where(undefined, undefined_result, mask)
+            return mask
+
+        func = numpy.frompyfunc(lambda v: bool(_operator(v, *args)), 1, 1)
+        if undefined is None:
+            return func(values).astype(bool)
+        mask = numpy.full(self.size, undefined_result, dtype=bool)
+        defined = ~undefined
+        if defined.any():
+            mask[defined] = func(values[defined]).astype(bool)
+        return mask
+
+    def group_mask(self, condition, group):
+        rules = group['rules']
+        if not rules:
+            return numpy.zeros(self.size, dtype=bool)
+
+        mask = None
+        for rule in rules:
+            if 'condition' in rule:
+                rule_mask = self.group_mask(condition, rule)
+            else:
+                rule_mask = self.rule_mask(condition, rule)
+            if mask is None:
+                mask = rule_mask
+            elif group['condition'] == 'AND':
+                mask = mask & rule_mask
+            else:
+                mask = mask | rule_mask
+        return mask
+
+    def mask(self, condition):
+        """
+        :param condition: ``RuleCondition``
+        :return: boolean array, True for the rows matched by the condition
+        """
+        return self.group_mask(condition, condition.get_condition())
+
+    def masks(self, conditions):
+        return [self.mask(condition) for condition in conditions]
+
+
+def get_masks(conditions, columns, size=None):
+    """
+    :param conditions: list of ``RuleCondition``, e.g. ``rule.ruleset_conditions``
+    :param columns: dict field path -> array-like
+    :return: list of boolean arrays
+    :raises NotAnalysable: see ``ColumnarEvaluator.rule_mask``
+    """
+    return ColumnarEvaluator(columns, size).masks(conditions)
+
+
+def first_matches(masks, size=None):
+    """
+    :param masks: masks of a ruleset
+    :return: int array, position of the first matched condition for every row or -1
+    """
+    if not masks:
+        return numpy.full(size or 0, -1, dtype=int)
+    stacked = numpy.vstack(masks)
+    return numpy.where(stacked.any(axis=0), stacked.argmax(axis=0), -1)
+
+
+def get_match_groups(masks, size):
+    """
+    Rows matched by the same conditions
+
+    :param masks: masks of a ruleset
+    :param size: number of rows
+    :return: (groups, matched), int array of the group of every row and
+        tuples of the matched positions of every group
+    """
+    if not size:
+        return numpy.zeros(0, dtype=int), []
+    if not masks:
+        return numpy.zeros(size, dtype=int), [()]
+    packed = numpy.packbits(numpy.vstack(masks), axis=0)
+    unique, groups = numpy.unique(packed, axis=1, return_inverse=True)
+    bits = numpy.unpackbits(unique, axis=0)[:len(masks)]
+    matched = [tuple(numpy.flatnonzero(bits[:, group]).tolist()) for group in range(bits.shape[1])]
+    return groups.ravel(), matched
+
+
+def get_runs(groups):
+    """
+    :return: list of (start, end, group) of consecutive rows of the same group, ``end`` excluded
+    """
+    if not len(groups):
+        return []
+    starts = numpy.concatenate([[0], numpy.flatnonzero(numpy.diff(groups)) + 1])
+    ends = numpy.concatenate([starts[1:], [len(groups)]])
+    return list(zip(starts.tolist(), ends.tolist(), groups[starts].tolist()))
+
+
+def _apply(func, column):
+    return numpy.frompyfunc(func, 1, 1)(column) if len(column) else numpy.empty(0, dtype=object)
+
+
+def _weekday(values):
+    # 1970-01-01 is thursday
+    return (values.astype('M8[D]').astype(int) + 3) % 7
+
+
+# Attributes of dates, datetimes and times computed from ``datetime64`` columns,
+# kind -> attribute -> function
+DATETIME64_ATTRIBUTES = {
+    'date': {
+        'year': lambda values: values.astype('M8[Y]').astype(int) + 1970,
+        'month': lambda values: values.astype('M8[M]').astype(int) % 12 + 1,
+        'day': lambda values: (values.astype('M8[D]') - values.astype('M8[M]')).astype(int) + 1,
+        'weekday': _weekday,
+        'isoweekday': lambda values: _weekday(values) + 1,
+    },
+    'time': {
+        'hour': lambda values: (values.astype('M8[h]') - values.astype('M8[D]')).astype(int),
+        'minute': lambda values: (values.astype('M8[m]') - values.astype('M8[h]')).astype(int),
+    },
+}
+DATETIME64_ATTRIBUTES['datetime'] = dict(DATETIME64_ATTRIBUTES['date'],
+                                         **DATETIME64_ATTRIBUTES['time'])
+
+
+class _Shifted(object):
+    """
+    ``start`` date or datetime shifted by ``offsets`` days (``D``) or hours (``h``),
+    naive values are calculated as ``datetime64``
+    """
+
+    def __init__(self, start, offsets, unit):
+        self.start = start
+        self.offsets = offsets
+        self.unit = unit
+        self.values = None
+        if getattr(start, 'tzinfo', None) is None:
+            self.values = numpy.datetime64(start) + offsets * numpy.timedelta64(1, unit)
+
+    def objects(self, func=None):
+        """
+        :param func: function of a python date or datetime
+        :return: object array of python dates or datetimes
+        """
+        if self.values is None:
+            delta = datetime.timedelta(**{'D': {'days': 1}, 'h': {'hours': 1}}[self.unit])
+            values = _apply(lambda offset: self.start + delta * offset,
+                            self.offsets.astype(object))
+        else:
+            values = self.values.astype(object)
+        if func is not None:
+            values = _apply(func, values)
+        return values
+
+
+def _range_fields(option_value, heads):
+    """
+    Fields of the part contexts of ``OptionValue.get_context_range``
+
+    :param heads: fields to calculate
+    :return: (size, fields, datetimes), ``fields`` is a dict field -> column,
+        ``datetimes`` is a dict field -> (``datetime64`` column, kind) for naive values
+    :raises NotAnalysable: for other types of values
+    """
+    value_type = option_value.value_type
+    totals = option_value.get_range_totals()
+    shifted = {}
+
+    if value_type == OPTION_TYPE_CHOICES.QUANTITY:
+        size = max(option_value.value, 0)
+        fields = {'value': numpy.arange(1, size + 1)}
+
+    elif value_type == OPTION_TYPE_CHOICES.DATE_RANGE:
+        start_date, end_date = option_value.value
+        size = int(totals['total_days'])
+        i = numpy.arange(size)
+        days = _Shifted(start_date, i, 'D')
+        shifted = {'value': (days, 'date'), 'date': (days, 'date'), 'end_date': (days, 'date')}
+        fields = {
+            'start_date': start_date,
+            'days': i + 1,
+            'hours': 24 * i + 24,
+        }
+
+    elif value_type in (OPTION_TYPE_CHOICES.DATETIME_RANGE_DAY,
+                        OPTION_TYPE_CHOICES.DATETIME_RANGE_HOUR):
+        start_dt, end_dt = option_value.value
+        if value_type == OPTION_TYPE_CHOICES.DATETIME_RANGE_DAY:
+            size = int(totals['total_days']) if totals['total_hours'] > 24 else 1
+            i = numpy.arange(size)
+            datetimes = _Shifted(start_dt, i, 'D')
+            fields = {
+                'days': i + 1,
+                'hours': numpy.where(i == 0, 1, 24 * i),
+            }
+        else:
+            size = get_floor_hours(end_dt - start_dt)
+            hours = numpy.arange(1, size + 1)
+            datetimes = _Shifted(start_dt, hours, 'h')
+            fields = {
+                'days': (3600 * hours - 60) // (24 * 3600) + 1,
+                'hours': hours,
+            }
+        fields['start_datetime'] = start_dt
+        shifted = {
+            'value': (datetimes, 'datetime'),
+            'datetime': (datetimes, 'datetime'),
+            'end_datetime': (datetimes, 'datetime'),
+            'time': (datetimes, 'time'),
+            'date': (datetimes, 'date'),
+        }
+
+    else:
+        raise NotAnalysable(value_type)
+
+    fields.update(totals)
+    fields = {field: value if isinstance(value, numpy.ndarray) else constant(value, size)
+              for field, value in fields.items() if field in heads}
+    datetimes = {}
+    for field, (values, kind) in shifted.items():
+        if field not in heads:
+            continue
+        if kind == 'datetime' or not isinstance(values.start, datetime.datetime):
+            fields[field] = values.objects()
+        else:
+            fields[field] = values.objects(lambda v, kind=kind: getattr(v, kind)())
+        if values.values is not None:
+            datetimes[field] = (values.values, kind)
+    return size, fields, datetimes
+
+
+def _undefined_masked(column):
+    if column.dtype != object or not len(column):
+        return column
+    if is_constant(column):
+        if column[0] is UNDEFINED:
+            return numpy.ma.masked_array(column, mask=True)
+        return column
+    undefined = _apply(lambda v: v is UNDEFINED, column).astype(bool)
+    if undefined.any():
+        return numpy.ma.masked_array(column, mask=undefined)
+    return column
+
+
+def get_range_columns(option_value, fields, extra_context=None):
+    """
+    Columns of the contexts of the range parts, as ``BaseRule.get_rule_context`` makes them
+
+    :param option_value: non-empty ``OptionValue`` of a range or quantity
+    :param fields: field paths read by the rules
+    :param extra_context: fields over the part contexts
+    :return: (size, dict field path -> column), fields missing in the contexts have no column
+    :raises NotAnalysable:
+    """
+    extra_context = extra_context or {}
+    accessors = {}
+    for path in fields:
+        accessor = get_accessor(path)
+        if not isinstance(accessor, FieldAccessor):
+            raise NotAnalysable(path)
+        accessors[path] = accessor
+    heads = {accessor.steps[0].bit for accessor in accessors.values()}
+    size, part_fields, datetimes = _range_fields(option_value, heads - set(extra_context))
+
+    columns = {}
+    for path, accessor in accessors.items():
+        head = accessor.steps[0].bit
+        steps = accessor.steps[1:]
+        if head in extra_context:
+            column = constant(accessor(Context(extra_context)), size)
+        elif head not in part_fields:
+            continue
+        elif not steps:
+            column = part_fields[head]
+        elif len(steps) == 1 and head in datetimes \
+                and steps[0].bit in DATETIME64_ATTRIBUTES[datetimes[head][1]]:
+            values, kind = datetimes[head]
+            column = DATETIME64_ATTRIBUTES[kind][steps[0].bit](values)
+        else:
+            column = _apply(lambda v, head=head, accessor=accessor: accessor.resolve({head: v}),
+                            part_fields[head].astype(object))
+        columns[path] = _undefined_masked(column)
+    return size, columns
@@ -3,11 +3,17 @@ from __future__ import unicode_literals
 
 import datetime
 
-from .maps import CONDITIONS, OPERATORS, TYPES, BACKWARDS_FIELDS, OPERATORS_FOR_TYPES
-from .values import Context
+from .cache import get_compile_cache
+from .maps import (
+    CONDITIONS_SHORT_CIRCUIT, OPERATORS, TYPES, BACKWARDS_FIELDS, OPERATORS_FOR_TYPES, ValueSet,
+)
+from .utils import get_hash, normalize_rule
+from .values import Context, get_accessor
 
 
 class RuleCondition(object):
+    use_cache = True
+
     def __init__(self, condition, is_sub=False):
         '''
         {"condition": "AND",
@@ -21,6 +27,7 @@ class RuleCondition(object):
         self.condition = condition
         self.is_sub = is_sub
         self._compiled = None
+        self._has_backwards = False
 
     def get_condition(self):
         if self.is_sub:
@@ -28,23 +35,36 @@ class RuleCondition(object):
         return self.condition['rule']
 
     def _create_func(self, _operator, field, _args):
+        accessor = get_accessor(field)
+
         def _func(context):
-            v = context[field]
+            v = accessor(context)
             res = _operator(v, *_args)
             # print field, v, _args, res
             return res
         return _func
 
+    @staticmethod
+    def get_operator(operator_name, value_type):
+        _operator = OPERATORS_FOR_TYPES.get(value_type, {}).get(operator_name)
+        if not _operator:
+            _operator = OPERATORS[operator_name]
+        return _operator
+
+    @staticmethod
+    def has_type_guard(operator_name, value_type):
+        """
+        Date and time operators return False for values of another type
+        """
+        return not operator_name.startswith('is_') and value_type in ['date', 'time', 'datetime']
+
     def _build_operator(self, rule):
         operator_name = rule['operator']
         value_type = rule['type']
 
-        _operator = OPERATORS_FOR_TYPES.get(value_type, {}).get(operator_name)
-        if not _operator:
-            _operator = OPERATORS[operator_name]
-        is_dt_type = value_type in ['date', 'time', 'datetime']
+        _operator = self.get_operator(operator_name, value_type)
 
-        if not operator_name.startswith('is_') and is_dt_type:
+        if self.has_type_guard(operator_name, value_type):
             _operator = (
                 lambda _op: lambda value, *args: (_op(value, *args) if
                                                   isinstance(value, (datetime.time, datetime.datetime, datetime.date))
@@ -52,20 +72,20 @@ class RuleCondition(object):
                                                   else False))(_operator)
         return _operator
 
-    def _build_test_func(self, rule):
-        func_info = {'has_backwards': False}
+    def parse_rule(self, rule):
+        """
+        Prepare a single rule for compilation
+
+        :param rule: dict rule in querybuilder format
+        :return: tuple (field, operator_name, value_type, args)
+        """
         _operator_name = rule['operator']
         _type = rule['type']
         value_type = TYPES[_type]
 
-        _operator = self._build_operator(rule)
-
         args = ()
         field = rule.get('field', rule['id'])
 
-        if field in BACKWARDS_FIELDS:
-            func_info['has_backwards'] = True
-
         value = rule.get('value')
 
         if value is not None:
@@ -79,47 +99,81 @@ class RuleCondition(object):
                     args = tuple(test_value)
                 elif _operator_name in ["in", "not_in"]:
                     args = (test_value,)
+                    if _type != 'double':
+                        # py2 hashes Decimal and float differently even when they are equal
+                        args = (ValueSet(test_value),)
                 else:
                     args = (test_value[0],)
             else:
                 args = (test_value,)
+        return field, _operator_name, _type, args
+
+    def _build_test_func(self, rule):
+        func_info = {'has_backwards': False}
+        field, _operator_name, _type, args = self.parse_rule(rule)
+
+        _operator = self._build_operator(rule)
+
+        if field in BACKWARDS_FIELDS:
+            func_info['has_backwards'] = True
 
         func_info['operator'] = _operator
         func_info['test_func'] = self._create_func(_operator, field, args)
         return func_info
 
+    def get_cache_key(self):
+        cls = type(self)
+        return '%s.%s:%s' % (cls.__module__, cls.__name__,
+                             get_hash(normalize_rule(self.get_condition())))
+
     def compile(self):
+        """
+        Compiled functions are shared by equal conditions through the process-wide cache
+        """
+        if self.use_cache:
+            _compiled = get_compile_cache().get_or_create(self.get_cache_key(), self._compile)
+        else:
+            _compiled = self._compile()
+        self._compiled = _compiled
+        self._has_backwards = _compiled.has_backwards
+        return _compiled
+
+    def _compile(self):
         condition = self.get_condition()
-        cond_func = CONDITIONS[condition['condition']]
+        is_resolved = CONDITIONS_SHORT_CIRCUIT[condition['condition']]
         rule_func_list = []
 
-        self._has_backwards = False
+        has_backwards = False
 
         for rule in condition['rules']:
             if 'condition' in rule:
-                condition = RuleCondition(rule, is_sub=True)
-                condition.compile()
-                if condition.has_backwards():
-                    self._has_backwards = True
-
-                rule_func_list.append(condition)
+                sub_condition = RuleCondition(rule, is_sub=True)
+                rule_func_list.append(sub_condition.compile())
+                has_backwards = sub_condition.has_backwards() or has_backwards
             else:
                 func_info = self._build_test_func(rule)
-                self._has_backwards = func_info['has_backwards'] or self._has_backwards
+                has_backwards = func_info['has_backwards'] or has_backwards
                 rule_func_list.append(func_info['test_func'])
 
         def _compiled(context):
             res = None
             for rule_func in rule_func_list:
-                if res is None:
-                    res = rule_func(context)
-                else:
-                    res = cond_func(res, rule_func(context))
+                res = rule_func(context)
+                if is_resolved(res):
+                    break
             return res
 
-        self._compiled = _compiled
+        _compiled.has_backwards = has_backwards
         return _compiled
 
+    def get_compiled(self):
+        """
+        :return: compiled function of a ``Context``
+        """
+        if self._compiled is None:
+            self.compile()
+        return self._compiled
+
     def __call__(self, context):
         if isinstance(context, dict):
             context = Context(context)
@@ -140,4 +194,6 @@ class RuleCondition(object):
         return dict(self.condition)
 
     def has_backwards(self):
+        if self._compiled is None:
+            self.compile()
         return self._has_backwards
@@ -0,0 +1,195 @@
+# coding: utf-8
+"""
+Indexes selecting the conditions of a ruleset which may match a context,
+so ``BaseRule.get_rule`` doesn't test every condition in order.
+"""
+from __future__ import unicode_literals
+
+import math
+from bisect import bisect_left
+from decimal import Decimal
+
+import six
+
+from .analysis import NotAnalysable, get_fields, get_thresholds, get_values
+from .cache import LRUCache
+from .utils import get_hash
+from .values import get_accessor
+
+# Less indexed conditions are just tested in order
+MIN_INDEXED = 2
+
+
+def is_number(value):
+    if isinstance(value, Decimal):
+        return value.is_finite()
+    return isinstance(value, six.integer_types + (float,)) and not math.isnan(value)
+
+
+class IntervalIndex(object):
+    """
+    Conditions reading only one numeric field give the same result between their thresholds.
+
+    The thresholds are sorted, a value is located with ``bisect`` in a slot: the open
+    interval between two thresholds or a threshold itself. The indexed conditions are
+    tested once for the first value of a slot, other values of the slot reuse the matches.
+    Other (residual) conditions are tested for every context.
+    """
+
+    def __init__(self, field, thresholds, indexed, size):
+        """
+        :param field: field path
+        :param thresholds: thresholds of the indexed conditions
+        :param indexed: positions of the indexed conditions in the ruleset
+        :param size: length of the ruleset
+        """
+        self.field = field
+        self.accessor = get_accessor(field)
+        self.points = sorted(thresholds)
+        self.indexed = tuple(sorted(indexed))
+        indexed = set(indexed)
+        self.residual = tuple(p for p in range(size) if p not in indexed)
+        self._slots = {}
+
+    def get_slot(self, value):
+        i = bisect_left(self.points, value)
+        if i < len(self.points) and self.points[i] == value:
+            return 2 * i + 1
+        return 2 * i
+
+    def candidates(self, conditions, context):
+        """
+        :param conditions: compiled ruleset the index was built for
+        :return: list of (position, matched) in the ruleset order, a condition with
+            ``matched=False`` has to be tested. ``None`` when the context can't be dispatched.
+        """
+        value = self.accessor(context)
+        if not is_number(value):
+            return None
+
+        slot = self.get_slot(value)
+        candidates = self._slots.get(slot)
+        if candidates is None:
+            candidates = sorted([(p, True) for p in self.indexed if conditions[p](context)] +
+                                [(p, False) for p in self.residual])
+            self._slots[slot] = candidates
+        return candidates
+
+
+def build_interval_index(conditions):
+    """
+    Index the conditions of the field read by most single-field numeric conditions
+
+    :param conditions: list of ``RuleCondition``
+    :return: ``IntervalIndex`` or ``None``
+    """
+    by_field = {}
+    for position, condition in enumerate(conditions):
+        rule = condition.get_condition()
+        fields = get_fields(rule)
+        if len(fields) != 1:
+            continue
+        field = fields.pop()
+        try:
+            thresholds = get_thresholds(rule, field)
+        except NotAnalysable:
+            continue
+        by_field.setdefault(field, {})[position] = thresholds
+
+    if not by_field:
+        return None
+    field, indexed = max(by_field.items(), key=lambda item: (len(item[1]), -min(item[1])))
+    if len(indexed) < MIN_INDEXED:
+        return None
+    return IntervalIndex(field, set().union(*indexed.values()), indexed, len(conditions))
+
+
+# Values looked up in ``HashIndex``, others are compared by ``==`` with another hash
+HASHABLE_TYPES = six.integer_types + six.string_types
+
+
+class HashIndex(object):
+    """
+    Conditions checking a discrete field with ``equal``/``in`` can only match
+    a known set of values. Candidates are looked up by the value of the field
+    and tested unless the condition is exactly the value check.
+    Other (residual) conditions are tested for every context.
+    """
+
+    def __init__(self, field, values, size):
+        """
+        :param field: field path
+        :param values: dict position -> (values, exact) of the indexed conditions
+        :param size: length of the ruleset
+        """
+        self.field = field
+        self.accessor = get_accessor(field)
+        self.indexed = tuple(sorted(values))
+        self.residual = tuple(p for p in range(size) if p not in values)
+
+        candidates = {}
+        for position, (keys, exact) in values.items():
+            for key in keys:
+                candidates.setdefault(key, []).append((position, exact))
+        residual = [(p, False) for p in self.residual]
+        self._default = residual
+        self._candidates = {key: sorted(c + residual) for key, c in candidates.items()}
+
+    def candidates(self, conditions, context):
+        """
+        Same as ``IntervalIndex.candidates``
+        """
+        value = self.accessor(context)
+        if not isinstance(value, HASHABLE_TYPES):
+            return None
+        return self._candidates.get(value, self._default)
+
+
+def build_hash_index(conditions):
+    """
+    Index the conditions of the field checked by most ``equal``/``in`` conditions
+
+    :param conditions: list of ``RuleCondition``
+    :return: ``HashIndex`` or ``None``
+    """
+    by_field = {}
+    for position, condition in enumerate(conditions):
+        rule = condition.get_condition()
+        for field in get_fields(rule):
+            values, exact = get_values(rule, field)
+            if values is not None:
+                by_field.setdefault(field, {})[position] = (values, exact)
+
+    if not by_field:
+        return None
+    field, indexed = max(by_field.items(), key=lambda item: (len(item[1]), -min(item[1])))
+    if len(indexed) < MIN_INDEXED:
+        return None
+    return HashIndex(field, indexed, len(conditions))
+
+
+INDEX_BUILDERS = (build_interval_index, build_hash_index)
+
+
+def build_index(conditions):
+    """
+    :return: the index covering most conditions of the ruleset or ``None``
+    """
+    indexes = [index for index in (build(conditions) for build in INDEX_BUILDERS)
+               if index is not None]
+    if not indexes:
+        return None
+    return max(indexes, key=lambda index: len(index.indexed))
+
+
+_indexes = LRUCache(maxsize=1024)
+
+
+def get_index(conditions):
+    """
+    Index of the ruleset, shared by equal rulesets
+
+    :return: index or ``None`` when the ruleset should be tested in order
+    """
+    key = 'index:%s' % get_hash([c.get_cache_key() for c in conditions])
+    return _indexes.get_or_create(key, lambda: build_index(conditions))
@@ -0,0 +1,204 @@
+# coding: utf-8
+"""
+Price expression engines.
+
+The default engine is a restricted arithmetic evaluator (``+ - * /``, parentheses,
+numbers and symbols) with exact ``Decimal`` results, sympy is used for expressions
+it doesn't support.
+"""
+from __future__ import unicode_literals
+
+import ast
+import re
+from decimal import Decimal, DecimalException
+
+import six
+
+from .cache import LRUCache
+from .maps import UNDEFINED
+from .values import get_accessor
+
+
+class UnsupportedExpression(ValueError):
+    pass
+
+
+def normalize_price(value):
+    """
+    ``1,5 * o_12.value`` -> ``1.5 * o_12__value``
+    """
+    value = value.replace(',', '.')
+    return re.sub(r'\.([a-z])', r'__\1', value)
+
+
+def to_decimal(value):
+    if isinstance(value, Decimal):
+        return value
+    if isinstance(value, float):
+        # shortest repr, 0.1 -> Decimal('0.1')
+        return Decimal(repr(value))
+    if isinstance(value, six.integer_types):
+        return Decimal(int(value))
+    raise TypeError("`%r` is not a number" % (value,))
+
+
+class BaseExpression(object):
+    """
+    Expression compiled into a plain function of its free symbols
+    """
+
+    def __init__(self, expression):
+        self.expression = expression
+        self.symbols = []
+        # ``o_12__value`` is looked up as ``o_12.value``
+        self.accessors = []
+        self.func = None
+
+    def _set_symbols(self, symbols):
+        self.symbols = sorted(symbols)
+        self.accessors = [get_accessor(s.replace('__', '.')) for s in self.symbols]
+
+    def prepare_value(self, value):
+        return value
+
+    def get_args(self, values):
+        """
+        :param values: values of ``self.symbols`` in the same order
+        """
+        args = []
+        for symbol, value in zip(self.symbols, values):
+            if value is UNDEFINED:
+                raise TypeError("Can't calculate `%s`, `%s` is undefined"
+                                % (self.expression, symbol))
+            args.append(self.prepare_value(value))
+        return args
+
+    def evaluate(self, values):
+        """
+        :param values: values of ``self.symbols`` in the same order
+        """
+        raise NotImplementedError()
+
+    def __call__(self, context):
+        return self.evaluate([accessor(context) for accessor in self.accessors])
+
+
+BINARY_OPERATORS = {
+    ast.Add: '+',
+    ast.Sub: '-',
+    ast.Mult: '*',
+    ast.Div: '/',
+}
+
+UNARY_OPERATORS = {
+    ast.USub: '-',
+    ast.UAdd: '+',
+}
+
+NUMBER_NODES = tuple(getattr(ast, name) for name in ('Num', 'Constant') if hasattr(ast, name))
+
+
+class ArithmeticExpression(BaseExpression):
+    """
+    Safe evaluator of ``+ - * /`` over numbers and symbols, results are ``Decimal``
+    """
+
+    def __init__(self, expression):
+        super(ArithmeticExpression, self).__init__(expression)
+        try:
+            tree = ast.parse(normalize_price(expression).strip(), mode='eval')
+        except SyntaxError as e:
+            raise UnsupportedExpression(e)
+
+        self._namespace = {}
+        self._names = {}
+        # symbol -> number of its uses in the expression
+        self.occurrences = {}
+        body = self._build(tree.body)
+        self._set_symbols(self._names)
+        args = ', '.join(self._names[s] for s in self.symbols)
+        self.source = 'lambda %s: %s' % (args, body)
+        self._namespace['__builtins__'] = {}
+        self.func = eval(compile(self.source, '<price>', 'eval'), self._namespace)
+
+    def _build(self, node):
+        if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS:
+            return '(%s %s %s)' % (self._build(node.left), BINARY_OPERATORS[type(node.op)],
+                                   self._build(node.right))
+
+        if isinstance(node, ast.UnaryOp) and type(node.op) in UNARY_OPERATORS:
+            return '(%s%s)' % (UNARY_OPERATORS[type(node.op)], self._build(node.operand))
+
+        if isinstance(node, NUMBER_NODES):
+            value = getattr(node, 'n', getattr(node, 'value', None))
+            if isinstance(value, bool) or not isinstance(value, six.integer_types + (float,)):
+                raise UnsupportedExpression(value)
+            name = '_c%s' % len(self._namespace)
+            self._namespace[name] = to_decimal(value)
+            return name
+
+        if isinstance(node, ast.Name):
+            if node.id not in self._names:
+                self._names[node.id] = '_v%s' % len(self._names)
+            self.occurrences[node.id] = self.occurrences.get(node.id, 0) + 1
+            return self._names[node.id]
+
+        raise UnsupportedExpression(ast.dump(node))
+
+    def prepare_value(self, value):
+        return to_decimal(value)
+
+    def evaluate(self, values):
+        try:
+            return self.func(*self.get_args(values))
+        except DecimalException as e:
+            raise TypeError("Can't calculate `%s`: %r" % (self.expression, e))
+
+
+class SympyExpression(BaseExpression):
+    """
+    Any expression sympy can parse, evaluated with floats
+    """
+
+    def __init__(self, expression):
+        super(SympyExpression, self).__init__(expression)
+        import sympy
+        from sympy.parsing.sympy_parser import parse_expr
+
+        parsed = parse_expr(normalize_price(expression))
+        self._set_symbols(s.name for s in parsed.free_symbols)
+        self.func = sympy.lambdify([sympy.Symbol(s) for s in self.symbols], parsed,
+                                   modules=[str('math'), str('sympy')])
+
+    def prepare_value(self, value):
+        if isinstance(value, (int, float, Decimal)):
+            return float(value)
+        return value
+
+    def evaluate(self, values):
+        return Decimal(float(self.func(*self.get_args(values))))
+
+
+DEFAULT_ENGINES = (ArithmeticExpression, SympyExpression)
+
+_expressions = LRUCache(maxsize=1024)
+
+
+def compile_expression(expression, engines=DEFAULT_ENGINES):
+    """
+    :param engines: expression classes, the first one supporting the expression is used
+    """
+    for engine in engines[:-1]:
+        try:
+            return engine(expression)
+        except UnsupportedExpression:
+            continue
+    return engines[-1](expression)
+
+
+def get_expression(expression, engines=DEFAULT_ENGINES):
+    """
+    :return: compiled expression cached by the expression text
+    """
+    return _expressions.get_or_create((engines, expression),
+                                      lambda: compile_expression(expression, engines))
@@ -0,0 +1,371 @@
+# coding: utf-8
+"""
+Conditions over ``date``, ``time`` and ``datetime`` fields as sets of intervals.
+
+A condition tree reading one such field is true for a union of intervals of the field
+values: leaves are intervals, ``AND`` intersects and ``OR`` unites them. Ranges can be
+overlapped with the sets instead of testing the condition hour by hour or day by day:
+``PriceRule(intervals=True)`` prices the runs of hours of a ``DATETIME_RANGE_HOUR`` range
+where the conditions don't change (``get_hour_runs``).
+"""
+from __future__ import unicode_literals
+
+import datetime
+from collections import namedtuple
+
+from .analysis import NotAnalysable
+from .conditions import RuleCondition
+
+INTERVAL_TYPES = {'date', 'time', 'datetime'}
+
+
+def _start_key(interval):
+    if interval.start is None:
+        return (0,)
+    return (1, interval.start, 0 if interval.start_closed else 1)
+
+
+class Interval(namedtuple('Interval', ['start', 'end', 'start_closed', 'end_closed'])):
+    """
+    ``None`` start or end is unbounded
+    """
+    __slots__ = ()
+
+    def is_empty(self):
+        if self.start is None or self.end is None or self.start < self.end:
+            return False
+        return not (self.start == self.end and self.start_closed and self.end_closed)
+
+    def __contains__(self, value):
+        if self.start is not None:
+            if value < self.start or (value == self.start and not self.start_closed):
+                return False
+        if self.end is not None:
+            if value > self.end or (value == self.end and not self.end_closed):
+                return False
+        return True
+
+    def intersect(self, other):
+        start, start_closed = self.start, self.start_closed
+        if start is None or (other.start is not None and other.start > start):
+            start, start_closed = other.start, other.start_closed
+        elif other.start == start:
+            start_closed = start_closed and other.start_closed
+
+        end, end_closed = self.end, self.end_closed
+        if end is None or (other.end is not None and other.end < end):
+            end, end_closed = other.end, other.end_closed
+        elif other.end == end:
+            end_closed = end_closed and other.end_closed
+        return Interval(start, end, start_closed, end_closed)
+
+
+def _touches(first, second):
+    """
+    :param first: interval starting not after ``second``
+    """
+    if first.end is None or second.start is None or first.end > second.start:
+        return True
+    return first.end == second.start and (first.end_closed or second.start_closed)
+
+
+def _join(first, second):
+    if first.end is None or second.end is None:
+        end, end_closed = None, False
+    elif first.end == second.end:
+        end, end_closed = first.end, first.end_closed or second.end_closed
+    else:
+        end, end_closed = max((first.end, first.end_closed), (second.end, second.end_closed))
+    return Interval(first.start, end, first.start_closed, end_closed)
+
+
+class IntervalSet(object):
+    """
+    Union of disjoint intervals sorted by start
+    """
+
+    def __init__(self, intervals=(), kind=None):
+        """
+        :param intervals: iterable of ``Interval``, may overlap
+        :param kind: value type, ``date``, ``time`` or ``datetime``
+        """
+        self.kind = kind
+        self.intervals = []
+        for interval in sorted((i for i in intervals if not i.is_empty()), key=_start_key):
+            if self.intervals and _touches(self.intervals[-1], interval):
+                self.intervals[-1] = _join(self.intervals[-1], interval)
+            else:
+                self.intervals.append(interval)
+
+    @classmethod
+    def everything(cls, kind=None):
+        return cls([Interval(None, None, False, False)], kind=kind)
+
+    @classmethod
+    def points(cls, values, kind=None):
+        return cls([Interval(v, v, True, True) for v in values], kind=kind)
+
+    def __repr__(self):
+        return 'IntervalSet(%r)' % (self.intervals,)
+
+    def __eq__(self, other):
+        return isinstance(other, IntervalSet) and self.intervals == other.intervals
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __bool__(self):
+        return bool(self.intervals)
+
+    __nonzero__ = __bool__
+
+    def __iter__(self):
+        return iter(self.intervals)
+
+    def __contains__(self, value):
+        return any(value in interval for interval in self.intervals)
+
+    def union(self, other):
+        return IntervalSet(self.intervals + other.intervals, kind=self.kind or other.kind)
+
+    def intersection(self, other):
+        return IntervalSet([a.intersect(b) for a in self.intervals for b in other.intervals],
+                           kind=self.kind or other.kind)
+
+    def complement(self):
+        result = []
+        start, start_closed = None, False
+        for interval in self.intervals:
+            if interval.start is not None:
+                result.append(Interval(start, interval.start, start_closed,
+                                       not interval.start_closed))
+            start, start_closed = interval.end, not interval.end_closed
+            if start is None:
+                break
+        else:
+            result.append(Interval(start, None, start_closed, False))
+        return IntervalSet(result, kind=self.kind)
+
+    def clip(self, start, end):
+        """
+        :return: intersection with the closed range ``start..end``
+        """
+        return self.intersection(IntervalSet([Interval(start, end, True, True)]))
+
+
+def _between(a, b):
+    return IntervalSet([Interval(a, b, True, True)])
+
+
+def _time_between(a, b):
+    if a > b:
+        # night
+        return IntervalSet([Interval(a, None, True, False), Interval(None, b, False, True)])
+    return _between(a, b)
+
+
+# operator_name -> function(*args) returning ``IntervalSet`` of the matched values
+LEAF_INTERVALS = {
+    'equal': lambda test: IntervalSet.points([test]),
+    'not_equal': lambda test: IntervalSet.points([test]).complement(),
+    'in': lambda test: IntervalSet.points(test),
+    'not_in': lambda test: IntervalSet.points(test).complement(),
+    'greater': lambda test: IntervalSet([Interval(test, None, False, False)]),
+    'less': lambda test: IntervalSet([Interval(None, test, False, False)]),
+    'greater_or_equal': lambda test: IntervalSet([Interval(test, None, True, False)]),
+    'less_or_equal': lambda test: IntervalSet([Interval(None, test, False, True)]),
+    'between': _between,
+    'not_between': lambda a, b: _between(a, b).complement(),
+}
+
+LEAF_INTERVALS_FOR_TYPES = {
+    'time': {
+        'between': _time_between,
+        'not_between': lambda a, b: _time_between(a, b).complement(),
+    },
+}
+
+
+def _node_intervals(node, field, parser, kinds):
+    if 'condition' in node:
+        children = [_node_intervals(rule, field, parser, kinds) for rule in node['rules']]
+        if not children:
+            return IntervalSet()
+        result = children[0]
+        for child in children[1:]:
+            if node['condition'] == 'AND':
+                result = result.intersection(child)
+            else:
+                result = result.union(child)
+        return result
+
+    try:
+        rule_field, operator_name, value_type, args = parser.parse_rule(node)
+    except (TypeError, ValueError, OverflowError):
+        raise NotAnalysable(node)
+    if rule_field != field:
+        raise NotAnalysable(rule_field)
+    if value_type not in INTERVAL_TYPES or kinds - {value_type}:
+        # values of several types aren't comparable
+        raise NotAnalysable(value_type)
+    kinds.add(value_type)
+
+    leaf = LEAF_INTERVALS_FOR_TYPES.get(value_type, {}).get(operator_name)
+    leaf = leaf or LEAF_INTERVALS.get(operator_name)
+    if leaf is None:
+        raise NotAnalysable(operator_name)
+    try:
+        return leaf(*args)
+    except TypeError:
+        # wrong number of arguments
+        raise NotAnalysable(node)
+
+
+def get_intervals(condition, field):
+    """
+    Values of ``field`` matched by the condition tree, for values of the rules type
+
+    :param condition: condition tree reading only ``field``
+    :return: ``IntervalSet``
+    :raises NotAnalysable:
+    """
+    kinds = set()
+    intervals = _node_intervals(condition, field, RuleCondition({}), kinds)
+    intervals.kind = kinds.pop() if kinds else None
+    return intervals
+
+
+def _midnight(date):
+    return datetime.datetime.combine(date, datetime.time.min)
+
+
+def dates_to_datetimes(intervals):
+    """
+    Interval set of dates as datetimes, a date is the day from its midnight till the next one
+    """
+    result = []
+    day = datetime.timedelta(days=1)
+    for interval in intervals:
+        start = end = None
+        if interval.start is not None:
+            start = _midnight(interval.start if interval.start_closed else interval.start + day)
+        if interval.end is not None:
+            end = _midnight(interval.end + day if interval.end_closed else interval.end)
+        result.append(Interval(start, end, True, False))
+    return IntervalSet(result, kind='datetime')
+
+
+def times_to_datetimes(intervals, start, end):
+    """
+    Interval set of times repeated every day of the ``start..end`` datetime range
+
+    :return: ``IntervalSet`` of datetimes clipped to the range
+    """
+    result = []
+    day = datetime.timedelta(days=1)
+    date = start.date()
+    while date <= end.date():
+        midnight = _midnight(date)
+        for interval in intervals:
+            start_dt = end_dt = None
+            if interval.start is not None:
+                start_dt = datetime.datetime.combine(date, interval.start)
+            if interval.end is not None:
+                end_dt = datetime.datetime.combine(date, interval.end)
+            result.append(Interval(
+                midnight if start_dt is None else start_dt,
+                midnight + day if end_dt is None else end_dt,
+                interval.start is None or interval.start_closed,
+                interval.end is not None and interval.end_closed,
+            ))
+        date += day
+    return IntervalSet(result, kind='datetime').clip(start, end)
+
+
+def get_datetime_intervals(condition, field, start, end):
+    """
+    Parts of the ``start..end`` datetime range where the condition over the
+    ``date``, ``time`` or ``datetime`` ``field`` is true
+
+    :return: ``IntervalSet`` of datetimes
+    :raises NotAnalysable:
+    """
+    intervals = get_intervals(condition, field)
+    if intervals.kind == 'time':
+        return times_to_datetimes(intervals, start, end)
+    if intervals.kind == 'date':
+        intervals = dates_to_datetimes(intervals)
+    return intervals.clip(start, end)
+
+
+# Fields of an hour context of a ``DATETIME_RANGE_HOUR`` range derived from the end
+# of the hour, with the value types of the rules comparing them
+HOUR_POINT_FIELDS = {'value': 'datetime', 'datetime': 'datetime', 'date': 'date', 'time': 'time'}
+
+
+def _range_intervals(node, start, end, parser):
+    if 'condition' in node:
+        children = [_range_intervals(rule, start, end, parser) for rule in node['rules']]
+        if not children:
+            return IntervalSet(kind='datetime')
+        result = children[0]
+        for child in children[1:]:
+            if node['condition'] == 'AND':
+                result = result.intersection(child)
+            else:
+                result = result.union(child)
+        return result
+
+    try:
+        field, _, value_type, _ = parser.parse_rule(node)
+    except (TypeError, ValueError, OverflowError):
+        raise NotAnalysable(node)
+    if HOUR_POINT_FIELDS.get(field) != value_type:
+        raise NotAnalysable(field)
+    return get_datetime_intervals({'condition': 'AND', 'rules': [node]}, field, start, end)
+
+
+def get_range_intervals(condition, start, end):
+    """
+    Parts of the ``start..end`` datetime range where the condition over the fields
+    of ``HOUR_POINT_FIELDS`` of the same datetime is true
+
+    :return: ``IntervalSet`` of datetimes
+    :raises NotAnalysable:
+    """
+    return _range_intervals(condition, start, end, RuleCondition({}))
+
+
+def _microseconds(td):
+    return (td.days * 86400 + td.seconds) * 10 ** 6 + td.microseconds
+
+
+def get_hour_runs(conditions, start, count):
+    """
+    Hours ``1..count`` of a ``DATETIME_RANGE_HOUR`` range starting at ``start`` are ended
+    by ``start + hours``, the results of the conditions are the same for the hours of a run
+
+    :param conditions: list of ``RuleCondition``
+    :return: list of (first, last) inclusive
+    :raises NotAnalysable:
+    """
+    if count < 1:
+        return []
+    if start.tzinfo is not None:
+        # the rules compare naive values
+        raise NotAnalysable(start)
+    hour = _microseconds(datetime.timedelta(hours=1))
+    first = start + datetime.timedelta(hours=1)
+    last = start + datetime.timedelta(hours=count)
+    splits = {1, count + 1}
+    for condition in conditions:
+        for interval in get_range_intervals(condition.get_condition(), first, last):
+            # a run starts with the first hour in the interval and the first one after it
+            if interval.start is not None:
+                hours, rest = divmod(_microseconds(interval.start - start), hour)
+                splits.add(hours if not rest and interval.start_closed else hours + 1)
+            if interval.end is not None:
+                hours, rest = divmod(_microseconds(interval.end - start), hour)
+                splits.add(hours if not rest and not interval.end_closed else hours + 1)
+    splits = sorted(s for s in splits if 1 <= s <= count + 1)
+    return [(a, b - 1) for a, b in zip(splits, splits[1:])]
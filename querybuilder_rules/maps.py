@@ -4,36 +4,199 @@ from __future__ import unicode_literals
 import operator as op
 from decimal import Decimal
 
-from dateutil.parser import parse as parse_datetime, parserinfo
-
 from django.utils.encoding import smart_text, smart_str
 
-from jinja2 import DebugUndefined
-from extended_choices import Choices
+import six
+
+
+class UndefinedError(TypeError):
+    """
+    Arithmetic, call or item lookup of ``UNDEFINED``, was ``jinja2.UndefinedError``
+    """
+    pass
+
 
+@six.python_2_unicode_compatible
+class ValueUndefined(object):
+    """
+    Value of a missing field: empty and false, ordering comparisons are false,
+    ``|``/``&`` work as ``or``/``and``. Arithmetic, calls and item lookup raise
+    ``UndefinedError`` like ``jinja2.DebugUndefined`` did, attributes are the error message.
+    """
+    __slots__ = ()
+
+    _undefined_message = 'None is undefined'
 
-class ValueUndefined(DebugUndefined):
     def _fail_with_undefined_error(self, *args, **kwargs):
-        try:
-            super(ValueUndefined, self)._fail_with_undefined_error(*args, **kwargs)
-        except self._undefined_exception as e:
-            return e.message
+        raise UndefinedError(self._undefined_message)
 
     def _always_false(self, *args, **kwargs):
         return False
 
+    def __getattr__(self, name):
+        if name[:2] == '__':
+            raise AttributeError(name)
+        return self._undefined_message
+
     def __or__(self, other):
-        return self or other
+        # self or other
+        return other
 
     def __and__(self, other):
-        return self and other
+        # self and other
+        return self
 
     __lt__ = __le__ = __gt__ = __ge__ = __int__ = _always_false
 
+    __add__ = __radd__ = __sub__ = __rsub__ = __mul__ = __rmul__ = __div__ = __rdiv__ = \
+        __truediv__ = __rtruediv__ = __floordiv__ = __rfloordiv__ = __mod__ = __rmod__ = \
+        __pow__ = __rpow__ = __pos__ = __neg__ = __call__ = __getitem__ = __float__ = \
+        __complex__ = _fail_with_undefined_error
+
+    def __eq__(self, other):
+        return type(self) is type(other)
+
+    def __ne__(self, other):
+        return type(self) is not type(other)
+
+    def __hash__(self):
+        return id(type(self))
+
+    def __bool__(self):
+        return False
+
+    __nonzero__ = __bool__
+
+    def __len__(self):
+        return 0
+
+    def __iter__(self):
+        return iter(())
+
+    def __str__(self):
+        return '{{ None }}'
+
+    def __repr__(self):
+        return 'Undefined'
+
+    def __reduce__(self):
+        # copies and pickles are the same sentinel
+        return str('UNDEFINED')
+
 
 UNDEFINED = ValueUndefined()
 
 
+class LazyParserInfo(object):
+    """
+    ``dateutil.parser.parserinfo`` built on the first use
+    """
+
+    def __init__(self, **kwargs):
+        self._kwargs = kwargs
+        self._built = None
+
+    def get_parser_info(self):
+        """
+        :return: ``dateutil.parser.parserinfo``
+        """
+        if self._built is None:
+            from dateutil.parser import parserinfo
+            self._built = parserinfo(**self._kwargs)
+        return self._built
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.get_parser_info(), name)
+
+
+PARSER_INFO = LazyParserInfo(dayfirst=True)
+
+
+def parse_datetime(value, **kwargs):
+    """
+    ``dateutil.parser.parse``, dateutil is imported on the first use
+    """
+    from dateutil.parser import parse
+    parser_info = kwargs.get('parserinfo')
+    if isinstance(parser_info, LazyParserInfo):
+        kwargs['parserinfo'] = parser_info.get_parser_info()
+    return parse(value, **kwargs)
+
+
+class LazyChoices(object):
+    """
+    ``extended_choices.Choices`` built on the first use.
+    Constants and values of the subsets don't need it.
+    """
+
+    def __init__(self, *choices):
+        self._choices = choices
+        self._constants = {constant: value for constant, value, _ in choices}
+        # name -> constants
+        self._subsets = {}
+        self._built = None
+
+    def add_subset(self, name, constants):
+        self._subsets[name] = list(constants)
+        if self._built is not None:
+            self._built.add_subset(name, constants)
+
+    def subset_values(self, name):
+        """
+        :return: frozenset of the values of the subset
+        """
+        return frozenset(self._constants[c] for c in self._subsets[name])
+
+    def get_choices(self):
+        """
+        :return: ``extended_choices.Choices``
+        """
+        if self._built is None:
+            from extended_choices import Choices
+            built = Choices(*self._choices)
+            for name, constants in self._subsets.items():
+                built.add_subset(name, constants)
+            self._built = built
+        return self._built
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        try:
+            return self._constants[name]
+        except KeyError:
+            return getattr(self.get_choices(), name)
+
+    def __getitem__(self, key):
+        if key in self._constants:
+            return self._constants[key]
+        return self.get_choices()[key]
+
+    def __iter__(self):
+        return iter(self.get_choices())
+
+    def __len__(self):
+        return len(self._choices)
+
+    def __contains__(self, value):
+        return value in self.get_choices()
+
+    def __eq__(self, other):
+        if isinstance(other, LazyChoices):
+            other = other.get_choices()
+        return self.get_choices() == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(self.get_choices())
+
+
 def parse_bool(value):
     from .values import OptionValue
     ov = OptionValue(value, OPTION_TYPE_CHOICES.BOOL)
@@ -50,7 +213,7 @@ TYPES = {
     'boolean': parse_bool
 }
 
-OPTION_TYPE_CHOICES = Choices(
+OPTION_TYPE_CHOICES = LazyChoices(
     ['QUANTITY', 'quantity', 'Количество'],
     ['TIME', 'time', 'Время'],
     ['DATE', 'date', 'Дата'],
@@ -85,6 +248,13 @@ CONDITIONS = {
     "OR": op.or_,
 }
 
+# The group result is known as soon as a child returns a value matching this
+# predicate. Same semantics as ``and``/``or`` (and the ``ValueUndefined`` overrides).
+CONDITIONS_SHORT_CIRCUIT = {
+    "AND": op.not_,
+    "OR": op.truth,
+}
+
 
 def time_between(_time, start_time, end_time):
     if start_time > end_time:
@@ -98,6 +268,19 @@ def time_between(_time, start_time, end_time):
     return _time == start_time
 
 
+class ValueSet(frozenset):
+    """
+    Arguments of ``in``/``not_in`` built once on compilation,
+    unhashable values aren't contained as in a list of hashable arguments
+    """
+
+    def __contains__(self, value):
+        try:
+            return frozenset.__contains__(self, value)
+        except TypeError:
+            return False
+
+
 OPERATORS = {
     "equal": lambda value, test: op.eq(value, test),
     "not_equal": lambda value, test: op.not_(op.eq(value, test)),
@@ -128,4 +311,3 @@ OPERATORS_FOR_TYPES = {
         "equal": lambda value, test: op.eq(bool(value), bool(test)),
     }
 }
-PARSER_INFO = parserinfo(dayfirst=True)
@@ -1,15 +1,49 @@
 # coding: utf-8
 from __future__ import unicode_literals
 
+from ..analysis import get_fields
 from ..conditions import RuleCondition
-from ..values import OptionValue, Context
+from ..dispatch import get_index
+from ..utils import get_hash, replay
+from ..values import OptionValue, Context, Layers, get_accessor
+
+# Values of the projection key which are matched by identity, not by value
+UNPROJECTED_TYPES = (Context, dict, list, Layers)
 
 
 class BaseRule(object):
-    def __init__(self, ruleset, extra_context=None, explain=False):
+    condition_class = RuleCondition
+    # Select the conditions to test with an index of the ruleset, see ``dispatch``
+    use_index = True
+    # Contexts of a calculation with the same values of the fields read by the ruleset
+    # match the same conditions, see ``get_projection_key``
+    memoize = False
+    # ``cache.LRUCache`` of the matched conditions shared by calculations, used with ``memoize``
+    match_cache = None
+
+    def __init__(self, ruleset, extra_context=None, explain=False, condition_class=None,
+                 memoize=None, match_cache=None):
+        """
+
+        :param ruleset: list of rule conditions
+        :param extra_context: dict
+        :param explain: bool
+        :param condition_class: compile backend, ``RuleCondition`` (closures)
+            or ``codegen.GeneratedRuleCondition`` (generated function)
+        :param memoize: memoize the matched conditions by the projection key of contexts
+        :param match_cache: ``cache.LRUCache`` shared by calculations
+        """
         self.explain = explain
-        self.ruleset_conditions = list(map(RuleCondition, ruleset or []))
+        self.condition_class = condition_class or self.condition_class
+        self.ruleset_conditions = list(map(self.condition_class, ruleset or []))
         self.extra_context = extra_context or {}
+        self.index = get_index(self.ruleset_conditions) if self.use_index else None
+        if memoize is not None:
+            self.memoize = memoize
+        if match_cache is not None:
+            self.match_cache = match_cache
+        self._projection = None
+        self._matches_key = None
 
     def execute(self, context, take_first=True):
         results = []
@@ -20,6 +54,41 @@ class BaseRule(object):
                 results.append(res)
         return results
 
+    def execute_many(self, contexts, take_first=True):
+        """
+        Evaluate the ruleset for every context, results are positions in the ruleset
+        instead of result dicts.
+
+        :param contexts: iterable of dict or ``Context``
+        :param take_first: bool
+        :return: generator, for every context the position of the first matched condition
+            or ``None`` (``take_first``), otherwise the list of positions of all matches
+        """
+        conditions = self.ruleset_conditions
+        funcs = [condition.get_compiled() for condition in conditions]
+        everything = [(position, False) for position in range(len(funcs))]
+        index = self.index
+        get_rule_context = self.get_rule_context
+
+        for context in contexts:
+            context = get_rule_context(context)
+            candidates = None
+            if index is not None:
+                candidates = index.candidates(conditions, context)
+            if candidates is None:
+                candidates = everything
+
+            if take_first:
+                for position, matched in candidates:
+                    if matched or funcs[position](context):
+                        yield position
+                        break
+                else:
+                    yield None
+            else:
+                yield [position for position, matched in candidates
+                       if matched or funcs[position](context)]
+
     @staticmethod
     def build_group_context(value_fields_dict, calculate_result=None):
         context = {
@@ -45,22 +114,139 @@ class BaseRule(object):
             "context": context,
         }
 
-    def get_rule(self, context):
+    def get_rule_context(self, context):
+        """
+        Context of the conditions, ``extra_context`` is layered over the context
+        without changing it
+
+        :param context: dict or ``Context``
+        :return: ``Context``
+        """
+        if isinstance(context, Context):
+            context = context.context_dict
+        if self.extra_context:
+            context = Layers(self.extra_context, context)
+        return Context(context)
+
+    def get_rule(self, context, memo=None):
         """
 
         :param context:
+        :param memo: dict of the matched conditions by projection keys, shared by
+            the contexts of one calculation
         :return: generator
         """
 
-        if isinstance(context, dict):
-            context = Context(context)
+        context = self.get_rule_context(context)
+        if memo is None:
+            positions = self.iter_matches(context)
+        else:
+            positions = self.memo_matches(context, memo)
+        for position in positions:
+            yield self.get_rule_result(self.ruleset_conditions[position], context)
+
+    def get_projection(self):
+        """
+        :return: list of accessors of the fields read by the ruleset
+        """
+        if self._projection is None:
+            fields = set()
+            for condition in self.ruleset_conditions:
+                fields |= get_fields(condition.get_condition())
+            self._projection = [get_accessor(field) for field in sorted(fields)]
+        return self._projection
+
+    def get_projection_key(self, context):
+        """
+        Contexts with the same values of the fields read by the ruleset
+        match the same conditions
+
+        :param context: ``Context`` from ``get_rule_context``
+        :return: hashable key or ``None`` when the values can't be compared
+        """
+        values = tuple(accessor(context) for accessor in self.get_projection())
+        if any(isinstance(value, UNPROJECTED_TYPES) for value in values):
+            return None
+        # 1 == 1.0 == True
+        key = values + tuple(map(type, values))
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def memo_matches(self, context, memo):
+        """
+        Positions of the matched conditions, contexts with the same projection key
+        continue the matching of the first one
+
+        :param context: ``Context`` from ``get_rule_context``
+        :param memo: dict
+        :return: iterator of int
+        """
+        key = self.get_projection_key(context)
+        if key is None:
+            return self.iter_matches(context)
+
+        if key not in memo:
+            if self.match_cache is not None:
+                memo[key] = self._cached_matches(context, key)
+            else:
+                memo[key] = ([], self.iter_matches(context))
+        matches, iterator = memo[key]
+        if iterator is None:
+            return iter(matches)
+        return replay(iterator, matches)
+
+    def _cached_matches(self, context, key):
+        """
+        ``match_cache`` keeps the matched positions consumed so far,
+        the conditions after them are tested on demand only
+
+        :return: (list of int, iterator of the next positions or ``None``)
+        """
+        if self._matches_key is None:
+            self._matches_key = 'matches:%s' % get_hash(
+                [c.get_cache_key() for c in self.ruleset_conditions])
+        cache_key = (self._matches_key, key)
+        matches, complete = self.match_cache.get(cache_key, ((), False))
+        if complete:
+            return list(matches), None
+        return list(matches), self._continue_matches(context, cache_key, matches)
+
+    def _continue_matches(self, context, cache_key, matches):
+        matches = list(matches)
+        start = matches[-1] + 1 if matches else 0
+        for position in self.iter_matches(context, start):
+            matches.append(position)
+            self.match_cache.set(cache_key, (tuple(matches), False))
+            yield position
+        self.match_cache.set(cache_key, (tuple(matches), True))
+
+    def iter_matches(self, context, start=0):
+        """
+        Positions of the conditions matching the context, in the ruleset order
+
+        :param context: ``Context`` from ``get_rule_context``
+        :param start: position of the first condition to test
+        :return: generator of int
+        """
+        candidates = None
+        if self.index is not None:
+            candidates = self.index.candidates(self.ruleset_conditions, context)
 
-        context.update(self.extra_context)
+        if candidates is None:
+            for position in range(start, len(self.ruleset_conditions)):
+                if self.ruleset_conditions[position](context):
+                    yield position
+            return
 
-        for condition in self.ruleset_conditions:
-            if condition(context):
-                yield self.get_rule_result(condition, context)
+        for position, matched in candidates:
+            if position < start:
+                continue
+            if matched or self.ruleset_conditions[position](context):
+                yield position
 
-    def apply_ruleset(self, context_iterable):
+    def apply_ruleset(self, context_iterable, memo=None):
         for context in context_iterable:
-            yield self.get_rule(context), context
+            yield self.get_rule(context, memo), context
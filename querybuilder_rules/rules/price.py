@@ -2,16 +2,34 @@
 from __future__ import unicode_literals
 
 from collections import defaultdict
-from decimal import Decimal
+from decimal import Decimal, Inexact, Rounded, localcontext
 
 import re
-import sympy
+import six
 from django.core.exceptions import ValidationError
-from sympy.parsing.sympy_parser import parse_expr
-from sympy.parsing.sympy_tokenize import TokenError
 
 from .base import BaseRule
-from ..values import Context, OptionValue
+from ..analysis import (HOUR_CONTEXT_FIELDS, NotAnalysable, get_fields, get_period,
+                        get_segments)
+from ..cache import LRUCache
+from ..compat import smart_text
+from ..expressions import DEFAULT_ENGINES, get_expression, normalize_price
+from ..maps import OPTION_TYPE_CHOICES
+from ..utils import get_hash, replay
+from ..values import Context, Layers, OptionValue, get_floor_hours
+
+# Option types priced with ``PriceRule(vectorized=True)``
+VECTORIZED_TYPES = ({OPTION_TYPE_CHOICES.QUANTITY}
+                    | OPTION_TYPE_CHOICES.subset_values('RANGE_TYPES'))
+
+# Keys of a price rule changing the price
+PRICE_KEYS = ('price', 'to_option', 'replace_price')
+
+# Price curves of ``PriceRule.get_price_curve``
+_curves = LRUCache(maxsize=256)
+
+# Longer curves aren't cached, ``PriceRule(curve=True)`` prices larger quantities by segments
+MAX_CURVE_QUANTITY = 10000
 
 OPTION_SYMBOL_RE = re.compile(r'^(o_(?P<id>\d+))(?P<sep>\.|__)(?P<field>[a-z]+)$')
 
@@ -28,9 +46,11 @@ def parse_symbol(symbol):
 
 
 def parse_price(value):
+    from sympy.parsing.sympy_parser import parse_expr
+    from sympy.parsing.sympy_tokenize import TokenError
+
     try:
-        value = value.replace(',', '.')
-        value = re.sub(r'\.([a-z])', r'__\1', value)
+        value = normalize_price(value)
 
         parsed = parse_expr(value)
         free_symbols = [s.name for s in parsed.free_symbols]
@@ -46,7 +66,90 @@ def parse_price(value):
         return None
 
 
+def repeat_add(total, value, times):
+    """
+    ``total + value * times``, exactly as adding ``value`` ``times`` times
+    """
+    if (total >= 0) == (value >= 0):
+        with localcontext() as ctx:
+            ctx.clear_flags()
+            result = total + value * times
+            if not ctx.flags[Inexact]:
+                return result
+    for _ in range(times):
+        total += value
+    return total
+
+
+def key_data(value):
+    """
+    Json-like data of a value for cache keys, other values are tagged with their type
+    """
+    if isinstance(value, Context):
+        value = value.context_dict
+    if isinstance(value, (dict, Layers)):
+        return {six.text_type(k): key_data(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [key_data(v) for v in value]
+    if value is None or isinstance(value, (bool, float) + six.integer_types + six.string_types):
+        return value
+    return ['%s.%s' % (type(value).__module__, type(value).__name__), smart_text(value)]
+
+
+# Price types stored in caches as strings
+PRICE_TYPES = {
+    'decimal': Decimal,
+    'int': int,
+    'float': float,
+}
+
+
+def dump_price(value):
+    """
+    Price as json-like data, ``Decimal`` is kept exactly
+    """
+    if isinstance(value, Decimal):
+        return ['decimal', six.text_type(value)]
+    if isinstance(value, six.integer_types) and not isinstance(value, bool):
+        return ['int', six.text_type(value)]
+    if isinstance(value, float):
+        return ['float', repr(value)]
+    raise TypeError("`%r` is not a price" % (value,))
+
+
+def load_price(data):
+    kind, value = data
+    return PRICE_TYPES[kind](value)
+
+
+def dump_price_map(price_map):
+    """
+    Price map of ``PriceRule._calculate`` as json-like data
+    """
+    items = []
+    for field, value in price_map.items():
+        if isinstance(value, dict):
+            # replace_price
+            items.append([field, dump_price(value['price']), value['info']])
+        else:
+            items.append([field, dump_price(value)])
+    return items
+
+
+def load_price_map(data):
+    price_map = defaultdict(Decimal)
+    for item in data:
+        if len(item) == 3:
+            price_map[item[0]] = {'price': load_price(item[1]), 'info': item[2]}
+        else:
+            price_map[item[0]] = load_price(item[1])
+    return price_map
+
+
 def price_validation(value):
+    import sympy
+    from sympy.parsing.sympy_parser import parse_expr
+
     parsed = parse_expr(value)
     if len(parsed.free_symbols) > 0:
         raise ValidationError(
@@ -65,7 +168,55 @@ def price_validation(value):
 class PriceRule(BaseRule):
     """
     Применяем ценовые правила и считаем цену
+
+    Calculation of a range by parts, used by the pricing modes and by ``session``,
+    ``variants`` and ``bounds``::
+
+        calculation = rule.begin_calculation(base_price)
+        for context in parts:
+            rule.add_part(rule.get_rule(context), context, calculation)
+        price_map, explain = rule.finish_calculation(calculation)
     """
+    # Price expression engines, see ``expressions.compile_expression``
+    expression_engines = DEFAULT_ENGINES
+    # ``cache.ResultCache`` of the calculated prices
+    result_cache = None
+
+    def __init__(self, ruleset, extra_context=None, explain=False, condition_class=None,
+                 segments=False, periods=False, vectorized=False, curve=False,
+                 result_cache=None, memoize=None, match_cache=None, intervals=False):
+        """
+        :param segments: price ``QUANTITY`` ranges by segments of units with the same
+            matched rules instead of unit by unit, the result is the same.
+            Isn't used with ``explain``.
+        :param periods: price ``DATETIME_RANGE_HOUR`` ranges by repeating periods of hours
+            (a day or a week) instead of hour by hour, the result is the same.
+            Isn't used with ``explain``.
+        :param intervals: price ``DATETIME_RANGE_HOUR`` ranges by runs of hours where
+            the conditions over ``time``, ``date`` and ``datetime`` don't change, found by
+            the intervals of the conditions (``intervals.get_hour_runs``), the result is
+            the same. Ranges with other conditions are priced as without it.
+            Isn't used with ``explain``.
+        :param vectorized: match the rules for all parts of quantity and date ranges
+            at once with numpy (``columnar``), the result is the same. Requires numpy.
+        :param curve: price ``QUANTITY`` values by the cached price curve,
+            see ``get_price_curve``. Quantities over ``MAX_CURVE_QUANTITY`` and rules
+            reading ``total_value`` are priced by segments. Isn't used with ``explain``.
+        :param result_cache: ``cache.ResultCache`` for the results of ``calculate_price``
+            and ``calculate_group_price``, keyed by ``get_ruleset_key`` and the input.
+            Isn't used with ``explain``.
+        """
+        super(PriceRule, self).__init__(ruleset, extra_context=extra_context, explain=explain,
+                                        condition_class=condition_class, memoize=memoize,
+                                        match_cache=match_cache)
+        self.segments = segments
+        self.periods = periods
+        self.intervals = intervals
+        self.vectorized = vectorized
+        self.curve = curve
+        self.result_cache = result_cache or self.result_cache
+        self._ruleset_key = None
+        self._total_value_read = None
 
     def get_rule_result(self, condition, context):
         res = super(PriceRule, self).get_rule_result(condition, context)
@@ -92,92 +243,497 @@ class PriceRule(BaseRule):
         return context_class(context)
 
     def _calculate_price_expression(self, price_expr, context):
-        local_context = {}
-        for p in context.keys():
-            local_context[p] = context[p]
-        p = sympy.sympify(price_expr, locals=local_context)
-        return Decimal(float(p))
+        return get_expression(price_expr, self.expression_engines)(context)
 
-    def _calculate(self, context_range, base_price=0, extra_price_context=None):
-
-        base_price = new_base_price = base_price or 0
-
-        price_map = defaultdict(Decimal)
+    @staticmethod
+    def _bind_symbols(expression, calculation):
+        """
+        Values of the expression symbols. ``bp`` and ``nbp`` are taken from the calculation,
+        option symbols are resolved from ``extra_price_context`` once per calculation.
 
-        base_price_parts = 0
+        :return: dict symbol -> value
+        """
+        bound = calculation['symbols']
+        values = {}
+        for symbol, accessor in zip(expression.symbols, expression.accessors):
+            if symbol == 'bp':
+                values[symbol] = calculation['base_price']
+            elif symbol == 'nbp':
+                values[symbol] = calculation['new_base_price']
+            else:
+                if symbol not in bound:
+                    bound[symbol] = accessor(calculation['extra_price_context'])
+                values[symbol] = bound[symbol]
+        return values
+
+    def begin_calculation(self, base_price=0, extra_price_context=None):
+        """
+        :param extra_price_context: dict of the ``o_N`` values of the price expressions,
+            over the ``extra_context``
+        :return: state of the calculation for ``add_part`` and ``finish_calculation``
+        """
+        base_price = base_price or 0
 
-        extra_price_context = extra_price_context or {}
-        extra_price_context.update({("o_%s" % field): value
-                                    for field, value in self.extra_context.items()})
+        extra_price_context = Layers({("o_%s" % field): value
+                                      for field, value in self.extra_context.items()},
+                                     extra_price_context or {})
         explain_data = {}
         if self.explain:
-            explain_data = {'extra_context': extra_price_context, 'price_parts': defaultdict(list)}
+            explain_data = {'extra_context': dict(extra_price_context.items()),
+                            'price_parts': defaultdict(list)}
+
+        return {
+            'base_price': base_price,
+            'new_base_price': base_price,
+            'price_map': defaultdict(Decimal),
+            'base_price_parts': 0,
+            'extra_price_context': extra_price_context,
+            # option symbols of the price expressions, resolved once
+            'symbols': {},
+            'explain_data': explain_data,
+        }
 
-        for iter_res, context in self.apply_ruleset(context_range):
-            res = None
-            for res in iter_res:
-                price_info = res['price']
-                if not price_info:
-                    break
+    def add_part(self, iter_res, context, calculation):
+        """
+        Apply the price rules matched for one part of the range
+
+        :param iter_res: matched rule results of the part
+        :param context: context of the part
+        :param calculation: state from ``begin_calculation``, updated in place
+        :return: effect of the part, ``('base', None)``, ``('add', value)`` or ``None``
+        """
+        price_map = calculation['price_map']
+        explain_data = calculation['explain_data']
+        effect = None
+
+        res = None
+        for res in iter_res:
+            price_info = res['price']
+            if not price_info:
+                break
 
-                price_context = self._price_context(base_price=base_price,
-                                                    new_base_price=new_base_price,
-                                                    extra=extra_price_context)
-                price_value = self._calculate_price_expression(price_info['value'], price_context)
+            expression = get_expression(price_info['value'], self.expression_engines)
+            price_context = self._bind_symbols(expression, calculation)
+            price_value = expression.evaluate([price_context[s] for s in expression.symbols])
 
+            price_data = {}
+            if self.explain:
                 price_data = {
                     'rule_result': res.copy(),
                     'context': context,
                     'price_value': price_value,
-                    'price_context': price_context.to_dict()
+                    'price_context': price_context,
                 }
                 price_data['rule_result']['context'] = res['context'].to_dict()
                 del price_data['rule_result']['condition']
 
-                if res['condition'].has_backwards():
-                    # Это встреченное ценовое правило меняет базовую цену, и далее ищем другие ценовые правила.
-                    new_base_price = price_value
-                    res = None
+            if res['condition'].has_backwards():
+                # Это встреченное ценовое правило меняет базовую цену, и далее ищем другие ценовые правила.
+                calculation['new_base_price'] = price_value
+                res = None
+
+                price_data['has_backwards'] = True
+                continue
+
+            field = price_info.get('field')
+            if field is None or not price_map.get(field):
+                if price_info.get('replace_price'):
+                    price_map[field] = {'price': price_value, 'info': price_info}
+
+                    price_data['replace_price'] = True
+                else:
+                    price_map[field] += price_value
+                    if field is None:
+                        effect = ('add', price_value)
+
+            if self.explain:
+                explain_data['price_parts'][field].append(price_data)
+            # Ценовое правило найдено
+            break
+
+        if res is None:
+            # Ценовых правил не обнаружено, увеличиваем счетчик частей для базовoй цены
+            price_data = {
+                'context': context,
+                'rule_result': res,
+                'price_value': None
+            }
+            if self.explain:
+                explain_data['price_parts'][None].append(price_data)
+            calculation['base_price_parts'] += 1
+            effect = ('base', None)
+        return effect
 
-                    price_data['has_backwards'] = True
-                    continue
+    @staticmethod
+    def get_price_map(calculation):
+        """
+        Price map with the base price of the parts without price rules,
+        the calculation isn't changed
+        """
+        price_map = calculation['price_map']
+        base_price_parts = calculation['base_price_parts']
+        if base_price_parts:
+            price_map = price_map.copy()
+            price_map[None] += Decimal(base_price_parts * calculation['new_base_price'])
+        return price_map
+
+    def finish_calculation(self, calculation):
+        """
+        :return: (price_map, explain)
+        """
+        price_map = self.get_price_map(calculation)
+
+        if self.explain:
+            return price_map, calculation['explain_data']
+        return price_map, None
+
+    def _calculate(self, context_range, base_price=0, extra_price_context=None):
+        calculation = self.begin_calculation(base_price, extra_price_context)
+
+        memo = {} if self.memoize else None
+        for iter_res, context in self.apply_ruleset(context_range, memo=memo):
+            self.add_part(iter_res, context, calculation)
+
+        return self.finish_calculation(calculation)
+
+    @staticmethod
+    def get_calculation_key(calculation):
+        """
+        Everything which changes the price of the next part with the same rules
+        """
+        return (calculation['new_base_price'],
+                frozenset(f for f, v in calculation['price_map'].items() if f is not None and v))
+
+    def _calculate_segments(self, option_value, base_price=0):
+        """
+        Price the quantity range by segments of units where the matched rules are the same.
+
+        Only the first units of a segment are calculated, as soon as a unit doesn't change
+        the state of the calculation the rest of the segment repeats it.
+        """
+        try:
+            segments = get_segments(self.ruleset_conditions, option_value.value)
+        except NotAnalysable:
+            return self._calculate(option_value.get_context_range(), base_price=base_price)
+
+        return self._calculate_runs(segments, option_value.get_quantity_context, base_price)
 
-                field = price_info.get('field')
-                if field is None or not price_map.get(field):
-                    if price_info.get('replace_price'):
-                        price_map[field] = {'price': price_value, 'info': price_info}
+    def _calculate_runs(self, runs, get_context, base_price=0):
+        """
+        Price the parts ``start..end`` of the runs, all parts of a run match the same rules
+        as the part ``start``.
 
-                        price_data['replace_price'] = True
-                    else:
-                        price_map[field] += price_value
+        :param get_context: function(i) returning the context of the part ``i``
+        """
+        calculation = self.begin_calculation(base_price)
+
+        for start, end in runs:
+            context = get_context(start)
+            rule_results = []
+            iter_res = self.get_rule(context)
+            for i in range(start, end + 1):
+                key = self.get_calculation_key(calculation)
+                effect = self.add_part(replay(iter_res, rule_results), context, calculation)
+                if i == end or key != self.get_calculation_key(calculation):
+                    continue
 
-                if self.explain:
-                    explain_data['price_parts'][field].append(price_data)
-                # Ценовое правило найдено
+                self.repeat_part(calculation, effect, end - i)
                 break
 
-            if res is None:
-                # Ценовых правил не обнаружено, увеличиваем счетчик частей для базовoй цены
-                price_data = {
-                    'context': context,
-                    'rule_result': res,
-                    'price_value': None
-                }
-                if self.explain:
-                    explain_data['price_parts'][None].append(price_data)
-                base_price_parts += 1
+        return self.finish_calculation(calculation)
 
-        if base_price_parts:
-            price_map[None] += Decimal(base_price_parts * new_base_price)
+    def _calculate_intervals(self, option_value, base_price=0):
+        """
+        Price the hour range by runs of hours where the conditions over the date and time
+        of the hour don't change, the other hours of a run repeat the first one.
+        """
+        from ..intervals import get_hour_runs
+
+        start_dt, end_dt = option_value.value
+        try:
+            if HOUR_CONTEXT_FIELDS & set(map(six.text_type, self.extra_context.keys())):
+                raise NotAnalysable(self.extra_context)
+            runs = get_hour_runs(self.ruleset_conditions, start_dt,
+                                 get_floor_hours(end_dt - start_dt))
+        except NotAnalysable:
+            if self.periods:
+                return self._calculate_periods(option_value, base_price=base_price)
+            return self._calculate(option_value.get_context_range(), base_price=base_price)
+
+        return self._calculate_runs(runs, option_value.get_hour_context, base_price)
+
+    @staticmethod
+    def repeat_part(calculation, effect, times):
+        """
+        Apply the effect of a part ``times`` more times
+
+        :param effect: result of ``add_part``
+        """
+        if effect and effect[0] == 'base':
+            calculation['base_price_parts'] += times
+        elif effect and effect[0] == 'add':
+            price_map = calculation['price_map']
+            price_map[None] = repeat_add(price_map[None], effect[1], times)
+
+    def _calculate_vectorized(self, option_value, base_price=0):
+        """
+        Match the rules for all parts of the range at once with numpy columns.
+
+        Parts are grouped by the matched rules, consecutive parts of a group are calculated
+        until a part doesn't change the state of the calculation, the rest repeat it.
+        With ``explain`` every part is calculated with its context.
+        """
+        from ..columnar import ColumnarEvaluator, get_match_groups, get_range_columns, get_runs
+
+        fields = set()
+        for condition in self.ruleset_conditions:
+            fields |= get_fields(condition.get_condition())
+        try:
+            size, columns = get_range_columns(option_value, fields, self.extra_context)
+            masks = ColumnarEvaluator(columns, size).masks(self.ruleset_conditions)
+        except NotAnalysable:
+            return self._calculate(option_value.get_context_range(), base_price=base_price)
+
+        groups, matched = get_match_groups(masks, size)
+        calculation = self.begin_calculation(base_price)
 
         if self.explain:
-            return price_map, explain_data
-        return price_map, None
+            for context, group in zip(option_value.get_context_range(), groups.tolist()):
+                rule_context = self.get_rule_context(context)
+                iter_res = (self.get_rule_result(self.ruleset_conditions[p], rule_context)
+                            for p in matched[group])
+                self.add_part(iter_res, context, calculation)
+            return self.finish_calculation(calculation)
+
+        results = [[self.get_rule_result(self.ruleset_conditions[p], None) for p in positions]
+                   for positions in matched]
+        for start, end, group in get_runs(groups):
+            for i in range(start, end):
+                key = self.get_calculation_key(calculation)
+                effect = self.add_part(iter(results[group]), None, calculation)
+                if i == end - 1 or key != self.get_calculation_key(calculation):
+                    continue
+                self.repeat_part(calculation, effect, end - 1 - i)
+                break
+
+        return self.finish_calculation(calculation)
+
+    @staticmethod
+    def _repeat_effects(calculation, effects, times):
+        """
+        Apply the effects of a period ``times`` more times,
+        when the result is exactly the same as applying them one by one
+
+        :return: bool, applied
+        """
+        price_map = calculation['price_map']
+        total = price_map[None]
+        if not isinstance(total, Decimal):
+            return False
+
+        values = [effect[1] for effect in effects if effect and effect[0] == 'add']
+        if len({v > 0 for v in values + [total] if v}) > 1:
+            # partial sums of mixed signs may be rounded
+            return False
+        with localcontext() as ctx:
+            ctx.clear_flags()
+            result = total + sum(values) * times
+            if ctx.flags[Rounded]:
+                return False
+
+        price_map[None] = result
+        calculation['base_price_parts'] += times * sum(
+            1 for effect in effects if effect and effect[0] == 'base')
+        return True
+
+    def _calculate_periods(self, option_value, base_price=0):
+        """
+        Price the hour range by periods of hours where the matched rules repeat.
+
+        Hours are calculated one by one until a whole period doesn't change the state
+        of the calculation, then the rest of the full periods repeat it.
+        """
+        try:
+            period, start = get_period(self.ruleset_conditions, self.extra_context.keys())
+        except NotAnalysable:
+            return self._calculate(option_value.get_context_range(), base_price=base_price)
+
+        start_dt, end_dt = option_value.value
+        total_hours = get_floor_hours(end_dt - start_dt)
+        calculation = self.begin_calculation(base_price)
+
+        memo = {} if self.memoize else None
+        hour = 1
+        while hour <= total_hours:
+            if hour < start or hour + period - 1 > total_hours:
+                context = option_value.get_hour_context(hour)
+                self.add_part(self.get_rule(context, memo), context, calculation)
+                hour += 1
+                continue
+
+            key = self.get_calculation_key(calculation)
+            effects = []
+            for i in range(hour, hour + period):
+                context = option_value.get_hour_context(i)
+                effects.append(self.add_part(self.get_rule(context, memo), context, calculation))
+            hour += period
+
+            if key == self.get_calculation_key(calculation):
+                times = (total_hours - hour + 1) // period
+                if times and self._repeat_effects(calculation, effects, times):
+                    hour += times * period
+
+        return self.finish_calculation(calculation)
+
+    def get_ruleset_key(self):
+        """
+        Hash of everything the prices depend on: the rules with their prices,
+        the extra context and the expression engines
+        """
+        return get_hash({
+            'conditions': [[condition.get_cache_key()] + [condition.get(k) for k in PRICE_KEYS]
+                           for condition in self.ruleset_conditions],
+            'extra_context': self.extra_context,
+            'engines': ['%s.%s' % (e.__module__, e.__name__) for e in self.expression_engines],
+        })
+
+    def _reads_total_value(self):
+        """
+        :return: bool, contexts of the units depend on the quantity
+        """
+        if self._total_value_read is None:
+            fields = set()
+            for condition in self.ruleset_conditions:
+                fields |= get_fields(condition.get_condition())
+            self._total_value_read = 'total_value' not in self.extra_context \
+                and any(f.split('.')[0] == 'total_value' for f in fields)
+        return self._total_value_read
+
+    def _calculate_curve(self, quantity, base_price=0):
+        """
+        Prices of the quantities ``0..quantity``. Contexts of the units don't depend on
+        the quantity unless the rules read ``total_value``, so the calculation of ``n``
+        units continues the calculation of ``n - 1``. Otherwise every quantity
+        is calculated by itself.
+        """
+        if self._reads_total_value():
+            curve = [0]
+            for n in range(1, quantity + 1):
+                context_range = OptionValue(n, OPTION_TYPE_CHOICES.QUANTITY).get_context_range()
+                price_map, _ = self._calculate(context_range, base_price=base_price)
+                curve.append(sum(price_map.values()))
+            return curve
+
+        option_value = OptionValue(quantity, OPTION_TYPE_CHOICES.QUANTITY)
+        try:
+            segments = get_segments(self.ruleset_conditions, quantity)
+        except NotAnalysable:
+            segments = [(i, i) for i in range(1, quantity + 1)]
+
+        calculation = self.begin_calculation(base_price)
+        curve = [0]
+        for start, end in segments:
+            context = option_value.get_quantity_context(start)
+            rule_results = []
+            iter_res = self.get_rule(context)
+            repeated = None
+            for i in range(start, end + 1):
+                if repeated is None:
+                    key = self.get_calculation_key(calculation)
+                    effect = self.add_part(replay(iter_res, rule_results), context, calculation)
+                    if key == self.get_calculation_key(calculation):
+                        repeated = (effect,)
+                else:
+                    self.repeat_part(calculation, repeated[0], 1)
+                curve.append(sum(self.get_price_map(calculation).values()))
+        return curve
+
+    def get_price_curve(self, quantity, base_price=0):
+        """
+        Prices of the quantities ``0..quantity`` in one pass,
+        ``curve[n] == calculate_price(n, QUANTITY)[0]``.
+        Curves are cached per ruleset and base price and grow on demand
+        up to ``MAX_CURVE_QUANTITY``.
+
+        :return: tuple
+        """
+        quantity = max(int(quantity), 0)
+        if quantity > MAX_CURVE_QUANTITY:
+            return tuple(self._calculate_curve(quantity, base_price))
+
+        key = 'curve:%s:%s:%s' % (self._get_ruleset_key(), type(base_price).__name__, base_price)
+        curve = _curves.get(key)
+        if curve is None or len(curve) <= quantity:
+            size = max(quantity, min(2 * (len(curve) - 1) if curve else 0, MAX_CURVE_QUANTITY))
+            curve = tuple(self._calculate_curve(size, base_price))
+            _curves.set(key, curve)
+        return curve
+
+    def get_price_bounds(self, domain, base_price=0):
+        """
+        Minimum and maximum of ``calculate_price`` over the domain, see ``bounds``
+
+        :param domain: ``bounds.QuantityDomain`` or ``bounds.ChoiceDomain``
+        :return: ``bounds.PriceBounds``
+        """
+        from ..bounds import get_price_bounds
+        return get_price_bounds(self, domain, base_price)
+
+    def get_group_price_bounds(self, domains, values=None):
+        """
+        Minimum and maximum of the sum of ``calculate_group_price`` over the combinations
+        of the option domains, see ``bounds``
+
+        :param domains: dict option id -> ``bounds.QuantityDomain`` or ``bounds.ChoiceDomain``
+        :param values: dict option id -> {'value': ..., 'type': ...} of the other options
+        :return: ``bounds.PriceBounds``, ``exact`` is ``False`` for a safe bound
+        """
+        from ..bounds import get_group_price_bounds
+        return get_group_price_bounds(self, domains, values)
+
+    def _get_ruleset_key(self):
+        if self._ruleset_key is None:
+            self._ruleset_key = self.get_ruleset_key()
+        return self._ruleset_key
 
     def calculate_price(self, value, value_type, base_price=0):
         option_value = OptionValue(value, value_type)
-        price_map, explain = self._calculate(option_value.get_context_range(),
-                                             base_price=base_price)
+        if self.result_cache is None or self.explain:
+            return self._calculate_price(option_value, base_price)
+
+        key = self.result_cache.make_key('price', self._get_ruleset_key(), value_type,
+                                         key_data(option_value.value), key_data(base_price))
+        cached = self.result_cache.get(key)
+        if cached is not None:
+            return load_price(cached), None
+        result, explain = self._calculate_price(option_value, base_price)
+        self.result_cache.set(key, dump_price(result))
+        return result, explain
+
+    def _calculate_price(self, option_value, base_price=0):
+        value_type = option_value.value_type
+        if (self.curve and not self.explain and not option_value.is_empty
+                and value_type == OPTION_TYPE_CHOICES.QUANTITY and option_value.value > 0):
+            if option_value.value <= MAX_CURVE_QUANTITY and not self._reads_total_value():
+                curve = self.get_price_curve(option_value.value, base_price)
+                return curve[option_value.value], None
+            price_map, _ = self._calculate_segments(option_value, base_price=base_price)
+            return sum(price_map.values()), None
+        if (self.vectorized and not option_value.is_empty
+                and value_type in VECTORIZED_TYPES):
+            price_map, explain = self._calculate_vectorized(option_value, base_price=base_price)
+        elif (self.segments and not self.explain and not option_value.is_empty
+                and value_type == OPTION_TYPE_CHOICES.QUANTITY):
+            price_map, explain = self._calculate_segments(option_value, base_price=base_price)
+        elif (self.intervals and not self.explain and not option_value.is_empty
+                and value_type == OPTION_TYPE_CHOICES.DATETIME_RANGE_HOUR):
+            price_map, explain = self._calculate_intervals(option_value, base_price=base_price)
+        elif (self.periods and not self.explain and not option_value.is_empty
+                and value_type == OPTION_TYPE_CHOICES.DATETIME_RANGE_HOUR):
+            price_map, explain = self._calculate_periods(option_value, base_price=base_price)
+        else:
+            price_map, explain = self._calculate(option_value.get_context_range(),
+                                                 base_price=base_price)
         result = sum(price_map.values())
         return result, explain
 
@@ -187,6 +743,26 @@ class PriceRule(BaseRule):
         :param values_dict: dict of values
         :return:
         """
-        extra_price_context = {("o_%s" % field): value for field, value in context.items()}
+        if self.result_cache is None or self.explain:
+            return self._calculate_group_price(context)
+
+        key = self.result_cache.make_key('group', self._get_ruleset_key(), key_data(context))
+        cached = self.result_cache.get(key)
+        if cached is not None:
+            return load_price_map(cached), None
+        price_map, explain = self._calculate_group_price(context)
+        self.result_cache.set(key, dump_price_map(price_map))
+        return price_map, explain
+
+    @staticmethod
+    def get_group_price_context(context):
+        """
+        :param context: group context, dict option id -> option context
+        :return: ``extra_price_context`` of the group calculation
+        """
+        return {("o_%s" % field): value for field, value in context.items()}
+
+    def _calculate_group_price(self, context):
+        extra_price_context = self.get_group_price_context(context)
 
         return self._calculate([context], extra_price_context=extra_price_context)
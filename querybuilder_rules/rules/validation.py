@@ -58,7 +58,14 @@ class ValidateRule(BaseRule):
 
         errors = self._validate(context)
 
-        dict_errors = self._flat_errors_to_map(errors)
+        return self.group_errors(errors)
+
+    def group_errors(self, error_list):
+        """
+        :param error_list: ``error`` of the matched rule results
+        :return: dict of the errors by options as ``validate_group``
+        """
+        dict_errors = self._flat_errors_to_map(error_list)
 
         non_group_errors = dict_errors.pop(None, None)
         if non_group_errors:
@@ -0,0 +1,242 @@
+# coding: utf-8
+"""
+Incremental repricing of a group of options.
+
+Conditions read options through their ``id`` paths (``12.value`` reads the option ``12``),
+price expressions through ``o_N__field`` symbols. ``DependencyGraph`` keeps both, so
+``PricingSession`` recomputes only the conditions, prices and errors depending on
+the options changed between two calls and reuses everything else.
+"""
+from __future__ import unicode_literals
+
+from collections import defaultdict
+
+import six
+
+from .analysis import get_fields
+from .expressions import get_expression
+from .rules.base import BaseRule
+from .rules.price import key_data, parse_symbol
+
+# Dependency on every option, an expression symbol which isn't ``o_N__field``
+ALL_OPTIONS = '*'
+
+# Symbols of the calculation, not of the options
+CALCULATION_SYMBOLS = {'bp', 'nbp'}
+
+
+def get_field_option(field):
+    """
+    ``12.value`` -> ``12``
+    """
+    return six.text_type(field).split('.', 1)[0]
+
+
+def get_expression_options(expression, engines):
+    """
+    :param expression: price expression
+    :return: frozenset of the option ids used by the expression,
+        with ``ALL_OPTIONS`` when a symbol can't be mapped to an option
+    """
+    try:
+        symbols = get_expression(expression, engines).symbols
+    except Exception:
+        # isn't calculated either
+        return frozenset([ALL_OPTIONS])
+
+    options = set()
+    for symbol in symbols:
+        if symbol in CALCULATION_SYMBOLS:
+            continue
+        options.add(parse_symbol(symbol).get('id') or ALL_OPTIONS)
+    return frozenset(options)
+
+
+class DependencyGraph(object):
+    """
+    Options read by the conditions of a ruleset and by their price expressions
+    """
+
+    def __init__(self, rule):
+        """
+        :param rule: ``BaseRule``, price expressions are read from ``PriceRule``
+        """
+        engines = getattr(rule, 'expression_engines', None)
+        self.conditions = []
+        self.expressions = []
+        self._dependents = defaultdict(set)
+        for position, condition in enumerate(rule.ruleset_conditions):
+            options = frozenset(map(get_field_option, get_fields(condition.get_condition())))
+            self.conditions.append(options)
+            for option_id in options:
+                self._dependents[option_id].add(position)
+
+            expression = condition.get('price') if engines is not None else None
+            if expression is None:
+                self.expressions.append(frozenset())
+            else:
+                self.expressions.append(get_expression_options(expression, engines))
+
+    def get_dependents(self, option_ids):
+        """
+        :param option_ids: changed options
+        :return: set of the positions of the conditions reading the options
+        """
+        positions = set()
+        for option_id in option_ids:
+            positions |= self._dependents.get(option_id, set())
+        return positions
+
+
+class RuleState(object):
+    """
+    Matches of one ruleset for the current options of the session
+    """
+
+    def __init__(self, rule):
+        self.rule = rule
+        self.graph = DependencyGraph(rule)
+        # position -> bool, conditions aren't tested until they are needed
+        self.matches = {}
+        self.result = None
+        # options read to get ``result``
+        self.depends_on = set()
+
+    def invalidate(self, changed):
+        for position in self.graph.get_dependents(changed):
+            self.matches.pop(position, None)
+        if ALL_OPTIONS in self.depends_on or self.depends_on & changed:
+            self.result = None
+
+
+class PricingSession(object):
+    """
+    Prices and errors of a group of options, kept between changes of the options.
+
+    ``get_group_price`` is ``price_rule.calculate_group_price`` and ``get_errors`` is
+    ``validate_rule.validate_group`` for the group context of the current options
+    (``BaseRule.build_group_context``), ``get_option_price`` is ``calculate_price``
+    of ``option_rules``.
+    """
+
+    def __init__(self, price_rule=None, validate_rule=None, option_rules=None):
+        """
+        :param price_rule: ``PriceRule`` of the group
+        :param validate_rule: ``ValidateRule`` of the group
+        :param option_rules: dict option id -> ``PriceRule`` of the option
+        """
+        self.price_rule = price_rule
+        self.validate_rule = validate_rule
+        self.option_rules = option_rules or {}
+        # option id -> value data of ``update``
+        self.values = {}
+        self.context = {}
+        self._keys = {}
+        # number of the tested conditions
+        self.evaluations = 0
+        self._price_state = RuleState(price_rule) if price_rule is not None else None
+        self._validate_state = RuleState(validate_rule) if validate_rule is not None else None
+        self._option_prices = {}
+
+    def update(self, values_dict):
+        """
+        Replace the options of the group
+
+        :param values_dict: dict option id -> {'value': ..., 'type': ...}, all options of the group
+        :return: set of the changed option ids
+        """
+        changed = set()
+        for option_id in set(self.values) | set(values_dict):
+            value_data = values_dict.get(option_id)
+            key = None
+            if value_data is not None:
+                key = key_data([value_data['value'], value_data['type']])
+            if self._keys.get(option_id) != key:
+                changed.add(six.text_type(option_id))
+                if key is None:
+                    del self._keys[option_id]
+                    del self.values[option_id]
+                    del self.context[option_id]
+                else:
+                    self._keys[option_id] = key
+                    self.values[option_id] = dict(value_data)
+                    self.context[option_id] = BaseRule.build_group_context(
+                        {option_id: value_data})[option_id]
+                self._option_prices.pop(option_id, None)
+
+        if changed:
+            for state in (self._price_state, self._validate_state):
+                if state is not None:
+                    state.invalidate(changed)
+        return changed
+
+    def _iter_matches(self, state, context):
+        """
+        Matched conditions in order, tested only when they aren't known
+
+        :param context: rule context
+        :return: generator of positions
+        """
+        conditions = state.rule.ruleset_conditions
+        for position, condition in enumerate(conditions):
+            matched = state.matches.get(position)
+            if matched is None:
+                matched = state.matches[position] = bool(condition(context))
+                self.evaluations += 1
+            state.depends_on |= state.graph.conditions[position]
+            if matched:
+                state.depends_on |= state.graph.expressions[position]
+                yield position
+
+    @staticmethod
+    def _get_state(state, name):
+        if state is None:
+            raise ValueError("The session has no %s" % name)
+        return state
+
+    def _iter_results(self, state):
+        rule = state.rule
+        context = rule.get_rule_context(self.context)
+        for position in self._iter_matches(state, context):
+            yield rule.get_rule_result(rule.ruleset_conditions[position], context)
+
+    def get_group_price(self):
+        """
+        :return: (price_map, explain) of ``price_rule``
+        :raise ValueError: the session has no ``price_rule``
+        """
+        state = self._get_state(self._price_state, 'price_rule')
+        rule = state.rule
+        if state.result is None or rule.explain:
+            state.depends_on = set()
+            calculation = rule.begin_calculation(
+                extra_price_context=rule.get_group_price_context(self.context))
+            rule.add_part(self._iter_results(state), self.context, calculation)
+            state.result = rule.finish_calculation(calculation)
+        price_map, explain = state.result
+        return price_map.copy(), explain
+
+    def get_errors(self):
+        """
+        :return: errors of ``validate_rule`` by options
+        :raise ValueError: the session has no ``validate_rule``
+        """
+        state = self._get_state(self._validate_state, 'validate_rule')
+        if state.result is None:
+            state.depends_on = set()
+            errors = [res['error'] for res in self._iter_results(state)]
+            state.result = state.rule.group_errors(errors)
+        return {field: list(messages) for field, messages in state.result.items()}
+
+    def get_option_price(self, option_id, base_price=0):
+        """
+        :return: (price, explain) of the option rule for the current value of the option
+        """
+        prices = self._option_prices.setdefault(option_id, {})
+        key = repr(key_data(base_price))
+        if key not in prices:
+            self.evaluations += 1
+            value_data = self.values[option_id]
+            prices[key] = self.option_rules[option_id].calculate_price(
+                value_data['value'], value_data['type'], base_price=base_price)
+        return prices[key]
@@ -1,10 +1,16 @@
 # coding: utf-8
 from __future__ import unicode_literals
 
+import hashlib
+import json
+
 from django.template import Variable, VariableDoesNotExist
 
+from .compat import smart_text
 from .maps import UNDEFINED
 
+RULE_KEYS = ('id', 'field', 'type', 'operator', 'value')
+
 
 def getattr_path(obj, path, default=UNDEFINED):
     try:
@@ -26,3 +32,35 @@ def update_rule(rule, callback=None):
         new_rules.append(nr)
     rule['rules'] = new_rules
     return rule
+
+
+def normalize_rule(rule):
+    """
+    Keep only the keys used by the condition compiler,
+    so cosmetic querybuilder keys (``input``, ``valid``...) don't change the result.
+    """
+    if 'condition' in rule:
+        return {
+            'condition': rule['condition'],
+            'rules': [normalize_rule(r) for r in rule['rules']],
+        }
+    return {k: rule[k] for k in RULE_KEYS if k in rule}
+
+
+def get_hash(obj):
+    """
+    Stable hash of json-like data, independent of dict ordering
+    """
+    dump = json.dumps(obj, sort_keys=True, separators=(',', ':'), default=smart_text)
+    return hashlib.sha1(dump.encode('utf-8')).hexdigest()
+
+
+def replay(iterator, cache):
+    """
+    Iterate over ``cache`` and then continue ``iterator``, caching its items
+    """
+    for item in cache:
+        yield item
+    for item in iterator:
+        cache.append(item)
+        yield item
@@ -4,14 +4,15 @@ from __future__ import unicode_literals
 import datetime
 import json
 import math
+from inspect import getcallargs
 
 import six
-from dateutil.parser import parse as parse_datetime
 
 from django.template import Variable, VariableDoesNotExist
+from .cache import LRUCache
 from .compat import smart_text
 
-from .maps import OPTION_TYPE_CHOICES, UNDEFINED
+from .maps import OPTION_TYPE_CHOICES, UNDEFINED, parse_datetime
 
 
 def date_to_datetime(date):
@@ -60,6 +61,114 @@ def get_ceil_hours(td):
     return int(math.ceil((total_seconds / HOUR_TOTAL_SECONDS)))
 
 
+def _materialized(name):
+    method = getattr(dict, name)
+
+    def _method(self, *args, **kwargs):
+        self.materialize()
+        return method(self, *args, **kwargs)
+
+    _method.__name__ = str(name)
+    return _method
+
+
+class LazyContext(dict):
+    """
+    Context of an option value part. Derived fields are calculated on the first access,
+    the range totals are shared by all parts of the range.
+    Iteration, comparison and copies calculate all the fields.
+    """
+    __slots__ = ('args', 'totals')
+
+    # field -> function(*args)
+    derived = {}
+
+    def __init__(self, fields, args=(), totals=None):
+        """
+        :param fields: fields known without calculation
+        :param args: arguments of the ``derived`` functions
+        :param totals: shared dict of the range totals
+        """
+        dict.__init__(self, fields)
+        self.args = args
+        self.totals = totals or {}
+
+    def __missing__(self, key):
+        if key in self.totals:
+            value = self.totals[key]
+        elif key in self.derived:
+            value = self.derived[key](*self.args)
+        else:
+            raise KeyError(key)
+        dict.__setitem__(self, key, value)
+        return value
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or key in self.totals or key in self.derived
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def materialize(self):
+        for key in self.derived:
+            self[key]
+        for key in self.totals:
+            self[key]
+
+    def __eq__(self, other):
+        self.materialize()
+        if isinstance(other, LazyContext):
+            other.materialize()
+        return dict.__eq__(self, other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __reduce__(self):
+        return dict, (dict(self.items()),)
+
+
+for _name in ['__iter__', '__len__', '__repr__', 'keys', 'items', 'values', 'copy',
+              'iterkeys', 'iteritems', 'itervalues', 'viewkeys', 'viewitems', 'viewvalues']:
+    if hasattr(dict, _name):
+        setattr(LazyContext, _name, _materialized(_name))
+del _name
+
+
+class DateRangeContext(LazyContext):
+    __slots__ = ()
+
+    derived = {
+        'days': lambda start_date, end_date: (end_date - start_date).days + 1,
+        'hours': lambda start_date, end_date: get_ceil_hours(end_date - start_date) + 24,
+    }
+
+
+class DateTimeRangeContext(LazyContext):
+    __slots__ = ()
+
+    derived = {
+        'time': lambda value, start_dt, end_dt: value.time(),
+        'date': lambda value, start_dt, end_dt: value.date(),
+        'days': lambda value, start_dt, end_dt: get_floor_days(end_dt - start_dt),
+        'hours': lambda value, start_dt, end_dt: get_floor_hours(end_dt - start_dt),
+    }
+
+
+class DateTimeContext(LazyContext):
+    __slots__ = ()
+
+    derived = {
+        'time': lambda value: value.time(),
+        'date': lambda value: value.date(),
+    }
+
+
 class OptionValue(object):
     def __init__(self, value, value_type, base_price=None):
         """
@@ -76,6 +185,7 @@ class OptionValue(object):
         self.value = self.prepare_value(value, value_type)
         self._is_empty = check_empty(self.value)
         self.base_price = base_price
+        self._totals = None
 
     @property
     def raw_value(self):
@@ -96,11 +206,11 @@ class OptionValue(object):
 
         elif value_type == type_choices.DATE_RANGE:
             assert isinstance(value, list)
-            return map(lambda v: parse_datetime(v).date(), value)
+            return list(map(lambda v: parse_datetime(v).date(), value))
 
         elif value_type in (type_choices.DATETIME_RANGE_HOUR, type_choices.DATETIME_RANGE_DAY):
             assert isinstance(value, list)
-            return map(lambda v: parse_datetime(v), value)
+            return list(map(lambda v: parse_datetime(v), value))
 
         elif value_type == type_choices.DATE:
             return parse_datetime(value).date()
@@ -142,7 +252,10 @@ class OptionValue(object):
     def get_context(self):
         return self._get_context(self.value, self.value_type, is_group=True)
 
-    def _get_context(self, value, value_type, is_group=False):
+    def _get_context(self, value, value_type, is_group=False, totals=None):
+        """
+        :param totals: range totals shared by the part contexts
+        """
         type_choices = OPTION_TYPE_CHOICES
 
         if self.is_empty and value_type != OPTION_TYPE_CHOICES.BOOL:
@@ -153,46 +266,28 @@ class OptionValue(object):
         if value_type == type_choices.DATE_RANGE:
             start_date, end_date = value
 
-            td = end_date - start_date
-            days = td.days + 1
-            hours = get_ceil_hours(td) + 24
-
             _value = end_date
             if is_group:
                 _value = start_date
-            return {
+            return DateRangeContext({
                 "value": _value,
                 "date": _value,
                 "start_date": start_date,
                 "end_date": end_date,
-                "days": days,
-                "hours": hours,
-            }
+            }, (start_date, end_date), totals)
 
         elif value_type in (type_choices.DATETIME_RANGE_HOUR, type_choices.DATETIME_RANGE_DAY):
             start_dt, end_dt = value
 
-            td = end_dt - start_dt
-            days = get_floor_days(td)
-            hours = get_floor_hours(td)
-
             _value = end_dt
             if is_group:
                 _value = start_dt
-            return {
+            return DateTimeRangeContext({
                 "value": _value,
                 "datetime": _value,
-
-                "time": _value.time(),
-                "date": _value.date(),
-
-                "days": days,
-                "hours": hours,
-
                 "start_datetime": start_dt,
                 "end_datetime": end_dt,
-
-            }
+            }, (_value, start_dt, end_dt), totals)
 
         elif value_type == type_choices.DATE:
             assert isinstance(value, datetime.date)
@@ -203,12 +298,10 @@ class OptionValue(object):
 
         elif value_type == type_choices.DATETIME:
             assert isinstance(value, datetime.datetime)
-            return {
+            return DateTimeContext({
                 "value": value,
                 "datetime": value,
-                "time": value.time(),
-                "date": value.date()
-            }
+            }, (value,))
 
         elif value_type == type_choices.TIME:
             assert isinstance(value, datetime.time)
@@ -221,9 +314,48 @@ class OptionValue(object):
                 "value": self.prepare_value(value, value_type)
             }
 
-        return {
+        context = {
             "value": value
         }
+        if totals:
+            context.update(totals)
+        return context
+
+    def get_range_totals(self):
+        """
+        Totals of the range shared by the contexts of its parts
+        """
+        if self._totals is None:
+            type_choices = OPTION_TYPE_CHOICES
+            totals = {}
+            if self.value_type == type_choices.QUANTITY:
+                totals = {'total_value': self.value}
+            elif self.value_type == type_choices.DATE_RANGE:
+                start_date, end_date = self.value
+                td = end_date - start_date
+                totals = {'total_days': td.days + 1,
+                          'total_hours': int(td.total_seconds() / 60 ** 2)}
+            elif self.value_type in type_choices.subset_values('RANGE_TYPES'):
+                start_dt, end_dt = self.value
+                td = end_dt - start_dt
+                totals = {'total_days': get_floor_days(td), 'total_hours': get_floor_hours(td)}
+            self._totals = totals
+        return self._totals
+
+    def get_quantity_context(self, i):
+        """
+        Context of the ``i`` unit of the quantity range
+        """
+        return self._get_context(i, OPTION_TYPE_CHOICES.QUANTITY, totals=self.get_range_totals())
+
+    def get_hour_context(self, hours):
+        """
+        Context of the ``hours`` hour of the ``DATETIME_RANGE_HOUR`` range
+        """
+        start_dt, end_dt = self.value
+        return self._get_context([start_dt, start_dt + datetime.timedelta(hours=hours)],
+                                 OPTION_TYPE_CHOICES.DATETIME_RANGE_HOUR,
+                                 totals=self.get_range_totals())
 
     def _get_context_range(self, value, value_type):
         """
@@ -241,43 +373,29 @@ class OptionValue(object):
             raise StopIteration()
 
         if value_type == type_choices.QUANTITY:
+            totals = self.get_range_totals()
             for i in range(1, value + 1):
-                context = self._get_context(i, value_type)
-                context.update({'total_value': value})
-                yield context
+                yield self._get_context(i, value_type, totals=totals)
 
         elif value_type == type_choices.DATE_RANGE:
             start_date, end_date = value
-            td = end_date - start_date
-
-            total_hours = int(td.total_seconds() / 60 ** 2)
-            total_days = td.days + 1
+            totals = self.get_range_totals()
 
-            default_context = {'total_days': total_days, 'total_hours': total_hours}
-
-            for days in range(0, int(total_days)):
+            for days in range(0, int(totals['total_days'])):
                 day = start_date + datetime.timedelta(days=days)
-                context = self._get_context([start_date, day], value_type)
-
-                context.update(default_context)
-                yield context
+                yield self._get_context([start_date, day], value_type, totals=totals)
 
         elif value_type == type_choices.DATETIME_RANGE_DAY:
             start_date, end_date = value
-            td = end_date - start_date
+            totals = self.get_range_totals()
 
-            total_hours = get_floor_hours(td)
-            total_days = get_floor_days(td)
-
-            default_context = {'total_days': total_days, 'total_hours': total_hours}
-
-            if total_hours <= 24:
+            total_days = totals['total_days']
+            if totals['total_hours'] <= 24:
                 total_days = 1
 
             for days in range(0, int(total_days)):
                 day = start_date + datetime.timedelta(days=days)
-                context = self._get_context([start_date, day], value_type)
-                context.update(default_context)
+                context = self._get_context([start_date, day], value_type, totals=totals)
 
                 t_day = start_date + datetime.timedelta(days=days, seconds=61)
                 context.update({
@@ -287,33 +405,247 @@ class OptionValue(object):
 
         elif value_type == type_choices.DATETIME_RANGE_HOUR:
             start_dt, end_dt = value
-            td = end_dt - start_dt
-            total_hours = get_floor_hours(td)
-            total_days = get_floor_days(td)
+            total_hours = get_floor_hours(end_dt - start_dt)
 
             for hours in range(1, int(total_hours) + 1):
-                dt = datetime.timedelta(hours=hours)
-                day = start_dt + dt
-                context = self._get_context([start_dt, day], value_type)
-                context.update({
-                    'total_days': total_days, 'total_hours': total_hours
-                })
-                yield context
+                yield self.get_hour_context(hours)
         else:
             yield self._get_context(value, value_type)
 
 
+def call_value(current):
+    """
+    Callables are called like ``django.template.Variable`` does
+    """
+    if getattr(current, 'do_not_call_in_templates', False):
+        return current
+    if getattr(current, 'alters_data', False):
+        return UNDEFINED
+    try:
+        return current()
+    except TypeError:
+        try:
+            getcallargs(current)
+        except TypeError:
+            # arguments were required
+            return UNDEFINED
+        raise
+
+
+def lookup_value(current, bit, index=None):
+    """
+    Item, attribute and index lookup in the order of ``django.template.Variable``
+    """
+    try:
+        return current[bit]
+    except (TypeError, AttributeError, KeyError, ValueError, IndexError):
+        pass
+    try:
+        return getattr(current, bit)
+    except (TypeError, AttributeError):
+        pass
+    if index is not None:
+        try:
+            return current[index]
+        except (IndexError, ValueError, KeyError, TypeError):
+            pass
+    return UNDEFINED
+
+
+_MISSING = object()
+
+
+class Layers(object):
+    """
+    Read-only view of several mappings without copying them, the first mapping
+    having the key wins. Lets one context be shared by rules with different extra contexts.
+    """
+    __slots__ = ('maps',)
+
+    def __init__(self, *maps):
+        self.maps = maps
+
+    def new_child(self, mapping):
+        return Layers(mapping, *self.maps)
+
+    def get(self, key, default=None):
+        for mapping in self.maps:
+            value = mapping.get(key, _MISSING)
+            if value is not _MISSING:
+                return value
+        return default
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return any(key in mapping for mapping in self.maps)
+
+    def keys(self):
+        keys = []
+        seen = set()
+        for mapping in self.maps:
+            for key in mapping.keys():
+                if key not in seen:
+                    seen.add(key)
+                    keys.append(key)
+        return keys
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+
+class KeyStep(object):
+    """
+    Lookup of a named bit, plain dicts are resolved without exceptions
+    """
+    __slots__ = ('bit',)
+
+    def __init__(self, bit):
+        self.bit = bit
+
+    def __call__(self, current):
+        value = current.get(self.bit, _MISSING) if type(current) in (dict, Layers) else _MISSING
+        if value is _MISSING:
+            value = lookup_value(current, self.bit)
+        current = value
+        if callable(current):
+            return call_value(current)
+        return current
+
+
+class IndexStep(KeyStep):
+    """
+    Lookup of a numeric bit, ``list.0`` is resolved as an index
+    """
+    __slots__ = ('index',)
+
+    def __init__(self, bit):
+        super(IndexStep, self).__init__(bit)
+        self.index = int(bit)
+
+    def __call__(self, current):
+        if type(current) in (list, tuple):
+            try:
+                current = current[self.index]
+            except IndexError:
+                return UNDEFINED
+        else:
+            current = lookup_value(current, self.bit, self.index)
+        if callable(current):
+            return call_value(current)
+        return current
+
+
+class FieldAccessor(object):
+    """
+    Precompiled ``django.template.Variable`` for the dotted path as ``o_12.start_date``.
+    Missing values are resolved to ``UNDEFINED``.
+    """
+    __slots__ = ('path', 'steps')
+
+    def __init__(self, path, lookups):
+        self.path = path
+        self.steps = tuple(IndexStep(bit) if bit.isdigit() else KeyStep(bit) for bit in lookups)
+
+    def resolve(self, current):
+        for step in self.steps:
+            current = step(current)
+            if current is UNDEFINED:
+                break
+        return current
+
+    def __call__(self, context):
+        if isinstance(context, Context):
+            context = context.context_dict
+        res = self.resolve(context)
+        if isinstance(res, dict):
+            res = Context(res)
+        return res
+
+
+class ConstantAccessor(object):
+    __slots__ = ('path', 'value')
+
+    def __init__(self, path, value):
+        self.path = path
+        self.value = value
+
+    def resolve(self, current):
+        return self.value
+
+    def __call__(self, context):
+        return self.value
+
+
+class VariableAccessor(object):
+    """
+    Fallback for translated variables ``_(...)``, resolved by django on every call
+    """
+    __slots__ = ('path', 'variable')
+
+    def __init__(self, path, variable):
+        self.path = path
+        self.variable = variable
+
+    def resolve(self, current):
+        try:
+            return self.variable.resolve(current)
+        except VariableDoesNotExist:
+            return UNDEFINED
+
+    def __call__(self, context):
+        if isinstance(context, Context):
+            context = context.context_dict
+        res = self.resolve(context)
+        if isinstance(res, dict):
+            res = Context(res)
+        return res
+
+
+# Paths come from the rulesets, the least recently used accessors are dropped
+_ACCESSORS = LRUCache(maxsize=4096)
+
+
+def _build_accessor(path):
+    variable = Variable(path)
+    if variable.translate:
+        return VariableAccessor(path, variable)
+    if variable.lookups is None:
+        return ConstantAccessor(path, variable.literal)
+    return FieldAccessor(path, variable.lookups)
+
+
+def get_accessor(path):
+    """
+    :param path: variable path, parsed once by ``django.template.Variable``
+    :return: accessor callable, ``accessor(context)``
+    """
+    return _ACCESSORS.get_or_create(path, lambda: _build_accessor(path))
+
+
 class Context(object):
     def __init__(self, context):
         self.context_dict = context
 
     def resolve(self, variable):
-        # todo may be cached resolve
-        variable = Variable(variable).resolve(self.context_dict)
-        return variable
+        value = get_accessor(variable).resolve(self.context_dict)
+        if value is UNDEFINED:
+            raise VariableDoesNotExist(variable)
+        return value
 
     def to_dict(self):
-        return dict(self.context_dict)
+        # items() calculates the fields of ``LazyContext``
+        return dict(self.context_dict.items())
 
     def keys(self):
         return self.context_dict.keys()
@@ -325,13 +657,7 @@ class Context(object):
         return self.context_dict.update(d)
 
     def __getitem__(self, item):
-        try:
-            res = self.resolve(item)
-            if isinstance(res, dict):
-                res = Context(res)
-            return res
-        except VariableDoesNotExist:
-            return UNDEFINED
+        return get_accessor(item)(self)
 
     def __getattr__(self, item):
         try:
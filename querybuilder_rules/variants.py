@@ -0,0 +1,234 @@
+# coding: utf-8
+"""
+Group prices of every combination of ``SELECT``/``BOOL`` options.
+
+Options are assigned one by one as a tree. The result of a condition is shared by the subtree
+of the node where it becomes known: when all options it reads are assigned, or earlier, when
+the rules of the assigned options already decide its ``AND``/``OR`` groups. When the matched
+price rules of a node are known and their expressions read only assigned options, every
+variant of the subtree has the same price: it's calculated once and the variants are
+streamed without walking the subtree.
+"""
+from __future__ import unicode_literals
+
+from itertools import product
+
+import six
+
+from .conditions import RuleCondition
+from .rules.base import BaseRule
+from .session import ALL_OPTIONS, DependencyGraph, get_field_option
+
+
+def build_tree(node):
+    """
+    Condition tree for ``evaluate_partial``: a group is (condition, children),
+    a rule is (options, ``RuleCondition`` of the rule)
+    """
+    if 'condition' in node:
+        return node['condition'], [build_tree(rule) for rule in node['rules']]
+    options = frozenset([get_field_option(node.get('field', node['id']))])
+    return options, RuleCondition({'condition': 'AND', 'rules': [node]}, is_sub=True)
+
+
+def evaluate_partial(tree, context, pending):
+    """
+    Result of the condition tree when the ``pending`` options aren't known yet
+
+    :return: bool or ``None`` when the result depends on the pending options
+    """
+    kind, children = tree
+    if isinstance(children, RuleCondition):
+        if kind & pending:
+            return None
+        try:
+            return bool(children(context))
+        except Exception:
+            # may be skipped by the short circuit of the whole condition
+            return None
+
+    results = [evaluate_partial(child, context, pending) for child in children]
+    if kind == 'AND':
+        if False in results:
+            return False
+        # empty group never matches
+        return None if None in results else bool(results)
+    if True in results:
+        return True
+    return None if None in results else False
+
+
+class VariantEnumerator(object):
+    """
+    ``price_rule.calculate_group_price`` for the combinations of options
+    """
+
+    def __init__(self, price_rule):
+        """
+        :param price_rule: ``PriceRule`` of the group
+        """
+        self.rule = price_rule
+        self.graph = DependencyGraph(price_rule)
+        self.trees = [build_tree(condition.get_condition())
+                      for condition in price_rule.ruleset_conditions]
+        # number of the tested conditions and of the calculated prices
+        self.evaluations = 0
+        self.calculations = 0
+
+    def get_order(self, option_ids):
+        """
+        Options read by the first conditions are assigned first, so the first conditions
+        are known sooner and more subtrees are pruned
+        """
+        first = {}
+        for position, (options, expression) in enumerate(zip(self.graph.conditions,
+                                                             self.graph.expressions)):
+            for option_id in options | expression:
+                first.setdefault(option_id, position)
+        size = len(self.graph.conditions)
+        return sorted(option_ids, key=lambda o: (first.get(o, size), o))
+
+    def iter_variants(self, choices, values=None):
+        """
+        :param choices: dict option id -> {'type': ..., 'values': [...]} of the enumerated options
+        :param values: dict option id -> {'value': ..., 'type': ...} of the other options
+        :return: generator of (assignment, price_map), assignment is dict option id -> value.
+            Variants are streamed in the order of ``get_order``.
+        """
+        choices = {six.text_type(o): c for o, c in choices.items()}
+        order = self.get_order(choices)
+        levels = []
+        for option_id in order:
+            option_type = choices[option_id]['type']
+            levels.append([
+                (value, get_option_context(option_id, value, option_type))
+                for value in choices[option_id]['values']
+            ])
+
+        for assignment, level, price_map in self.iter_nodes(order, levels, values):
+            for rest in product(*levels[level:]):
+                variant = dict(assignment)
+                variant.update(zip(order[level:], (value for value, _ in rest)))
+                yield variant, price_map.copy()
+
+    def iter_nodes(self, order, levels, values=None):
+        """
+        Walk the tree of the assignments
+
+        :param order: enumerated option ids in the order of assignment
+        :param levels: list of [(value, option context)] of the options of ``order``
+        :param values: dict option id -> {'value': ..., 'type': ...} of the other options
+        :return: generator of (assignment, level, price) of the nodes where the price is
+            known, the options ``order[level:]`` aren't assigned and don't change the price
+        """
+        values = {o: v for o, v in (values or {}).items() if six.text_type(o) not in order}
+        context = BaseRule.build_group_context(values)
+        for node in self._walk(order, levels, 0, context, {}, {}):
+            yield node
+
+    def _test_conditions(self, context, matches, pending, assigned):
+        """
+        Test the conditions reading the ``assigned`` option, all conditions when it's ``None``
+        """
+        conditions = self.rule.ruleset_conditions
+        rule_context = self.rule.get_rule_context(context)
+        for position, options in enumerate(self.graph.conditions):
+            if position in matches or (assigned is not None and assigned not in options):
+                continue
+            self.evaluations += 1
+            if options & pending:
+                matched = evaluate_partial(self.trees[position], rule_context, pending)
+                if matched is not None:
+                    matches[position] = matched
+                continue
+            try:
+                matches[position] = bool(conditions[position](rule_context))
+            except Exception as e:
+                # raised when the calculation gets to the condition
+                matches[position] = e
+
+    def _walk(self, order, levels, level, context, assignment, matches):
+        pending = set(order[level:])
+        self._test_conditions(context, matches, pending, order[level - 1] if level else None)
+
+        if self._is_determined(matches, pending):
+            yield dict(assignment), level, self._calculate(context, matches, assignment)
+            return
+
+        option_id = order[level]
+        for value, option_context in levels[level]:
+            context[option_id] = option_context
+            assignment[option_id] = value
+            for variant in self._walk(order, levels, level + 1, context, assignment,
+                                      dict(matches)):
+                yield variant
+        context.pop(option_id, None)
+        assignment.pop(option_id, None)
+
+    def _is_determined(self, matches, pending):
+        """
+        :return: bool, the price doesn't depend on the ``pending`` options
+        """
+        if not pending:
+            return True
+        if self.rule.explain:
+            # explain data has the contexts of all options
+            return False
+        for position, condition in enumerate(self.rule.ruleset_conditions):
+            matched = matches.get(position)
+            if matched is None:
+                return False
+            if isinstance(matched, Exception):
+                return True
+            if not matched:
+                continue
+            expression = self.graph.expressions[position]
+            if ALL_OPTIONS in expression or expression & pending:
+                return False
+            if not condition.has_backwards():
+                break
+        return True
+
+    def iter_matched(self, matches):
+        """
+        Positions of the matched conditions of a determined node in order
+        """
+        for position in range(len(self.rule.ruleset_conditions)):
+            matched = matches.get(position)
+            if matched is None:
+                # isn't reached by a determined calculation
+                return
+            if isinstance(matched, Exception):
+                raise matched
+            if matched:
+                yield position
+
+    def _iter_results(self, context, matches):
+        rule = self.rule
+        rule_context = rule.get_rule_context(context)
+        for position in self.iter_matched(matches):
+            yield rule.get_rule_result(rule.ruleset_conditions[position], rule_context)
+
+    def _calculate(self, context, matches, assignment):
+        rule = self.rule
+        self.calculations += 1
+        calculation = rule.begin_calculation(
+            extra_price_context=rule.get_group_price_context(context))
+        rule.add_part(self._iter_results(context, matches), context, calculation)
+        price_map, _ = rule.finish_calculation(calculation)
+        return price_map
+
+
+def get_option_context(option_id, value, value_type):
+    """
+    Context of the option in a group context
+    """
+    context = BaseRule.build_group_context({option_id: {'value': value, 'type': value_type}})
+    return context[option_id]
+
+
+def iter_variants(price_rule, choices, values=None):
+    """
+    Shortcut of ``VariantEnumerator(price_rule).iter_variants``
+    """
+    return VariantEnumerator(price_rule).iter_variants(choices, values)
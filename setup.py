@@ -73,6 +73,7 @@ setup(
     author_email='apkawa@gmail.com',
     packages=[package for package in find_packages() if package.startswith(app_name)],
     install_requires=['six'],
+    extras_require={'numpy': ['numpy>=1.13']},
     zip_safe=False,
     include_package_data=True,
     keywords=['django'],
@@ -0,0 +1,118 @@
+# coding: utf-8
+from __future__ import unicode_literals
+
+import copy
+import datetime
+
+import pytest
+from django.template import Variable, VariableDoesNotExist
+from django.utils.encoding import smart_text
+
+from querybuilder_rules.maps import UNDEFINED, UndefinedError
+from querybuilder_rules.values import (_ACCESSORS, Context, get_accessor, FieldAccessor,
+                                       ConstantAccessor, KeyStep, IndexStep, Layers)
+
+
+class Option(object):
+    value = 12
+
+    def price(self):
+        return 100
+
+    def required_args(self, x):
+        return x
+
+
+CONTEXT = {
+    "value": 1,
+    "o_12": {"start_date": datetime.date(2016, 1, 1), "0": "zero"},
+    "items": [{"value": "first"}, {"value": "second"}],
+    "option": Option(),
+    "none": None,
+}
+
+
+def _variable(path, context):
+    try:
+        return Variable(path).resolve(context)
+    except VariableDoesNotExist:
+        return UNDEFINED
+
+
+@pytest.mark.parametrize("path", [
+    "value",
+    "missing",
+    "o_12.start_date",
+    "o_12.start_date.year",
+    "o_12.0",
+    "o_12.missing",
+    "items.1.value",
+    "items.5.value",
+    "option.value",
+    "option.price",
+    "none.value",
+    "value.real",
+    "42",
+    "1.5",
+    "'text'",
+])
+def test_same_as_variable(path):
+    assert get_accessor(path).resolve(CONTEXT) == _variable(path, CONTEXT)
+
+
+def test_callable_with_arguments():
+    # django fails here with AttributeError for plain dict context
+    assert get_accessor("items.count").resolve(CONTEXT) is UNDEFINED
+    assert get_accessor("option.required_args").resolve(CONTEXT) is UNDEFINED
+
+
+def test_accessor_types():
+    accessor = get_accessor("items.0.value")
+    assert isinstance(accessor, FieldAccessor)
+    assert [type(s) for s in accessor.steps] == [KeyStep, IndexStep, KeyStep]
+    assert isinstance(get_accessor("42"), ConstantAccessor)
+    assert get_accessor("items.0.value") is accessor
+
+
+def test_context():
+    context = Context(CONTEXT)
+    assert get_accessor("o_12.start_date")(context) == datetime.date(2016, 1, 1)
+    assert isinstance(get_accessor("o_12")(context), Context)
+    assert context["o_12.missing"] is UNDEFINED
+    assert context.resolve("value") == 1
+    with pytest.raises(VariableDoesNotExist):
+        context.resolve("missing")
+
+
+def test_layers():
+    base = {"a": 1, "b": {"c": 2}}
+    layers = Layers({"a": 10}, base)
+    assert get_accessor("a")(Context(layers)) == 10
+    assert get_accessor("b.c")(Context(layers)) == 2
+    assert get_accessor("d")(Context(layers)) is UNDEFINED
+    assert layers.keys() == ["a", "b"] and "b" in layers
+    assert dict(layers.new_child({"d": 3}).items()) == {"a": 10, "b": {"c": 2}, "d": 3}
+
+
+def test_accessors_cache():
+    assert get_accessor("o_1.value") is get_accessor("o_1.value")
+    for i in range(_ACCESSORS.maxsize + 10):
+        get_accessor("field_%s.value" % i)
+    assert len(_ACCESSORS) == _ACCESSORS.maxsize
+
+
+def test_undefined():
+    assert not UNDEFINED and len(UNDEFINED) == 0 and list(UNDEFINED) == []
+    assert not (UNDEFINED < 1 or UNDEFINED >= 1 or 1 > UNDEFINED or 1 <= UNDEFINED)
+    assert UNDEFINED == UNDEFINED and UNDEFINED != 0 and UNDEFINED != None  # noqa: E711
+    assert (UNDEFINED | 5) == 5 and (UNDEFINED & 5) is UNDEFINED
+    assert copy.deepcopy([UNDEFINED])[0] is UNDEFINED
+    assert smart_text(UNDEFINED) == "{{ None }}"
+    assert UNDEFINED.value == "None is undefined"
+    # raised by jinja2.DebugUndefined before, TypeError like None
+    for operation in [lambda: UNDEFINED + 1, lambda: 1 - UNDEFINED, lambda: UNDEFINED * 2,
+                      lambda: -UNDEFINED, lambda: UNDEFINED(), lambda: UNDEFINED["value"]]:
+        with pytest.raises(UndefinedError) as excinfo:
+            operation()
+        assert isinstance(excinfo.value, TypeError)
+        assert smart_text(excinfo.value) == "None is undefined"
@@ -0,0 +1,64 @@
+# coding: utf-8
+from __future__ import unicode_literals
+
+import pytest
+
+from querybuilder_rules.analysis import (
+    NotAnalysable, get_breakpoints, get_fields, get_segments, get_thresholds,
+)
+from querybuilder_rules.conditions import RuleCondition
+
+
+def _conditions(*rules):
+    return [RuleCondition({"rule": {"condition": "AND", "rules": [r]}}) for r in rules]
+
+
+def _rule(operator, value, id="value", type="integer"):
+    return {"id": id, "type": type, "operator": operator, "value": value}
+
+
+def test_segments():
+    conditions = _conditions(
+        _rule("between", ["11", "50"]),
+        _rule("greater", "100"),
+        _rule("less", "2.5", type="double"),
+        _rule("greater", "1000", id="total_value"),
+    )
+    assert get_segments(conditions, 150) == [
+        (1, 2), (3, 10), (11, 50), (51, 100), (101, 150),
+    ]
+    assert get_segments(conditions, 1) == [(1, 1)]
+    assert get_segments([], 10) == [(1, 10)]
+
+
+def test_breakpoints():
+    assert get_breakpoints(_conditions(_rule("in", ["3", "5"]))) == {3, 4, 5, 6}
+    assert get_breakpoints(_conditions(_rule("is_empty", None))) == {0, 1}
+    assert get_breakpoints(_conditions(_rule("equal", "2016-01-01", type="date"))) == set()
+
+
+@pytest.mark.parametrize("rule", [
+    _rule("greater", "abc", type="string"),
+    _rule("greater", "1", id="value.real"),
+])
+def test_not_analysable(rule):
+    with pytest.raises(NotAnalysable):
+        get_breakpoints(_conditions(rule))
+
+
+def test_thresholds():
+    condition = {"condition": "OR", "rules": [
+        _rule("between", ["11", "50"]),
+        {"condition": "AND", "rules": [_rule("greater", "2.5", type="double"),
+                                       _rule("in", ["3", "7"])]},
+        _rule("is_empty", None),
+        _rule("equal", "2016-01-01", type="date"),
+    ]}
+    assert get_fields(condition) == {"value"}
+    assert get_thresholds(condition, "value") == {0, 2.5, 3, 7, 11, 50}
+
+    with pytest.raises(NotAnalysable):
+        get_thresholds(condition, "days")
+    with pytest.raises(NotAnalysable):
+        get_thresholds({"condition": "AND", "rules": [_rule("equal", "a", type="string")]},
+                       "value")
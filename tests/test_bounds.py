@@ -0,0 +1,164 @@
+# coding: utf-8
+from __future__ import unicode_literals
+
+import random
+import time
+from decimal import Decimal
+from itertools import product
+
+import pytest
+
+from querybuilder_rules import OPTION_TYPE_CHOICES
+from querybuilder_rules.bounds import ChoiceDomain, PriceInterval, QuantityDomain
+from querybuilder_rules.rules.base import BaseRule
+from querybuilder_rules.rules.price import PriceRule
+
+
+def _rule(price, rules, condition="AND", **kwargs):
+    result = {"rule": {"condition": condition, "rules": rules}, "price": price}
+    result.update(kwargs)
+    return result
+
+
+def _random_quantity_rule(rnd, field="value"):
+    return {"id": field, "type": "integer",
+            "operator": rnd.choice(["greater", "less_or_equal", "between", "equal"]),
+            "value": sorted([str(rnd.randint(1, 40)), str(rnd.randint(1, 40))],
+                            key=int)[:rnd.choice([1, 2])]}
+
+
+def _fix_value(rule):
+    if rule["operator"] == "between" and len(rule["value"]) == 1:
+        rule["value"] = rule["value"] * 2
+    elif rule["operator"] != "between":
+        rule["value"] = rule["value"][0]
+    return rule
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_quantity_bounds(seed):
+    rnd = random.Random(seed)
+    ruleset = [
+        _rule(rnd.choice(["200", "bp - 100", "bp / 5", "nbp * 2", "-30"]),
+              [_fix_value(_random_quantity_rule(
+                  rnd, rnd.choice(["value", "value", "total_value"])))],
+              to_option=rnd.choice([None, None, "ship"]))
+        for _ in range(rnd.randint(0, 4))
+    ]
+    rule = PriceRule(ruleset=ruleset)
+    start, end = rnd.randint(0, 10), rnd.randint(10, 60)
+    prices = [rule.calculate_price(n, OPTION_TYPE_CHOICES.QUANTITY, base_price=250)[0]
+              for n in range(start, end + 1)]
+    bounds = rule.get_price_bounds(QuantityDomain(start, end), base_price=250)
+    assert (bounds.min, bounds.max, bounds.exact) == (min(prices), max(prices), True)
+
+
+def test_large_quantity_bounds():
+    rule_ruleset = [
+        _rule("100", [{"id": "value", "type": "integer", "operator": "greater", "value": "1000"}]),
+        _rule("-10", [{"id": "total_value", "type": "integer", "operator": "greater",
+                       "value": "500000"}], to_option="discount"),
+    ]
+    rule = PriceRule(ruleset=rule_ruleset)
+    started = time.time()
+    bounds = rule.get_price_bounds(QuantityDomain(1, 10 ** 6), base_price=250)
+    assert time.time() - started < 1
+    segments = PriceRule(ruleset=rule_ruleset, segments=True)
+    assert bounds == (250, segments.calculate_price(
+        10 ** 6, OPTION_TYPE_CHOICES.QUANTITY, base_price=250)[0], True)
+
+
+def test_choice_bounds():
+    rule = PriceRule(ruleset=[
+        _rule("100", [{"id": "value", "type": "string", "operator": "equal", "value": "red"}]),
+    ])
+    domain = ChoiceDomain(OPTION_TYPE_CHOICES.SELECT, ["red", "blue"])
+    assert rule.get_price_bounds(domain, base_price=250) == (100, 250, True)
+
+
+def test_price_interval():
+    x = PriceInterval(Decimal(1), Decimal(3))
+    assert Decimal(2) * x - 1 == PriceInterval(1, 5)
+    assert 6 / x == PriceInterval(2, 6)
+    assert -x + x == PriceInterval(-2, 2)
+    assert x * PriceInterval(Decimal(-1), Decimal(2)) == PriceInterval(-3, 6)
+
+
+OPTIONS = {
+    "11": QuantityDomain(0, 30),
+    "12": ChoiceDomain(OPTION_TYPE_CHOICES.SELECT, ["red", "blue", "green"]),
+    "13": ChoiceDomain(OPTION_TYPE_CHOICES.BOOL),
+}
+
+
+def _random_group_rule(rnd):
+    return rnd.choice([
+        _fix_value(_random_quantity_rule(rnd, "11.value")),
+        {"id": "12.value", "type": "string", "operator": rnd.choice(["equal", "not_equal"]),
+         "value": rnd.choice(["red", "blue"])},
+        {"id": "13.value", "type": "boolean", "operator": "equal", "value": "true"},
+    ])
+
+
+def _group_prices(rule, domains):
+    order = sorted(domains)
+    values = []
+    for option_id in order:
+        domain = domains[option_id]
+        if isinstance(domain, QuantityDomain):
+            values.append(range(domain.start, domain.end + 1))
+        else:
+            values.append(domain.values)
+    prices = []
+    for combination in product(*values):
+        context = BaseRule.build_group_context({
+            option_id: {"value": value, "type": domains[option_id].value_type}
+            for option_id, value in zip(order, combination)})
+        prices.append(sum(rule.calculate_group_price(context)[0].values()))
+    return prices
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_group_bounds(seed):
+    rnd = random.Random(seed)
+    ruleset = [
+        _rule(rnd.choice(["100", "o_11.value * 3", "500 - o_11.value * 7", "o_11.value + nbp",
+                          "o_11.value * o_11.value", "1000 / o_11.value"]),
+              [_random_group_rule(rnd) for _ in range(rnd.randint(1, 2))],
+              condition=rnd.choice(["AND", "OR"]),
+              to_option=rnd.choice([None, "12"]))
+        for _ in range(rnd.randint(1, 4))
+    ]
+    # o_11.value is undefined for zero
+    ruleset.insert(0, _rule("0", [{"id": "11.value", "type": "integer", "operator": "is_null"}]))
+    rule = PriceRule(ruleset=ruleset)
+    prices = _group_prices(rule, OPTIONS)
+    bounds = rule.get_group_price_bounds(OPTIONS)
+    if bounds.exact:
+        assert (bounds.min, bounds.max) == (min(prices), max(prices))
+    else:
+        assert bounds.min <= min(prices) and bounds.max >= max(prices)
+
+
+def test_group_bounds_exactness():
+    domains = {"11": QuantityDomain(1, 100)}
+    condition = [{"id": "11.value", "type": "integer", "operator": "greater", "value": "10"}]
+
+    rule = PriceRule(ruleset=[_rule("o_11.value * 3 - 20", condition)])
+    assert rule.get_group_price_bounds(domains) == (0, 280, True)
+
+    # the range is used twice
+    rule = PriceRule(ruleset=[_rule("o_11.value * (100 - o_11.value)", condition)])
+    bounds = rule.get_group_price_bounds(domains)
+    assert not bounds.exact
+    assert bounds.min <= 0 and bounds.max >= 2500
+
+
+def test_group_bounds_enumerated():
+    domains = {"11": QuantityDomain(1, 20)}
+    # sympy expression isn't evaluated over intervals
+    rule = PriceRule(ruleset=[
+        _rule("o_11.value ** 2", [{"id": "11.value", "type": "integer", "operator": "greater",
+                                   "value": "5"}]),
+    ])
+    assert rule.get_group_price_bounds(domains) == (0, 400, True)
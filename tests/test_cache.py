@@ -0,0 +1,174 @@
+# coding: utf-8
+from __future__ import unicode_literals
+
+import json
+import threading
+import unittest
+from decimal import Decimal
+
+from django.core.cache import caches
+
+from querybuilder_rules import OPTION_TYPE_CHOICES
+from querybuilder_rules.cache import LRUCache, ResultCache, get_compile_cache
+from querybuilder_rules.codegen import GeneratedRuleCondition
+from querybuilder_rules.conditions import RuleCondition
+from querybuilder_rules.rules.generic import GenericRule
+from querybuilder_rules.rules.price import PriceRule
+
+
+class LRUCacheTestCase(unittest.TestCase):
+    def test_eviction(self):
+        cache = LRUCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.set('c', 3)
+
+        self.assertNotIn('b', cache)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.stats(), {
+            'hits': 1, 'misses': 1, 'evictions': 1, 'size': 2, 'maxsize': 2
+        })
+
+        cache.resize(1)
+        self.assertEqual(list(cache._data), ['c'])
+
+    def test_disabled(self):
+        cache = LRUCache(maxsize=0)
+        self.assertEqual(cache.get_or_create('a', lambda: 1), 1)
+        self.assertEqual(len(cache), 0)
+
+    def test_get_or_create_threads(self):
+        cache = LRUCache(maxsize=10)
+        results = []
+
+        def worker():
+            results.append(cache.get_or_create('key', object))
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(set(map(id, results))), 1)
+
+
+class CompileCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        get_compile_cache().clear()
+
+    def test_equal_rulesets_compiled_once(self):
+        rule = {
+            "id": "value",
+            "type": "integer",
+            "operator": "greater",
+            "value": "1",
+        }
+        ruleset = [{"rule": {"condition": "AND", "rules": [rule]}, "price": "100"}]
+        # Another key order and querybuilder ui keys
+        ruleset_copy = [{"price": "200", "rule": {
+            "rules": [dict(rule, input="number")],
+            "condition": "AND",
+            "valid": True,
+        }}]
+
+        first = GenericRule(ruleset=ruleset)
+        second = GenericRule(ruleset=ruleset_copy)
+        self.assertTrue(first.execute({"value": 2}))
+        self.assertTrue(second.execute({"value": 2}))
+
+        self.assertIs(first.ruleset_conditions[0]._compiled,
+                      second.ruleset_conditions[0]._compiled)
+        stats = get_compile_cache().stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+    def test_key_depends_on_backend(self):
+        condition = {"rule": {"condition": "AND", "rules": [
+            {"id": "total_value", "type": "integer", "operator": "greater", "value": "1"},
+        ]}}
+        closure, generated = RuleCondition(condition), GeneratedRuleCondition(condition)
+        self.assertNotEqual(closure.compile(), generated.compile())
+        second = GeneratedRuleCondition(condition)
+        second.compile()
+        self.assertEqual(second.source, generated.source)
+        self.assertTrue(second.has_backwards())
+
+
+class CountingPriceRule(PriceRule):
+    calculated = 0
+
+    def _calculate(self, *args, **kwargs):
+        CountingPriceRule.calculated += 1
+        return super(CountingPriceRule, self)._calculate(*args, **kwargs)
+
+
+class ResultCacheTestCase(unittest.TestCase):
+    ruleset = [
+        {"rule": {"condition": "AND", "rules": [
+            {"id": "value", "type": "integer", "operator": "greater", "value": "2"},
+        ]}, "price": "bp * 0.35"},
+        {"rule": {"condition": "AND", "rules": [
+            {"id": "12.value", "type": "string", "operator": "equal", "value": "red"},
+        ]}, "price": "15", "to_option": "12", "replace_price": True},
+    ]
+
+    def setUp(self):
+        caches['default'].clear()
+        CountingPriceRule.calculated = 0
+
+    def calculate(self, ruleset, value=5, base_price=Decimal('10.10'), **kwargs):
+        rule = CountingPriceRule(ruleset=ruleset, result_cache=ResultCache(**kwargs))
+        return rule.calculate_price(value, OPTION_TYPE_CHOICES.QUANTITY, base_price=base_price)
+
+    def test_price(self):
+        expected = PriceRule(ruleset=self.ruleset).calculate_price(
+            5, OPTION_TYPE_CHOICES.QUANTITY, base_price=Decimal('10.10'))
+        self.assertEqual(self.calculate(self.ruleset), expected)
+        self.assertEqual(self.calculate(self.ruleset), expected)
+        self.assertEqual(CountingPriceRule.calculated, 1)
+
+        result, _ = self.calculate(self.ruleset)
+        self.assertIsInstance(result, Decimal)
+        self.assertEqual(str(result), str(expected[0]))
+
+        # another input
+        self.calculate(self.ruleset, value="6")
+        self.calculate(self.ruleset, base_price=10.1)
+        self.assertEqual(CountingPriceRule.calculated, 3)
+        # same normalized value
+        self.calculate(self.ruleset, value="5")
+        self.assertEqual(CountingPriceRule.calculated, 3)
+
+    def test_ruleset_changed(self):
+        self.calculate(self.ruleset)
+        changed = [dict(self.ruleset[0], price="bp * 0.36")] + self.ruleset[1:]
+        self.calculate(changed)
+        self.assertEqual(CountingPriceRule.calculated, 2)
+
+    def test_timeout(self):
+        self.calculate(self.ruleset, timeout=0)
+        self.calculate(self.ruleset, timeout=0)
+        self.assertEqual(CountingPriceRule.calculated, 2)
+
+    def test_group_price(self):
+        context = {"12": {"value": "red"}, "13": {"value": 3}}
+        expected = PriceRule(ruleset=self.ruleset).calculate_group_price(context)
+
+        rule = CountingPriceRule(ruleset=self.ruleset, result_cache=ResultCache())
+        self.assertEqual(rule.calculate_group_price(context), expected)
+        self.assertEqual(rule.calculate_group_price(context), expected)
+        self.assertEqual(CountingPriceRule.calculated, 1)
+
+    def test_stored_as_json(self):
+        stored = []
+
+        class RecordingCache(ResultCache):
+            def set(self, key, value):
+                stored.append(value)
+                super(RecordingCache, self).set(key, value)
+
+        rule = PriceRule(ruleset=self.ruleset, result_cache=RecordingCache())
+        rule.calculate_price(5, OPTION_TYPE_CHOICES.QUANTITY, base_price=Decimal('10.10'))
+        rule.calculate_group_price({"12": {"value": "red"}})
+        self.assertEqual(len(stored), 2)
+        self.assertEqual(json.loads(json.dumps(stored)), stored)
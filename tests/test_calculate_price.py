@@ -1,7 +1,13 @@
 # coding: utf-8
 from __future__ import unicode_literals
 
+import random
+
+import pytest
+
 from querybuilder_rules import OPTION_TYPE_CHOICES
+from querybuilder_rules.cache import LRUCache
+from querybuilder_rules.rules import price
 from querybuilder_rules.rules.price import PriceRule
 
 
@@ -380,3 +386,364 @@ def test_generic_rent_car_buggy():
                                                      base_price=base_price)
 
         assert result == expect_total
+
+
+def _quantity_rule(price, rules, condition="AND", **kwargs):
+    return dict({"rule": {"condition": condition, "rules": rules}, "price": price}, **kwargs)
+
+
+QUANTITY_RULESETS = [
+    [],
+    [
+        _quantity_rule("200", [{"id": "value", "type": "integer", "operator": "between",
+                                "value": ["11", "50"]}]),
+        _quantity_rule("bp / 3", [{"id": "value", "type": "integer", "operator": "greater",
+                                   "value": "50"}]),
+    ],
+    [
+        _quantity_rule("bp - 42", [{"id": "total_value", "type": "integer", "operator": "greater",
+                                    "value": "10"}]),
+        _quantity_rule("nbp * 2", [{"id": "value", "type": "double", "operator": "less",
+                                    "value": "7.5"}]),
+    ],
+    [
+        _quantity_rule("nbp + 1", [{"id": "total_value", "type": "integer", "operator": "greater",
+                                    "value": "0"}]),
+    ],
+    [
+        _quantity_rule("300", [{"id": "value", "type": "integer", "operator": "in",
+                                "value": ["3", "5"]}], to_option="ship"),
+        _quantity_rule("0.1", [
+            {"id": "value", "type": "integer", "operator": "not_equal", "value": "4"},
+            {"id": "days", "type": "integer", "operator": "is_empty", "value": None},
+        ], condition="OR"),
+    ],
+    [
+        _quantity_rule("10", [{"id": "value", "type": "string", "operator": "equal",
+                               "value": "5"}]),
+    ],
+]
+
+
+@pytest.mark.parametrize("ruleset", QUANTITY_RULESETS)
+def test_quantity_segments(ruleset):
+    per_unit = PriceRule(ruleset=ruleset)
+    segments = PriceRule(ruleset=ruleset, segments=True)
+    for value in list(range(0, 60)) + [150]:
+        expected = per_unit.calculate_price(value=value, value_type=OPTION_TYPE_CHOICES.QUANTITY,
+                                            base_price=250)
+        result = segments.calculate_price(value=value, value_type=OPTION_TYPE_CHOICES.QUANTITY,
+                                          base_price=250)
+        assert result == expected
+
+
+def test_option_symbols():
+    ruleset = [
+        _quantity_rule("o_12.value * 10 + bp", [{"id": "value", "type": "integer",
+                                                 "operator": "greater", "value": "1"}]),
+        _quantity_rule("bp", [{"id": "value", "type": "integer",
+                               "operator": "equal", "value": "1"}]),
+    ]
+    price_rule = PriceRule(ruleset=ruleset, extra_context={12: {"value": 3, "days": 2}},
+                           explain=True)
+    result, explain = price_rule.calculate_price(value=3, value_type=OPTION_TYPE_CHOICES.QUANTITY,
+                                                 base_price=100)
+    assert result == 100 + 2 * 130
+    # only the symbols of the expression are bound
+    assert [part['price_context'] for part in explain['price_parts'][None]] == [
+        {"bp": 100},
+        {"bp": 100, "o_12__value": 3},
+        {"bp": 100, "o_12__value": 3},
+    ]
+
+
+def _random_hour_rule(rnd):
+    return rnd.choice([
+        {"id": "time", "type": "time", "operator": rnd.choice(["between", "not_between"]),
+         "value": rnd.sample(["00:00", "06:30", "09:01", "18:00", "23:00"], 2)},
+        {"id": "datetime.weekday", "type": "integer", "operator": "in",
+         "value": [str(d) for d in rnd.sample(range(7), 2)]},
+        {"id": "hours", "type": "integer", "operator": rnd.choice(["greater", "less_or_equal"]),
+         "value": str(rnd.randint(1, 60))},
+        {"id": "days", "type": "integer", "operator": rnd.choice(["greater", "equal"]),
+         "value": str(rnd.randint(1, 4))},
+        {"id": "total_hours", "type": "integer", "operator": "greater", "value": "30"},
+    ])
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_hour_periods(seed):
+    rnd = random.Random(seed)
+    ruleset = [
+        _quantity_rule(rnd.choice(["400", "bp / 3", "nbp * 1.5", "0.1"]),
+                       [_random_hour_rule(rnd) for _ in range(rnd.randint(1, 2))],
+                       condition=rnd.choice(["AND", "OR"]),
+                       to_option=rnd.choice([None, None, "night"]))
+        for _ in range(rnd.randint(1, 4))
+    ]
+    per_hour = PriceRule(ruleset=ruleset)
+    periods = PriceRule(ruleset=ruleset, periods=True)
+    for end in ["2016-01-01 20:00", "2016-01-04 09:00", "2016-02-14 17:00"]:
+        value = ["2016-01-01 09:00", end]
+        expected = per_hour.calculate_price(value=value, base_price=250,
+                                            value_type=OPTION_TYPE_CHOICES.DATETIME_RANGE_HOUR)
+        result = periods.calculate_price(value=value, base_price=250,
+                                         value_type=OPTION_TYPE_CHOICES.DATETIME_RANGE_HOUR)
+        assert result == expected
+
+
+def _random_interval_rule(rnd):
+    if rnd.random() < 0.2:
+        return {"condition": rnd.choice(["AND", "OR"]),
+                "rules": [_random_interval_rule(rnd) for _ in range(rnd.randint(0, 2))]}
+    return rnd.choice([
+        {"id": "time", "type": "time", "operator": rnd.choice(["between", "not_between"]),
+         "value": rnd.sample(["00:00", "06:30", "09:00", "18:00", "23:00"], 2)},
+        {"id": "time", "type": "time", "operator": rnd.choice(["greater", "less_or_equal"]),
+         "value": rnd.choice(["08:00", "12:30"])},
+        {"id": "date", "type": "date", "operator": rnd.choice(["greater", "equal"]),
+         "value": rnd.choice(["02.01.2016", "03.01.2016"])},
+        {"id": "date", "type": "date", "operator": "not_in", "value": ["02.01.2016"]},
+        {"id": "datetime", "type": "datetime", "operator": "between",
+         "value": ["2016-01-01 12:00", "2016-01-02 15:30"]},
+        {"id": "value", "type": "datetime", "operator": "less", "value": "2016-01-03 10:00"},
+    ])
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_hour_intervals(seed):
+    rnd = random.Random(seed)
+    ruleset = [
+        _quantity_rule(rnd.choice(["400", "bp / 3", "nbp * 1.5", "0.1"]),
+                       [_random_interval_rule(rnd) for _ in range(rnd.randint(1, 2))],
+                       condition=rnd.choice(["AND", "OR"]),
+                       to_option=rnd.choice([None, None, "night"]))
+        for _ in range(rnd.randint(1, 4))
+    ]
+    if seed % 4 == 0:
+        # hour counters aren't intervals of the date and time
+        ruleset.append(_quantity_rule("10", [_random_hour_rule(rnd)]))
+    per_hour = PriceRule(ruleset=ruleset)
+    for periods in [False, True]:
+        intervals = PriceRule(ruleset=ruleset, intervals=True, periods=periods)
+        for end in ["2016-01-01 09:00", "2016-01-01 20:00", "2016-01-04 09:30",
+                    "2016-02-14 17:00"]:
+            value = ["2016-01-01 09:00", end]
+            expected = per_hour.calculate_price(
+                value=value, base_price=250, value_type=OPTION_TYPE_CHOICES.DATETIME_RANGE_HOUR)
+            result = intervals.calculate_price(
+                value=value, base_price=250, value_type=OPTION_TYPE_CHOICES.DATETIME_RANGE_HOUR)
+            assert result == expected
+
+
+@pytest.mark.parametrize("ruleset", QUANTITY_RULESETS)
+def test_vectorized_quantity(ruleset):
+    pytest.importorskip("numpy")
+    per_unit = PriceRule(ruleset=ruleset)
+    vectorized = PriceRule(ruleset=ruleset, vectorized=True)
+    for value in list(range(0, 60)) + [150]:
+        expected = per_unit.calculate_price(value=value, value_type=OPTION_TYPE_CHOICES.QUANTITY,
+                                            base_price=250)
+        result = vectorized.calculate_price(value=value, value_type=OPTION_TYPE_CHOICES.QUANTITY,
+                                            base_price=250)
+        assert result == expected
+
+
+def test_vectorized_rule_errors():
+    pytest.importorskip("numpy")
+    # ``in`` of a scalar raises, but isn't reached by the short circuit
+    ruleset = [_quantity_rule("100", [
+        {"id": "value", "type": "integer", "operator": "greater", "value": "100"},
+        {"id": "value", "type": "integer", "operator": "in", "value": "3"},
+    ])]
+    expected = PriceRule(ruleset=ruleset).calculate_price(
+        value=10, value_type=OPTION_TYPE_CHOICES.QUANTITY, base_price=250)
+    assert PriceRule(ruleset=ruleset, vectorized=True).calculate_price(
+        value=10, value_type=OPTION_TYPE_CHOICES.QUANTITY, base_price=250) == expected
+
+
+@pytest.mark.parametrize("seed", range(12))
+def test_vectorized_ranges(seed):
+    pytest.importorskip("numpy")
+    rnd = random.Random(seed)
+    rules = [_random_hour_rule(rnd) for _ in range(6)] + [
+        {"id": "date.day", "type": "integer", "operator": "less", "value": "3"},
+        {"id": "start_datetime.hour", "type": "integer", "operator": "less", "value": "10"},
+        {"id": "12.value", "type": "string", "operator": "equal", "value": "red"},
+    ]
+    ruleset = [
+        _quantity_rule(rnd.choice(["400", "bp / 3", "nbp * 1.5", "0.1", "o_12.price"]),
+                       rnd.sample(rules, rnd.randint(1, 2)),
+                       condition=rnd.choice(["AND", "OR"]),
+                       to_option=rnd.choice([None, None, "night"]))
+        for _ in range(rnd.randint(1, 4))
+    ]
+    extra_context = {"12": {"value": "red", "price": 15}}
+    for explain in [False, True]:
+        scalar = PriceRule(ruleset=ruleset, extra_context=extra_context, explain=explain)
+        vectorized = PriceRule(ruleset=ruleset, extra_context=extra_context, explain=explain,
+                               vectorized=True)
+        for value_type in [OPTION_TYPE_CHOICES.DATETIME_RANGE_HOUR,
+                           OPTION_TYPE_CHOICES.DATETIME_RANGE_DAY,
+                           OPTION_TYPE_CHOICES.DATE_RANGE]:
+            for end in ["2016-01-01 20:00", "2016-01-04 09:00", "2016-02-14 17:00+03:00"]:
+                value = ["2016-01-01 09:00" + end[16:], end]
+                expected = scalar.calculate_price(value=value, base_price=250,
+                                                  value_type=value_type)
+                result = vectorized.calculate_price(value=value, base_price=250,
+                                                    value_type=value_type)
+                assert result == expected
+
+
+@pytest.mark.parametrize("seed", range(12))
+def test_memoized_ranges(seed):
+    rnd = random.Random(seed)
+    rules = [_random_hour_rule(rnd) for _ in range(4)] + [
+        {"id": "time.hour", "type": "integer", "operator": "less", "value": "8"},
+        {"id": "date.isoweekday", "type": "integer", "operator": "greater", "value": "5"},
+        {"id": "12.value", "type": "string", "operator": "equal", "value": "red"},
+    ]
+    ruleset = [
+        _quantity_rule(rnd.choice(["400", "bp / 3", "nbp * 1.5", "o_12.price"]),
+                       rnd.sample(rules, rnd.randint(1, 2)),
+                       condition=rnd.choice(["AND", "OR"]),
+                       to_option=rnd.choice([None, None, "night"]))
+        for _ in range(rnd.randint(1, 4))
+    ]
+    extra_context = {"12": {"value": "red", "price": 15}}
+    match_cache = LRUCache()
+    for explain in [False, True]:
+        plain = PriceRule(ruleset=ruleset, extra_context=extra_context, explain=explain)
+        memoized = PriceRule(ruleset=ruleset, extra_context=extra_context, explain=explain,
+                             memoize=True)
+        cached = PriceRule(ruleset=ruleset, extra_context=extra_context, explain=explain,
+                           memoize=True, match_cache=match_cache)
+        for value_type in [OPTION_TYPE_CHOICES.DATETIME_RANGE_HOUR,
+                           OPTION_TYPE_CHOICES.DATE_RANGE]:
+            for end in ["2016-01-01 20:00", "2016-01-04 09:00", "2016-02-14 17:00"]:
+                value = ["2016-01-01 09:00", end]
+                expected = plain.calculate_price(value=value, base_price=250,
+                                                 value_type=value_type)
+                assert memoized.calculate_price(value=value, base_price=250,
+                                                value_type=value_type) == expected
+                assert cached.calculate_price(value=value, base_price=250,
+                                              value_type=value_type) == expected
+
+
+def test_projection_key():
+    rule = PriceRule(ruleset=[_quantity_rule("400", [
+        {"id": "value", "type": "integer", "operator": "greater", "value": "3"},
+        {"id": "color", "type": "string", "operator": "is_not_empty", "value": None},
+    ])])
+    context = rule.get_rule_context({"value": 1, "color": "red"})
+    assert rule.get_projection_key(context) == ("red", 1, type("red"), int)
+    assert rule.get_projection_key(rule.get_rule_context({"value": 1.0, "color": "red"})) \
+        != rule.get_projection_key(context)
+    assert rule.get_projection_key(rule.get_rule_context({"value": 1, "color": {}})) is None
+
+
+def test_match_cache():
+    ruleset = [_quantity_rule("100", [
+        {"id": "time.hour", "type": "integer", "operator": "less", "value": "8"},
+    ])]
+    match_cache = LRUCache()
+    rule = PriceRule(ruleset=ruleset, memoize=True, match_cache=match_cache)
+    value = ["2016-01-01 09:00", "2016-01-04 09:00"]
+    result = rule.calculate_price(value=value, base_price=250,
+                                  value_type=OPTION_TYPE_CHOICES.DATETIME_RANGE_HOUR)
+    # every hour of the day once
+    assert (match_cache.hits, match_cache.misses) == (0, 24)
+    assert PriceRule(ruleset=ruleset, memoize=True, match_cache=match_cache).calculate_price(
+        value=value, base_price=250, value_type=OPTION_TYPE_CHOICES.DATETIME_RANGE_HOUR) == result
+    assert (match_cache.hits, match_cache.misses) == (24, 24)
+
+
+def test_match_cache_first_match():
+    # the malformed rule after the matched one is never compiled
+    ruleset = [
+        _quantity_rule("100", [{"id": "value", "type": "integer", "operator": "greater",
+                                "value": "0"}]),
+        _quantity_rule("200", [{"id": "value", "type": "integer", "operator": "between",
+                                "value": "oops"}]),
+    ]
+    match_cache = LRUCache()
+    for _ in range(2):
+        for cache in [None, match_cache]:
+            rule = PriceRule(ruleset=ruleset, memoize=True, match_cache=cache)
+            assert rule.calculate_price(value=5, value_type=OPTION_TYPE_CHOICES.QUANTITY,
+                                        base_price=10) == (500, None)
+    assert match_cache.hits > 0
+    assert all(matches == ((0,), False) for matches in match_cache._data.values())
+
+
+@pytest.mark.parametrize("ruleset", QUANTITY_RULESETS)
+def test_price_curve(ruleset):
+    per_unit = PriceRule(ruleset=ruleset)
+    curve = PriceRule(ruleset=ruleset).get_price_curve(45, base_price=250)
+    assert len(curve) == 46
+    assert curve[0] == 0
+    for n in range(1, 46):
+        expected, _ = per_unit.calculate_price(value=n, value_type=OPTION_TYPE_CHOICES.QUANTITY,
+                                               base_price=250)
+        assert curve[n] == expected
+
+    cached = PriceRule(ruleset=ruleset, curve=True)
+    for n in [0, 10, 45, 60, 150]:
+        expected = per_unit.calculate_price(value=n, value_type=OPTION_TYPE_CHOICES.QUANTITY,
+                                            base_price=250)
+        assert cached.calculate_price(value=n, value_type=OPTION_TYPE_CHOICES.QUANTITY,
+                                      base_price=250) == expected
+
+
+def test_price_curve_cached():
+    price._curves.clear()
+    ruleset = QUANTITY_RULESETS[1]
+    curve = PriceRule(ruleset=ruleset).get_price_curve(20, base_price=250)
+    assert PriceRule(ruleset=ruleset).get_price_curve(10, base_price=250) is curve
+    assert PriceRule(ruleset=ruleset).get_price_curve(10, base_price=300) is not curve
+    assert PriceRule(ruleset=ruleset, extra_context={"1": 1}).get_price_curve(
+        10, base_price=250) is not curve
+
+    longer = PriceRule(ruleset=ruleset).get_price_curve(30, base_price=250)
+    assert len(longer) == 41
+    assert longer[:21] == curve
+
+
+def test_price_curve_fallbacks(monkeypatch):
+    price._curves.clear()
+    ruleset = [_quantity_rule("10", [{"id": "total_value", "type": "integer",
+                                      "operator": "greater", "value": "100"}])]
+    calls = []
+
+    def count_calls(name):
+        method = getattr(PriceRule, name)
+
+        def wrapper(self, *args, **kwargs):
+            calls.append(name)
+            return method(self, *args, **kwargs)
+        monkeypatch.setattr(PriceRule, name, wrapper)
+
+    count_calls("_calculate_curve")
+    count_calls("_calculate_segments")
+
+    # total_value rules are priced by segments, not by a curve of every quantity
+    result = PriceRule(ruleset=ruleset, curve=True).calculate_price(
+        value=400, value_type=OPTION_TYPE_CHOICES.QUANTITY)
+    assert calls == ["_calculate_segments"]
+    assert result == PriceRule(ruleset=ruleset).calculate_price(
+        value=400, value_type=OPTION_TYPE_CHOICES.QUANTITY)
+    assert len(price._curves) == 0
+
+    monkeypatch.setattr(price, "MAX_CURVE_QUANTITY", 50)
+    ruleset = QUANTITY_RULESETS[1]
+    cached = PriceRule(ruleset=ruleset, curve=True)
+    del calls[:]
+    for value in [40, 80, 300]:
+        assert cached.calculate_price(value=value, value_type=OPTION_TYPE_CHOICES.QUANTITY) == \
+            PriceRule(ruleset=ruleset).calculate_price(value=value,
+                                                       value_type=OPTION_TYPE_CHOICES.QUANTITY)
+    # a curve up to the cap, the quantities over it by segments
+    assert calls == ["_calculate_curve", "_calculate_segments", "_calculate_segments"]
+    assert len(cached.get_price_curve(45)) == 51
+    assert len(cached.get_price_curve(60)) == 61
+    assert max(len(curve) for curve in price._curves._data.values()) == 51
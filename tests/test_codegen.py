@@ -0,0 +1,114 @@
+# coding: utf-8
+from __future__ import unicode_literals
+
+import datetime
+
+import pytest
+
+from querybuilder_rules.codegen import GeneratedRuleCondition
+from querybuilder_rules.conditions import RuleCondition
+from querybuilder_rules.rules.generic import GenericRule
+
+
+def _rule(operator, value, id="value", type="integer"):
+    return {"id": id, "type": type, "operator": operator, "value": value}
+
+
+RULES = [
+    _rule("equal", "2"),
+    _rule("not_equal", "2"),
+    _rule("greater", "1"),
+    _rule("less_or_equal", "1"),
+    _rule("between", ["1", "10"]),
+    _rule("not_between", ["1", "10"]),
+    _rule("in", ["1", "2"]),
+    _rule("not_in", ["1", "2"]),
+    _rule("is_empty", None),
+    _rule("is_not_null", None),
+    _rule("equal", "true", type="boolean"),
+    _rule("between", ["22:00", "06:00"], id="time", type="time"),
+    _rule("not_between", ["09:00", "18:00"], id="time", type="time"),
+    _rule("greater", "2016-01-01", id="date", type="date"),
+    _rule("greater", "1", id="o_1.value"),
+    {"condition": "OR", "rules": [
+        _rule("greater", "5"),
+        _rule("between", ["2016-01-01", "2016-02-01"], id="date", type="date"),
+    ]},
+    {"condition": "AND", "rules": []},
+]
+
+CONTEXTS = [
+    {},
+    {"value": 2},
+    {"value": 0, "time": datetime.time(23, 0)},
+    {"value": None, "time": datetime.time(12, 0), "date": None},
+    {"value": 20, "date": datetime.date(2016, 1, 10), "o_1": {"value": 3}},
+]
+
+
+def _evaluate(cond, context):
+    try:
+        return cond(dict(context))
+    except TypeError:
+        # python 3 can't compare None with int, the same for both backends
+        return TypeError
+
+
+@pytest.mark.parametrize("condition", ["AND", "OR"])
+@pytest.mark.parametrize("rule", RULES)
+def test_same_results(condition, rule):
+    cond = {"rule": {"condition": condition, "rules": [rule, _rule("less", "100")]}}
+    closure, generated = RuleCondition(cond), GeneratedRuleCondition(cond)
+    for context in CONTEXTS:
+        assert _evaluate(generated, context) == _evaluate(closure, context)
+    assert generated.has_backwards() == closure.has_backwards()
+
+
+def test_field_resolved_once():
+    cond = GeneratedRuleCondition({"rule": {"condition": "AND", "rules": [
+        _rule("greater", "1"),
+        _rule("less", "10"),
+        _rule("equal", "true", id="ship", type="boolean"),
+        _rule("equal", "false", id="ship", type="boolean"),
+    ]}})
+    cond.compile()
+    assert cond.source.count("_f") == 2
+
+
+def test_many_siblings():
+    rules = [_rule("greater", str(i)) for i in range(200)]
+    cond = GeneratedRuleCondition({"rule": {"condition": "AND", "rules": rules}})
+    assert cond({"value": 200}) is True
+    assert cond({"value": 100}) is False
+    assert cond.source is not None
+
+    cond = GeneratedRuleCondition({"rule": {"condition": "OR", "rules": rules[::-1]}})
+    assert cond({"value": 0}) is False
+    assert cond({"value": 1}) is True
+
+
+def test_too_deep():
+    node = _rule("greater", "1")
+    for _ in range(100):
+        node = {"condition": "AND", "rules": [_rule("less", "100"), node]}
+    cond = GeneratedRuleCondition({"rule": node})
+    assert cond({"value": 2}) is True
+    assert cond({"value": 1}) is False
+    assert cond.source is None
+
+
+def test_backwards():
+    cond = GeneratedRuleCondition({"rule": {"condition": "AND", "rules": [
+        {"condition": "OR", "rules": [_rule("greater", "1", id="total_value")]},
+    ]}})
+    assert cond({"total_value": 3}) is True
+    assert cond.has_backwards()
+
+
+def test_generic_rule_backend():
+    ruleset = [{"rule": {"condition": "AND",
+                         "rules": [_rule("greater_or_equal", "1000", id="total")]}}]
+    rule = GenericRule(ruleset=ruleset, condition_class=GeneratedRuleCondition)
+    assert isinstance(rule.ruleset_conditions[0], GeneratedRuleCondition)
+    assert rule.execute({"total": 1000})
+    assert not rule.execute({"total": 999})
@@ -0,0 +1,127 @@
+# coding: utf-8
+from __future__ import unicode_literals
+
+import random
+
+import pytest
+
+from querybuilder_rules.conditions import RuleCondition
+from querybuilder_rules.maps import OPTION_TYPE_CHOICES, UNDEFINED
+from querybuilder_rules.values import OptionValue, get_accessor
+
+numpy = pytest.importorskip("numpy")
+
+from querybuilder_rules.columnar import first_matches, get_masks, get_range_columns  # noqa
+
+
+def _random_rule(rnd, field, type):
+    operator = rnd.choice(["greater", "less", "greater_or_equal", "less_or_equal",
+                           "between", "not_between", "equal", "not_equal", "in", "not_in",
+                           "is_empty", "is_not_empty", "is_null"])
+    if type == "string":
+        value = ["s%s" % rnd.randint(0, 5) for _ in range(2)]
+    else:
+        value = [str(rnd.randint(-2, 12)) for _ in range(2)]
+    if operator.startswith("is_"):
+        value = None
+    elif operator in ("between", "not_between"):
+        value = sorted(value)
+    elif operator not in ("in", "not_in"):
+        value = value[0]
+    return {"id": field, "type": type, "operator": operator, "value": value}
+
+
+def _random_group(rnd, depth=0):
+    rules = []
+    for _ in range(rnd.randint(0 if depth else 1, 3)):
+        if depth < 2 and rnd.random() < 0.3:
+            rules.append(_random_group(rnd, depth + 1))
+            continue
+        field, type = rnd.choice([("quantity.value", "integer"), ("ship.value", "double"),
+                                  ("color.value", "string"), ("missing", "integer"),
+                                  ("flag", "boolean")])
+        if type == "boolean":
+            rules.append({"id": field, "type": type, "operator": "equal",
+                          "value": rnd.choice(["true", "false"])})
+        else:
+            rules.append(_random_rule(rnd, field, type))
+    return {"condition": rnd.choice(["AND", "OR"]), "rules": rules}
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_same_as_condition(seed):
+    rnd = random.Random(seed)
+    size = 60
+    quantity = numpy.ma.masked_array([rnd.randint(-3, 14) for _ in range(size)],
+                                     mask=[rnd.random() < 0.2 for _ in range(size)])
+    ship = numpy.array([rnd.choice([0.0, 2.5, 7.0, 11.0, float("nan")]) for _ in range(size)])
+    color = numpy.array([rnd.choice(["s0", "s3", "s5", ""]) for _ in range(size)], dtype=object)
+    flag = numpy.array([rnd.random() < 0.5 for _ in range(size)])
+    columns = {"quantity.value": quantity, "ship.value": ship, "color.value": color, "flag": flag}
+
+    contexts = []
+    for i in range(size):
+        context = {"ship": {"value": float(ship[i])}, "color": {"value": color[i]},
+                   "flag": bool(flag[i])}
+        if not quantity.mask[i]:
+            context["quantity"] = {"value": int(quantity[i])}
+        contexts.append(context)
+
+    conditions = [RuleCondition({"rule": _random_group(rnd)}) for _ in range(8)]
+    masks = get_masks(conditions, columns)
+    for condition, mask in zip(conditions, masks):
+        assert mask.tolist() == [bool(condition(c)) for c in contexts]
+
+    expected = []
+    for context in contexts:
+        matched = [p for p, condition in enumerate(conditions) if condition(context)]
+        expected.append(matched[0] if matched else -1)
+    assert first_matches(masks).tolist() == expected
+
+
+def test_missing_columns():
+    condition = RuleCondition({"rule": {"condition": "AND", "rules": [
+        {"id": "total", "type": "integer", "operator": "not_equal", "value": "3"},
+    ]}})
+    assert get_masks([condition], {}, size=3)[0].tolist() == [True] * 3
+    with pytest.raises(ValueError):
+        get_masks([condition], {})
+    with pytest.raises(ValueError):
+        get_masks([condition], {"a": [1, 2], "b": [1]})
+
+
+RANGE_FIELDS = [
+    "value", "date", "time", "datetime", "days", "hours", "start_date", "end_date",
+    "start_datetime", "end_datetime", "total_value", "total_days", "total_hours",
+    "value.hour", "value.minute", "datetime.weekday", "date.isoweekday", "date.day",
+    "date.month", "date.year", "time.hour", "end_date.weekday", "value.real", "value.foo",
+    "12.value", "12.missing", "missing",
+]
+
+
+@pytest.mark.parametrize("value, value_type", [
+    [37, OPTION_TYPE_CHOICES.QUANTITY],
+    [["2016-01-30", "2016-03-02"], OPTION_TYPE_CHOICES.DATE_RANGE],
+    [["2016-01-30 09:00", "2016-03-02 08:00"], OPTION_TYPE_CHOICES.DATETIME_RANGE_DAY],
+    [["2016-01-30 09:00", "2016-01-30 21:00"], OPTION_TYPE_CHOICES.DATETIME_RANGE_DAY],
+    [["2016-12-30 09:30", "2017-01-04 08:00"], OPTION_TYPE_CHOICES.DATETIME_RANGE_HOUR],
+    [["2016-12-30 09:30+03:00", "2017-01-02 08:00+03:00"],
+     OPTION_TYPE_CHOICES.DATETIME_RANGE_HOUR],
+])
+def test_range_columns(value, value_type):
+    option_value = OptionValue(value, value_type)
+    extra_context = {"12": {"value": "red"}}
+    size, columns = get_range_columns(option_value, RANGE_FIELDS, extra_context)
+
+    contexts = [dict(c.items(), **extra_context) for c in option_value.get_context_range()]
+    assert size == len(contexts)
+    for field in RANGE_FIELDS:
+        accessor = get_accessor(field)
+        expected = [accessor(c) for c in contexts]
+        if all(v is UNDEFINED for v in expected):
+            assert field not in columns or columns[field].mask.all()
+            continue
+        column = columns[field]
+        if numpy.ma.isMaskedArray(column):
+            column = column.astype(object).filled(UNDEFINED)
+        assert column.tolist() == expected, field
@@ -303,3 +303,46 @@ class ConditionTestCase(unittest.TestCase):
             price_cond.compile()
             context = {}
             self.assertEquals(price_cond(context), expect)
+
+    def test_short_circuit(self):
+        class Probe(object):
+            calls = 0
+
+            def __eq__(self, other):
+                Probe.calls += 1
+                return True
+
+        probe_rule = {
+            "id": "probe",
+            "type": "integer",
+            "operator": "equal",
+            "value": "1",
+        }
+        cases = [
+            ("AND", {"id": "value", "type": "integer", "operator": "greater", "value": "10"},
+             False),
+            ("OR", {"id": "value", "type": "integer", "operator": "less", "value": "10"},
+             True),
+        ]
+        for condition, first_rule, expect in cases:
+            price_cond = RuleCondition({'rule': {
+                "condition": condition,
+                "rules": [first_rule, probe_rule],
+            }})
+            context = {
+                'value': 2,
+                'probe': Probe(),
+            }
+            self.assertEquals(price_cond(context), expect)
+        self.assertEqual(Probe.calls, 0)
+
+    def test_short_circuit_undefined(self):
+        for condition, expect in [("AND", False), ("OR", True)]:
+            price_cond = RuleCondition({'rule': {
+                "condition": condition,
+                "rules": [
+                    {"id": "missing", "type": "integer", "operator": "greater", "value": "1"},
+                    {"id": "value", "type": "integer", "operator": "equal", "value": "2"},
+                ],
+            }})
+            self.assertEquals(price_cond({'value': 2}), expect)
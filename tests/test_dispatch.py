@@ -0,0 +1,129 @@
+# coding: utf-8
+from __future__ import unicode_literals
+
+import random
+from decimal import Decimal
+
+import pytest
+
+from querybuilder_rules.conditions import RuleCondition
+from querybuilder_rules.dispatch import HashIndex, IntervalIndex, build_index, build_interval_index
+from querybuilder_rules.rules.generic import GenericRule
+
+
+class LinearRule(GenericRule):
+    use_index = False
+
+
+def _rule(operator, value, id="value", type="integer"):
+    return {"id": id, "type": type, "operator": operator, "value": value}
+
+
+def _condition(*rules, **kwargs):
+    return {"rule": {"condition": kwargs.get("condition", "AND"), "rules": list(rules)}}
+
+
+def _random_rule(rnd, field):
+    operator = rnd.choice(["greater", "less", "greater_or_equal", "less_or_equal",
+                           "between", "not_between", "equal", "in"])
+    if operator in ("between", "not_between", "in"):
+        value = sorted(str(rnd.randint(0, 20)) for _ in range(2))
+    else:
+        value = str(rnd.randint(0, 20))
+    return _rule(operator, value, id=field)
+
+
+def _random_ruleset(rnd):
+    ruleset = []
+    for _ in range(rnd.randint(2, 12)):
+        field = "quantity.value" if rnd.random() < 0.85 else "days"
+        rules = [_random_rule(rnd, field) for _ in range(rnd.randint(1, 3))]
+        ruleset.append(_condition(*rules, condition=rnd.choice(["AND", "OR"])))
+    return ruleset
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_same_as_linear(seed):
+    rnd = random.Random(seed)
+    ruleset = _random_ruleset(rnd)
+    indexed = GenericRule(ruleset=ruleset)
+    linear = LinearRule(ruleset=ruleset)
+
+    values = list(range(-1, 23)) + [2.5, 10.0, Decimal("7"), Decimal("7.5"), True]
+    contexts = [{"quantity": {"value": v}, "days": rnd.randint(0, 20)} for v in values]
+    # undefined value
+    contexts.append({"quantity": {}, "days": 3})
+    for context in contexts:
+        expected = [id(r["rule"]) for r in linear.execute(context, take_first=False)]
+        assert [id(r["rule"]) for r in indexed.execute(context, take_first=False)] == expected
+        first = indexed.execute(context)
+        assert (id(first["rule"]) if first else None) == (expected[0] if expected else None)
+
+
+def test_build():
+    conditions = list(map(RuleCondition, [
+        _condition(_rule("greater", "10")),
+        _condition(_rule("less", "5", id="days")),
+        _condition(_rule("between", ["1", "3"])),
+        _condition(_rule("equal", "abc", type="string")),
+    ]))
+    index = build_interval_index(conditions)
+    assert isinstance(index, IntervalIndex)
+    assert index.field == "value"
+    assert index.points == [1, 3, 10]
+    assert index.residual == (1, 3)
+
+    assert index.candidates(conditions, {"value": 2, "days": 1}) == [
+        (1, False), (2, True), (3, False),
+    ]
+    # not a number, the ruleset is tested in order
+    assert index.candidates(conditions, {"value": None}) is None
+
+    assert build_interval_index(conditions[1:2]) is None
+    assert build_interval_index(conditions[3:]) is None
+
+
+def _random_select_ruleset(rnd):
+    choices = ["a", "b", "c", "d", "1", "2"]
+    ruleset = []
+    for _ in range(rnd.randint(2, 12)):
+        rules = [rnd.choice([
+            _rule("equal", rnd.choice(choices), type="string"),
+            _rule("in", rnd.sample(choices, 3), type="string"),
+            _rule("not_equal", rnd.choice(choices), type="string"),
+            _rule("greater", str(rnd.randint(0, 5)), id="days"),
+        ]) for _ in range(rnd.randint(1, 3))]
+        ruleset.append(_condition(*rules, condition=rnd.choice(["AND", "OR"])))
+    return ruleset
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_hash_same_as_linear(seed):
+    rnd = random.Random(seed)
+    ruleset = _random_select_ruleset(rnd)
+    indexed = GenericRule(ruleset=ruleset)
+    linear = LinearRule(ruleset=ruleset)
+
+    for value in ["a", "b", "c", "d", "e", "1", 1, 2.0, None]:
+        context = {"value": value, "days": rnd.randint(0, 6)}
+        expected = [id(r["rule"]) for r in linear.execute(context, take_first=False)]
+        assert [id(r["rule"]) for r in indexed.execute(context, take_first=False)] == expected
+
+
+def test_build_hash():
+    conditions = list(map(RuleCondition, [
+        _condition(_rule("equal", "a", type="string")),
+        _condition(_rule("in", ["a", "b"], type="string"), _rule("less", "5", id="days")),
+        _condition(_rule("less", "5", id="days")),
+        _condition(_rule("equal", "c", type="string"), _rule("equal", "d", type="string"),
+                   condition="OR"),
+    ]))
+    index = build_index(conditions)
+    assert isinstance(index, HashIndex)
+    assert index.indexed == (0, 1, 3)
+    assert index.residual == (2,)
+
+    assert index.candidates(conditions, {"value": "a"}) == [(0, True), (1, False), (2, False)]
+    assert index.candidates(conditions, {"value": "d"}) == [(2, False), (3, True)]
+    assert index.candidates(conditions, {"value": "e"}) == [(2, False)]
+    assert index.candidates(conditions, {"value": 1.5}) is None
@@ -0,0 +1,71 @@
+# coding: utf-8
+from __future__ import unicode_literals
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules used to validate and price rules
+MODULES = ['querybuilder_rules', 'querybuilder_rules.rules.price',
+           'querybuilder_rules.rules.validation']
+
+# Loaded on the first use only
+HEAVY_MODULES = ['sympy', 'dateutil', 'extended_choices', 'numpy', 'jinja2']
+
+# Cumulative import time of ``MODULES`` on top of django, microseconds.
+# About 25ms without the heavy modules and 170ms with them, the margin is for slow machines
+IMPORT_BUDGET = 100000
+
+# django is imported by the project anyway
+PRELUDE = 'import django.template, django.core.exceptions, django.utils.encoding'
+
+
+def _run(code, *options):
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE='tests.settings.test')
+    process = subprocess.Popen([sys.executable] + list(options) + ['-c', code],
+                               cwd=ROOT, env=env,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stdout, stderr = process.communicate()
+    assert process.returncode == 0, stderr
+    return stdout.decode('utf-8'), stderr.decode('utf-8')
+
+
+def _top_level(modules):
+    return {module.split('.')[0] for module in modules}
+
+
+def test_heavy_modules():
+    stdout, _ = _run('import json, sys; %s; print(json.dumps(sorted(sys.modules)))' % '; '.join(
+        'import %s' % module for module in MODULES))
+    assert _top_level(json.loads(stdout)).isdisjoint(HEAVY_MODULES)
+
+
+@pytest.mark.skipif(sys.version_info < (3, 7), reason='-X importtime requires python 3.7')
+def test_import_time():
+    _, stderr = _run('%s; import %s' % (PRELUDE, ', '.join(MODULES)), '-X', 'importtime')
+    imported = []
+    total = 0
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = line.split('|')
+        imported.append(name.strip())
+        # top level imports only, the nested ones are in their cumulative time
+        if name.startswith(' querybuilder_rules'):
+            total += int(cumulative)
+    assert set(MODULES) <= set(imported)
+    assert _top_level(imported).isdisjoint(HEAVY_MODULES)
+    assert 0 < total < IMPORT_BUDGET
+
+
+def test_lazy_parser_info():
+    stdout, _ = _run('import sys; from querybuilder_rules.maps import PARSER_INFO, TYPES; '
+                     'loaded = "dateutil" in sys.modules; '
+                     'date = TYPES["date"]("02.01.2020"); '
+                     'print("%s %s %s" % (loaded, PARSER_INFO.dayfirst, date))')
+    assert stdout.split() == ['False', 'True', '2020-01-02']
@@ -0,0 +1,133 @@
+# coding: utf-8
+from __future__ import unicode_literals
+
+import datetime
+import random
+
+import pytest
+
+from querybuilder_rules.analysis import NotAnalysable
+from querybuilder_rules.conditions import RuleCondition
+from querybuilder_rules.intervals import (
+    Interval, IntervalSet, get_datetime_intervals, get_hour_runs, get_intervals,
+    get_range_intervals,
+)
+
+OPERATORS = ["equal", "not_equal", "in", "not_in", "greater", "less", "greater_or_equal",
+             "less_or_equal", "between", "not_between"]
+
+
+def _rule(operator, value, id="time", type="time"):
+    return {"id": id, "type": type, "operator": operator, "value": value}
+
+
+def _random_tree(rnd, values, type, depth=2):
+    rules = []
+    for _ in range(rnd.randint(0, 3)):
+        if depth and rnd.random() < 0.3:
+            rules.append(_random_tree(rnd, values, type, depth - 1))
+            continue
+        operator = rnd.choice(OPERATORS)
+        if operator in ("between", "not_between", "in", "not_in"):
+            value = rnd.sample(values, 2)
+        else:
+            value = rnd.choice(values)
+        rules.append(_rule(operator, value, id=type, type=type))
+    return {"condition": rnd.choice(["AND", "OR"]), "rules": rules}
+
+
+def _times():
+    return [datetime.time(h, m) for h in range(24) for m in (0, 15, 30, 45)]
+
+
+def _dates():
+    return [datetime.date(2016, 1, 1) + datetime.timedelta(days=d) for d in range(40)]
+
+
+@pytest.mark.parametrize("seed", range(50))
+@pytest.mark.parametrize("type, samples, values", [
+    ("time", _times(), ["00:00", "06:30", "09:00", "18:00", "23:45"]),
+    ("date", _dates(), ["03.01.2016", "10.01.2016", "20.01.2016", "01.02.2016"]),
+])
+def test_same_as_condition(seed, type, samples, values):
+    tree = _random_tree(random.Random(seed), values, type)
+    condition = RuleCondition({"rule": tree})
+    intervals = get_intervals(tree, type)
+    for value in samples:
+        assert bool(condition({type: value})) == (value in intervals)
+
+
+def test_algebra():
+    a = IntervalSet([Interval(1, 5, True, False), Interval(5, 7, True, True)])
+    assert a.intervals == [Interval(1, 7, True, True)]
+    b = IntervalSet([Interval(3, None, False, False)])
+    assert a.intersection(b).intervals == [Interval(3, 7, False, True)]
+    assert a.union(b).intervals == [Interval(1, None, True, False)]
+    assert a.complement().intervals == [Interval(None, 1, False, False),
+                                        Interval(7, None, False, False)]
+    assert a.complement().complement() == a
+    assert not IntervalSet.everything().complement()
+
+
+def test_overnight():
+    tree = {"condition": "OR", "rules": [_rule("between", ["22:00", "06:00"])]}
+    start = datetime.datetime(2016, 1, 1, 20)
+    end = datetime.datetime(2016, 1, 3, 8)
+    intervals = get_datetime_intervals(tree, "time", start, end)
+    assert intervals.intervals == [
+        Interval(datetime.datetime(2016, 1, 1, 22), datetime.datetime(2016, 1, 2, 6), True, True),
+        Interval(datetime.datetime(2016, 1, 2, 22), datetime.datetime(2016, 1, 3, 6), True, True),
+    ]
+
+
+def test_dates_as_datetimes():
+    tree = {"condition": "AND", "rules": [
+        _rule("greater", "02.01.2016", id="date", type="date"),
+        _rule("less_or_equal", "04.01.2016", id="date", type="date"),
+    ]}
+    start = datetime.datetime(2016, 1, 1, 12)
+    end = datetime.datetime(2016, 1, 10)
+    intervals = get_datetime_intervals(tree, "date", start, end)
+    assert intervals.intervals == [
+        Interval(datetime.datetime(2016, 1, 3), datetime.datetime(2016, 1, 5), True, False),
+    ]
+
+
+@pytest.mark.parametrize("tree", [
+    {"condition": "AND", "rules": [_rule("between", ["09:00", "18:00"], id="value")]},
+    {"condition": "AND", "rules": [_rule("is_empty", None)]},
+    {"condition": "AND", "rules": [_rule("greater", "1", type="integer")]},
+    {"condition": "AND", "rules": [_rule("greater", "09:00"),
+                                   _rule("greater", "01.01.2016", type="date")]},
+])
+def test_not_analysable(tree):
+    with pytest.raises(NotAnalysable):
+        get_intervals(tree, "time")
+
+
+def test_range_intervals():
+    tree = {"condition": "AND", "rules": [
+        _rule("between", ["22:00", "06:00"]),
+        _rule("not_equal", "02.01.2016", id="date", type="date"),
+    ]}
+    start = datetime.datetime(2016, 1, 1, 20)
+    end = datetime.datetime(2016, 1, 3, 8)
+    intervals = get_range_intervals(tree, start, end)
+    assert intervals.intervals == [
+        Interval(datetime.datetime(2016, 1, 1, 22), datetime.datetime(2016, 1, 2), True, False),
+        Interval(datetime.datetime(2016, 1, 3), datetime.datetime(2016, 1, 3, 6), True, True),
+    ]
+    with pytest.raises(NotAnalysable):
+        get_range_intervals({"condition": "AND", "rules": [_rule("greater", "1", id="hours",
+                                                                 type="integer")]}, start, end)
+
+
+def test_hour_runs():
+    conditions = [RuleCondition({"rule": {"condition": "AND", "rules": [
+        _rule("between", ["09:30", "18:00"]),
+    ]}})]
+    start = datetime.datetime(2016, 1, 1, 9)
+    # 10:00..18:00 of the days
+    assert get_hour_runs(conditions, start, 24) == [(1, 9), (10, 24)]
+    assert len(get_hour_runs(conditions, start, 24 * 365)) == 2 * 365
+    assert get_hour_runs(conditions, start, 0) == []
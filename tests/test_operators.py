@@ -101,3 +101,12 @@ class ConditionTestCase(unittest.TestCase):
             test_func = rule_cond._build_test_func(rule)['test_func']
             value = OptionValue(input_value, value_type=OPTION_TYPE_CHOICES.DATETIME)
             self.assertEqual(test_func(Context(value.get_context())), expect)
+
+    def test_in(self):
+        rule = {"type": "integer", "operator": "in", "value": ["1", "2"], "id": "value"}
+        args = RuleCondition([]).parse_rule(rule)[3]
+        self.assertIsInstance(args[0], frozenset)
+
+        test_func = RuleCondition([])._build_test_func(rule)['test_func']
+        for value, expect in [(1, True), (2.0, True), (3, False), ([1], False), ({}, False)]:
+            self.assertEqual(test_func(Context({"value": value})), expect)
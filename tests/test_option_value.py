@@ -266,3 +266,31 @@ class ContextTestCase(unittest.TestCase):
         ctx = Context({'value': None})
         self.assertFalse(ctx.days)
         self.assertFalse(ctx['days'])
+
+    def test_lazy_fields(self):
+        option_value = OptionValue(['2016-01-01 09:00', '2016-01-03 09:00'],
+                                   OPTION_TYPE_CHOICES.DATETIME_RANGE_HOUR)
+        first, second = list(option_value.get_context_range())[:2]
+        self.assertIs(first.totals, second.totals)
+        self.assertFalse(dict.__contains__(first, 'time'))
+        self.assertIn('time', first)
+
+        ctx = Context(first)
+        self.assertEqual(ctx['time'], datetime.time(10, 0))
+        self.assertEqual(ctx['date.day'], 1)
+        self.assertEqual(ctx['total_hours'], 48)
+        self.assertIs(ctx['unknown'], ctx.unknown)
+        self.assertEqual(ctx.to_dict(), {
+            'value': datetime.datetime(2016, 1, 1, 10),
+            'datetime': datetime.datetime(2016, 1, 1, 10),
+            'time': datetime.time(10, 0),
+            'date': datetime.date(2016, 1, 1),
+            'days': 1,
+            'hours': 1,
+            'start_datetime': datetime.datetime(2016, 1, 1, 9),
+            'end_datetime': datetime.datetime(2016, 1, 1, 10),
+            'total_days': 2,
+            'total_hours': 48,
+        })
+        self.assertEqual(len(second), 10)
+        self.assertEqual(dict(second)['hours'], 2)
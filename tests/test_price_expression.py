@@ -0,0 +1,85 @@
+# coding: utf-8
+from __future__ import unicode_literals
+
+from decimal import Decimal
+
+import pytest
+import sympy
+
+from querybuilder_rules.expressions import (
+    ArithmeticExpression, SympyExpression, UnsupportedExpression, get_expression,
+)
+from querybuilder_rules.rules.price import PriceRule
+from querybuilder_rules.values import Context
+
+
+def _sympify_price(price_expr, context):
+    local_context = {p: context[p] for p in context.keys()}
+    return Decimal(float(sympy.sympify(price_expr, locals=local_context)))
+
+
+def _context():
+    return PriceRule._price_context(base_price=250, new_base_price=Decimal('99.5'), extra={
+        "o_12": {"value": 3, "days": 2},
+    })
+
+
+@pytest.mark.parametrize("expression", [
+    "400",
+    "0.1",
+    "bp - 42",
+    "bp * 2 / 3",
+    "(nbp + 10) * 1.5",
+    "bp * 0.9 * 1.1",
+    "o_12.value * 100 + o_12.days",
+    "-bp + 1,5",
+])
+@pytest.mark.parametrize("engine", [ArithmeticExpression, SympyExpression])
+def test_same_as_sympify(engine, expression):
+    context = _context()
+    expected = _sympify_price(expression.replace(',', '.'), context)
+    # floats may differ in the last digits
+    assert abs(engine(expression)(context) - expected) <= abs(expected) * Decimal('1e-15')
+
+
+@pytest.mark.parametrize("expression, expected", [
+    ("0.1 + 0.2", Decimal("0.3")),
+    ("bp * 0.9 * 1.1", Decimal("247.5")),
+    ("nbp * 3 / 3", Decimal("99.5")),
+    ("bp / 3", Decimal(250) / Decimal(3)),
+])
+def test_arithmetic_exact(expression, expected):
+    assert ArithmeticExpression(expression)(_context()) == expected
+
+
+@pytest.mark.parametrize("expression", [
+    "bp ** 2",
+    "Max(bp, 10)",
+    "bp if 1 else 2",
+    "__import__('os')",
+    "'1' + bp",
+])
+def test_arithmetic_unsupported(expression):
+    with pytest.raises(UnsupportedExpression):
+        ArithmeticExpression(expression)
+
+
+def test_sympy_fallback():
+    expression = get_expression("bp ** 2 + o_12.value")
+    assert isinstance(expression, SympyExpression)
+    assert expression(_context()) == 62503
+
+    assert isinstance(get_expression("bp + o_12.value"), ArithmeticExpression)
+
+
+def test_cached():
+    expression = get_expression("bp + o_1.value")
+    assert get_expression("bp + o_1.value") is expression
+    assert expression.symbols == ["bp", "o_1__value"]
+    assert expression(Context({"bp": 1, "o_1": {"value": Decimal(2)}})) == 3
+
+
+@pytest.mark.parametrize("expression", ["bp * unknown", "bp / 0"])
+def test_not_calculated(expression):
+    with pytest.raises(TypeError):
+        get_expression(expression)(Context({"bp": 1}))
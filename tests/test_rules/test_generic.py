@@ -27,3 +27,55 @@ def test_simple(value, expect_res):
     rule = GenericRule(ruleset=[rule_condition])
     res = rule.execute({"total": value})
     assert bool(res) == expect_res
+
+
+def test_extra_context_layered():
+    rule_condition = {
+        "rule": {
+            "condition": "AND",
+            "rules": [
+                {"id": "total", "type": "integer", "operator": "greater", "value": "10"},
+                {"id": "12.value", "type": "string", "operator": "equal", "value": "red"},
+            ],
+        },
+    }
+    context = {"total": 20, "12": {"value": "blue"}}
+
+    red = GenericRule(ruleset=[rule_condition], extra_context={"12": {"value": "red"}})
+    blue = GenericRule(ruleset=[rule_condition], extra_context={"12": {"value": "blue"}})
+    assert red.execute(context)
+    assert not blue.execute(context)
+    assert not GenericRule(ruleset=[rule_condition]).execute(context)
+    # the shared context isn't changed
+    assert context == {"total": 20, "12": {"value": "blue"}}
+
+    res = red.execute(context)
+    assert res["context"].to_dict() == {"total": 20, "12": {"value": "red"}}
+
+
+@pytest.mark.parametrize("use_index", [True, False])
+def test_execute_many(use_index):
+    ruleset = [{
+        "rule": {
+            "condition": "AND",
+            "rules": [{"id": "total", "type": "integer", "operator": "between",
+                       "value": [str(i * 10), str(i * 10 + 15)]}],
+        },
+    } for i in range(5)] + [{
+        "rule": {
+            "condition": "AND",
+            "rules": [{"id": "total", "type": "integer", "operator": "is_not_null"}],
+        },
+    }]
+    contexts = [{"total": v} for v in range(-5, 70, 3)] + [{}]
+
+    rule = GenericRule(ruleset=ruleset)
+    rule.use_index = use_index
+    if not use_index:
+        rule.index = None
+
+    ids = [id(condition) for condition in rule.ruleset_conditions]
+    positions = [[ids.index(id(res["condition"])) for res in rule.execute(c, take_first=False)]
+                 for c in contexts]
+    assert list(rule.execute_many(contexts, take_first=False)) == positions
+    assert list(rule.execute_many(iter(contexts))) == [p[0] if p else None for p in positions]
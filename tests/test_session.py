@@ -0,0 +1,119 @@
+# coding: utf-8
+from __future__ import unicode_literals
+
+import random
+
+import pytest
+
+from querybuilder_rules import OPTION_TYPE_CHOICES
+from querybuilder_rules.rules.base import BaseRule
+from querybuilder_rules.rules.price import PriceRule
+from querybuilder_rules.rules.validation import ValidateRule
+from querybuilder_rules.session import ALL_OPTIONS, DependencyGraph, PricingSession
+
+
+def _rule(rules, condition="AND", **kwargs):
+    result = {"rule": {"condition": condition, "rules": rules}}
+    result.update(kwargs)
+    return result
+
+
+QUANTITY_GT = {"id": "11.value", "type": "integer", "operator": "greater", "value": "5"}
+SHIP = {"id": "12.value", "type": "boolean", "operator": "equal", "value": "true"}
+RED = {"id": "13.value", "type": "string", "operator": "equal", "value": "red"}
+TEXT_EMPTY = {"id": "14.value", "type": "string", "operator": "is_empty", "value": None}
+
+
+def _random_values(rnd):
+    values = {
+        "11": {"value": rnd.randint(1, 10), "type": OPTION_TYPE_CHOICES.QUANTITY},
+        "12": {"value": rnd.choice([True, False]), "type": OPTION_TYPE_CHOICES.BOOL},
+        "13": {"value": rnd.choice(["red", "blue"]), "type": OPTION_TYPE_CHOICES.SELECT},
+        "14": {"value": rnd.choice(["", "text"]), "type": OPTION_TYPE_CHOICES.TEXT},
+    }
+    if rnd.random() < 0.2:
+        del values["14"]
+    return values
+
+
+def test_dependency_graph():
+    rule = PriceRule(ruleset=[
+        _rule([QUANTITY_GT, SHIP], price="10 * o_11.value", to_option="12"),
+        _rule([RED], price="bp + o_14__value"),
+        _rule([], price="foo"),
+    ])
+    graph = DependencyGraph(rule)
+    assert graph.conditions == [{"11", "12"}, {"13"}, set()]
+    assert graph.expressions == [{"11"}, {"14"}, {ALL_OPTIONS}]
+    assert graph.get_dependents(["12", "13"]) == {0, 1}
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_same_as_group(seed):
+    rnd = random.Random(seed)
+    price_rule = PriceRule(ruleset=[
+        _rule([QUANTITY_GT, SHIP], price="10 * o_11.value", to_option="12"),
+        _rule([RED, SHIP], condition="OR", price="nbp + 5"),
+        _rule([SHIP], price="100", to_option="12"),
+        _rule([RED], price="1000"),
+    ])
+    validate_rule = ValidateRule(ruleset=[
+        _rule([SHIP, TEXT_EMPTY], message="Required", to_options=["14"]),
+        _rule([QUANTITY_GT, RED], message="Too many"),
+    ])
+    session = PricingSession(price_rule=price_rule, validate_rule=validate_rule,
+                             option_rules={"11": PriceRule(ruleset=[
+                                 _rule([{"id": "value", "type": "integer", "operator": "greater",
+                                         "value": "3"}], price="bp / 2"),
+                             ])})
+    for _ in range(15):
+        values = _random_values(rnd)
+        session.update(values)
+        context = BaseRule.build_group_context(values)
+        assert session.get_group_price() == price_rule.calculate_group_price(context)
+        assert session.get_errors() == validate_rule.validate_group(values)
+        expected = session.option_rules["11"].calculate_price(
+            values["11"]["value"], values["11"]["type"], base_price=10)
+        assert session.get_option_price("11", base_price=10) == expected
+
+
+def test_changed_options():
+    price_rule = PriceRule(ruleset=[
+        _rule([QUANTITY_GT], price="10 * o_11.value"),
+        _rule([RED], price="o_12__value"),
+    ])
+    session = PricingSession(price_rule=price_rule)
+    values = {
+        "11": {"value": 3, "type": OPTION_TYPE_CHOICES.QUANTITY},
+        "12": {"value": 7, "type": OPTION_TYPE_CHOICES.QUANTITY},
+        "13": {"value": "red", "type": OPTION_TYPE_CHOICES.SELECT},
+    }
+    assert session.update(values) == {"11", "12", "13"}
+    assert session.get_group_price()[0] == {None: 7}
+    assert session.evaluations == 2
+
+    # isn't read by the matched rule
+    values["11"] = {"value": 4, "type": OPTION_TYPE_CHOICES.QUANTITY}
+    assert session.update(values) == {"11"}
+    assert session.get_group_price()[0] == {None: 7}
+    assert session.evaluations == 3
+
+    # the price of the matched rule
+    values["12"] = {"value": 8, "type": OPTION_TYPE_CHOICES.QUANTITY}
+    assert session.update(values) == {"12"}
+    assert session.get_group_price()[0] == {None: 8}
+    assert session.evaluations == 3
+
+    assert session.update(dict(values)) == set()
+    assert session.get_group_price()[0] == {None: 8}
+    assert session.evaluations == 3
+
+
+def test_missing_rules():
+    session = PricingSession(price_rule=PriceRule(ruleset=[_rule([RED], price="1")]))
+    session.update({"13": {"value": "red", "type": OPTION_TYPE_CHOICES.SELECT}})
+    assert session.get_group_price()[0] == {None: 1}
+    with pytest.raises(ValueError):
+        session.get_errors()
+    with pytest.raises(ValueError):
+        PricingSession(validate_rule=ValidateRule(ruleset=[])).get_group_price()
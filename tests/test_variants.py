@@ -0,0 +1,97 @@
+# coding: utf-8
+from __future__ import unicode_literals
+
+import random
+from itertools import product
+
+import pytest
+
+from querybuilder_rules import OPTION_TYPE_CHOICES
+from querybuilder_rules.rules.base import BaseRule
+from querybuilder_rules.rules.price import PriceRule
+from querybuilder_rules.variants import VariantEnumerator, iter_variants
+
+CHOICES = {
+    "11": {"type": OPTION_TYPE_CHOICES.BOOL, "values": [True, False]},
+    "12": {"type": OPTION_TYPE_CHOICES.SELECT, "values": ["red", "blue", "green"]},
+    "13": {"type": OPTION_TYPE_CHOICES.BOOL, "values": [True, False]},
+    "14": {"type": OPTION_TYPE_CHOICES.SELECT, "values": ["s", "m", "l", "xl"]},
+}
+VALUES = {"15": {"value": 4, "type": OPTION_TYPE_CHOICES.QUANTITY}}
+
+
+def _random_rule(rnd):
+    if rnd.random() < 0.2:
+        return {"condition": rnd.choice(["AND", "OR"]),
+                "rules": [_random_rule(rnd) for _ in range(rnd.randint(0, 2))]}
+    return rnd.choice([
+        {"id": "11.value", "type": "boolean", "operator": "equal",
+         "value": rnd.choice(["true", "false"])},
+        {"id": "13.value", "type": "boolean", "operator": "equal", "value": "true"},
+        {"id": "12.value", "type": "string", "operator": rnd.choice(["equal", "not_equal"]),
+         "value": rnd.choice(["red", "blue"])},
+        {"id": "14.value", "type": "string", "operator": "in",
+         "value": rnd.sample(["s", "m", "l"], 2)},
+        {"id": "15.value", "type": "integer", "operator": "greater",
+         "value": str(rnd.randint(2, 6))},
+        {"id": "total_value", "type": "integer", "operator": "is_null", "value": None},
+    ])
+
+
+def _random_ruleset(rnd):
+    return [
+        {
+            "rule": {"condition": rnd.choice(["AND", "OR"]),
+                     "rules": [_random_rule(rnd) for _ in range(rnd.randint(1, 2))]},
+            "price": rnd.choice(["100", "nbp + 10", "o_15.value * 3", "7", "bp + 1"]),
+            "to_option": rnd.choice([None, None, "11", "14"]),
+        }
+        for _ in range(rnd.randint(1, 5))
+    ]
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_same_as_group_price(seed):
+    rnd = random.Random(seed)
+    price_rule = PriceRule(ruleset=_random_ruleset(rnd))
+    variants = list(iter_variants(price_rule, CHOICES, VALUES))
+
+    order = sorted(CHOICES)
+    expected = {}
+    for combination in product(*[CHOICES[o]["values"] for o in order]):
+        values = dict(VALUES)
+        for option_id, value in zip(order, combination):
+            values[option_id] = {"value": value, "type": CHOICES[option_id]["type"]}
+        price_map, _ = price_rule.calculate_group_price(BaseRule.build_group_context(values))
+        expected[combination] = price_map
+
+    assert len(variants) == len(expected)
+    for assignment, price_map in variants:
+        assert price_map == expected[tuple(assignment[o] for o in order)]
+
+
+def test_pruning():
+    price_rule = PriceRule(ruleset=[
+        {"rule": {"condition": "AND", "rules": [
+            {"id": "11.value", "type": "boolean", "operator": "equal", "value": "true"},
+        ]}, "price": "100"},
+        {"rule": {"condition": "AND", "rules": [
+            {"id": "12.value", "type": "string", "operator": "equal", "value": "red"},
+            {"id": "14.value", "type": "string", "operator": "equal", "value": "s"},
+        ]}, "price": "50"},
+    ])
+    enumerator = VariantEnumerator(price_rule)
+    assert enumerator.get_order(CHOICES) == ["11", "12", "14", "13"]
+
+    variants = enumerator.iter_variants(CHOICES)
+    assignment, price_map = next(variants)
+    assert assignment == {"11": True, "12": "red", "14": "s", "13": True}
+    assert price_map == {None: 100}
+    # 11 = True prices 24 variants at once
+    assert enumerator.calculations == 1
+
+    prices = [price_map] + [p for _, p in variants]
+    assert len(prices) == 2 * 3 * 2 * 4
+    assert prices.count({None: 50}) == 2
+    # 11 = False: 12 = blue/green decide the second rule, 12 = red is priced by 14
+    assert enumerator.calculations == 1 + 2 + 4